@@ -0,0 +1,128 @@
+"""Microbenchmark do custo de autenticação por requisição.
+
+Mede, em microssegundos por operação, a decodificação do JWT em cada
+backend, o acerto no cache de tokens e a dependência JWTBearer completa,
+com e sem o cache de tokens, nos modos banco (usuário já no cache, sem
+consulta) e claims.
+
+Uso (dentro de backend/):
+
+    python -m benchmarks.autenticacao
+    python -m benchmarks.autenticacao --repeticoes 50000 --saida benchmarks/auth.json
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from starlette.requests import Request
+
+from libs.autenticacao import config
+from libs.autenticacao.principal import UsuarioAutenticado
+from libs.autenticacao.tokens import DECODIFICADORES_JWT, VerificadorTokens
+from libs.cache.lru import CacheTTL
+
+
+def _medir(funcao: Callable[[], object], repeticoes: int) -> float:
+    funcao()
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+async def _medir_async(funcao: Callable[[], Awaitable], repeticoes: int) -> float:
+    await funcao()
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        await funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+def _verificador(backend: str, com_cache: bool) -> VerificadorTokens:
+    return VerificadorTokens(
+        DECODIFICADORES_JWT[backend](config.SECRET_KEY, config.ALGORITHM),
+        cache=CacheTTL(tamanho_maximo=1024, ttl_segundos=300) if com_cache else None,
+    )
+
+
+def executar(repeticoes: int) -> dict:
+    token = config.criar_token_de_acesso_a_rotas_protegidas(
+        {"sub": "bench@livraria.com", "id": 1, "autor": False, "ativo": True, "ver": 1},
+        expires_delta=timedelta(hours=1),
+    )
+    # usuário já no cache, como o JWTBearer guarda: a medida fica só no custo
+    # do token
+    config.cache_usuarios.guardar(
+        ("id", 1),
+        UsuarioAutenticado(
+            id=1, email="bench@livraria.com", autor=False, ativo=True, versao_token=1
+        ),
+    )
+    requisicao = Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/",
+            "headers": [(b"authorization", f"Bearer {token}".encode())],
+        }
+    )
+    bearer = config.JWTBearer()
+
+    resultados = {}
+    for backend in DECODIFICADORES_JWT:
+        decodificador = DECODIFICADORES_JWT[backend](
+            config.SECRET_KEY, config.ALGORITHM
+        )
+        resultados[f"decodificar_{backend}"] = _medir(
+            lambda: decodificador.decodificar(token), repeticoes
+        )
+
+    verificador = _verificador("jose", com_cache=True)
+    resultados["acerto_cache_tokens"] = _medir(
+        lambda: verificador.verificar(token), repeticoes
+    )
+
+    original = config.verificador_tokens, config.AUTH_MODO
+    try:
+        for modo in ("banco", "claims"):
+            config.AUTH_MODO = modo
+            for backend in DECODIFICADORES_JWT:
+                for com_cache in (False, True):
+                    config.verificador_tokens = _verificador(backend, com_cache)
+                    nome = (
+                        f"jwtbearer_{modo}_{backend}_"
+                        f"{'com' if com_cache else 'sem'}_cache"
+                    )
+                    resultados[nome] = asyncio.run(
+                        _medir_async(lambda: bearer(requisicao), repeticoes)
+                    )
+    finally:
+        config.verificador_tokens, config.AUTH_MODO = original
+        config.cache_usuarios.invalidar(("id", 1))
+
+    return {nome: round(micros, 2) for nome, micros in resultados.items()}
+
+
+def main():
+    argumentos = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argumentos.add_argument("--repeticoes", type=int, default=20_000)
+    argumentos.add_argument("--saida", help="grava o resultado em JSON")
+    opcoes = argumentos.parse_args()
+
+    resultados = executar(opcoes.repeticoes)
+    base = resultados["jwtbearer_banco_jose_sem_cache"]
+    for nome, micros in resultados.items():
+        comparacao = f"{base / micros:6.1f}x" if nome.startswith("jwtbearer") else ""
+        print(f"{nome:<32} {micros:>9.2f} µs/op {comparacao}")
+
+    if opcoes.saida:
+        Path(opcoes.saida).write_text(json.dumps(resultados, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""Benchmark de carga dos caminhos mais usados da API.
+
+Sobe um uvicorn local com um SQLite novo, populado pelo libs.database.cli na
+escala pedida, e dispara usuários virtuais (asyncio + httpx) que fazem login,
+listam e buscam livros, abrem o detalhe, adicionam ao carrinho, veem o
+carrinho e finalizam a compra. Grava vazão e p50/p95/p99 de cada endpoint
+num JSON que pode ser comparado com uma execução anterior.
+
+Uso (dentro de backend/):
+
+    python -m benchmarks.carga --saida benchmarks/base.json
+    python -m benchmarks.carga --comparar benchmarks/base.json
+
+Com --url o benchmark usa um servidor já rodando em vez de subir um.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+DIRETORIO_BACKEND = Path(__file__).resolve().parent.parent
+
+# peso de cada passo no ciclo de um usuário virtual
+CENARIO = [
+    ("listar_livros", 4),
+    ("buscar_livros", 3),
+    ("obter_livro", 3),
+    ("adicionar_carrinho", 2),
+    ("ver_carrinho", 2),
+    ("finalizar_compra", 1),
+]
+TERMOS_BUSCA = ["livro", "hype", "genero 1", "descricao", "livro 4"]
+
+
+class Medicoes:
+    def __init__(self):
+        self.latencias: dict[str, list[float]] = defaultdict(list)
+        self.erros: dict[str, int] = defaultdict(int)
+
+    def registrar(self, endpoint: str, segundos: float, resposta: httpx.Response):
+        self.latencias[endpoint].append(segundos)
+        if resposta.status_code >= 400:
+            self.erros[endpoint] += 1
+
+
+async def _medir(
+    cliente: httpx.AsyncClient,
+    medicoes: Medicoes,
+    endpoint: str,
+    metodo: str,
+    caminho: str,
+    **opcoes,
+) -> httpx.Response:
+    inicio = time.perf_counter()
+    resposta = await cliente.request(metodo, caminho, **opcoes)
+    medicoes.registrar(endpoint, time.perf_counter() - inicio, resposta)
+    return resposta
+
+
+async def _usuario_virtual(
+    cliente: httpx.AsyncClient,
+    medicoes: Medicoes,
+    email: str,
+    total_livros: int,
+    fim: float,
+    semente: int,
+):
+    aleatorio = random.Random(semente)
+    resposta = await _medir(
+        cliente,
+        medicoes,
+        "login",
+        "POST",
+        "/autenticacao/login",
+        json={"email": email, "senha": "1234"},
+    )
+    resposta.raise_for_status()
+    cabecalhos = {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+
+    passos, pesos = zip(*CENARIO)
+    while time.perf_counter() < fim:
+        passo = aleatorio.choices(passos, pesos)[0]
+        # livros com id baixo têm pouco estoque (quantidade = id - 1)
+        livro_id = aleatorio.randint(min(100, total_livros), total_livros)
+
+        if passo == "listar_livros":
+            pagina = aleatorio.randint(1, max(1, min(50, total_livros // 10)))
+            await _medir(
+                cliente, medicoes, passo, "GET", "/livros/", params={"pagina": pagina}
+            )
+        elif passo == "buscar_livros":
+            await _medir(
+                cliente,
+                medicoes,
+                passo,
+                "GET",
+                "/livros/",
+                params={"busca": aleatorio.choice(TERMOS_BUSCA)},
+            )
+        elif passo == "obter_livro":
+            await _medir(
+                cliente, medicoes, passo, "GET", f"/livros/obter-livros/{livro_id}"
+            )
+        elif passo == "adicionar_carrinho":
+            await _medir(
+                cliente,
+                medicoes,
+                passo,
+                "POST",
+                "/carrinho/adicionar",
+                headers=cabecalhos,
+                json={"livro_id": livro_id, "quantidade": 1},
+            )
+        elif passo == "ver_carrinho":
+            await _medir(
+                cliente, medicoes, passo, "GET", "/carrinho/", headers=cabecalhos
+            )
+        elif passo == "finalizar_compra":
+            # garante um item no carrinho para a compra não sair vazia
+            await cliente.post(
+                "/carrinho/adicionar",
+                headers=cabecalhos,
+                json={"livro_id": livro_id, "quantidade": 1},
+            )
+            await _medir(
+                cliente,
+                medicoes,
+                passo,
+                "POST",
+                "/venda/comprar-do-carrinho",
+                headers=cabecalhos,
+            )
+
+
+def _percentil(valores_ordenados: list[float], percentil: float) -> float:
+    if len(valores_ordenados) == 1:
+        return valores_ordenados[0]
+    posicao = (len(valores_ordenados) - 1) * percentil / 100
+    abaixo = int(posicao)
+    acima = min(abaixo + 1, len(valores_ordenados) - 1)
+    fracao = posicao - abaixo
+    return valores_ordenados[abaixo] * (1 - fracao) + valores_ordenados[acima] * fracao
+
+
+def resumir(medicoes: Medicoes, duracao: float) -> dict:
+    resumo = {}
+    for endpoint, latencias in sorted(medicoes.latencias.items()):
+        ordenadas = sorted(latencias)
+        resumo[endpoint] = {
+            "requisicoes": len(ordenadas),
+            "erros": medicoes.erros[endpoint],
+            "vazao_rps": round(len(ordenadas) / duracao, 2),
+            "media_ms": round(statistics.fmean(ordenadas) * 1000, 3),
+            "p50_ms": round(_percentil(ordenadas, 50) * 1000, 3),
+            "p95_ms": round(_percentil(ordenadas, 95) * 1000, 3),
+            "p99_ms": round(_percentil(ordenadas, 99) * 1000, 3),
+            "max_ms": round(ordenadas[-1] * 1000, 3),
+        }
+    return resumo
+
+
+async def executar_carga(
+    url: str, usuarios_virtuais: int, duracao: float, total_livros: int
+) -> dict:
+    medicoes = Medicoes()
+    limites = httpx.Limits(max_connections=usuarios_virtuais * 2)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=30) as cliente:
+        inicio = time.perf_counter()
+        fim = inicio + duracao
+        await asyncio.gather(
+            *(
+                _usuario_virtual(
+                    cliente,
+                    medicoes,
+                    f"carga{numero}@livraria.com",
+                    total_livros,
+                    fim,
+                    semente=numero,
+                )
+                for numero in range(1, usuarios_virtuais + 1)
+            )
+        )
+        duracao_real = time.perf_counter() - inicio
+
+    resumo = resumir(medicoes, duracao_real)
+    total = sum(item["requisicoes"] for item in resumo.values())
+    return {
+        "duracao_s": round(duracao_real, 2),
+        "vazao_total_rps": round(total / duracao_real, 2),
+        "endpoints": resumo,
+    }
+
+
+def _popular_banco(ambiente: dict, livros: int, usuarios: int):
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "libs.database.cli",
+            "preparar",
+            "--livros",
+            str(livros),
+            "--usuarios",
+            str(usuarios),
+        ],
+        cwd=DIRETORIO_BACKEND,
+        env=ambiente,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def _subir_servidor(ambiente: dict, porta: int, workers: int) -> subprocess.Popen:
+    processo = subprocess.Popen(
+        [sys.executable, "servidor.py"],
+        cwd=DIRETORIO_BACKEND,
+        env={
+            **ambiente,
+            "WEB_HOST": "127.0.0.1",
+            "WEB_PORTA": str(porta),
+            "WEB_WORKERS": str(workers),
+            "WEB_LOG_LEVEL": "warning",
+        },
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    url = f"http://127.0.0.1:{porta}"
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError("O servidor terminou antes de ficar pronto.")
+        try:
+            if httpx.get(f"{url}/saude/pronto", timeout=1).status_code == 200:
+                return processo
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+
+    processo.terminate()
+    raise RuntimeError("O servidor não respondeu em 60s.")
+
+
+def comparar(atual: dict, base: dict, tolerancia: float) -> list[str]:
+    """Lista as regressões: latência maior ou vazão menor que a tolerância."""
+    regressoes = []
+    for endpoint, medidas in atual["endpoints"].items():
+        anterior = base.get("endpoints", {}).get(endpoint)
+        if not anterior:
+            continue
+
+        linha = [f"{endpoint:<20}"]
+        for campo in ("p50_ms", "p95_ms", "p99_ms", "vazao_rps"):
+            if not anterior[campo]:
+                continue
+            variacao = (medidas[campo] - anterior[campo]) / anterior[campo]
+            linha.append(
+                f"{campo} {anterior[campo]:>9} -> {medidas[campo]:>9} ({variacao:+.1%})"
+            )
+            piorou = -variacao if campo == "vazao_rps" else variacao
+            if piorou > tolerancia:
+                regressoes.append(f"{endpoint}.{campo} {variacao:+.1%}")
+        print("  ".join(linha))
+
+    return regressoes
+
+
+def _commit_atual() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=DIRETORIO_BACKEND,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    argumentos = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argumentos.add_argument("--url", help="servidor já rodando (não sobe um local)")
+    argumentos.add_argument("--usuarios-virtuais", type=int, default=20)
+    argumentos.add_argument("--duracao", type=float, default=30, help="segundos")
+    argumentos.add_argument("--livros", type=int, default=10_000)
+    argumentos.add_argument("--porta", type=int, default=9100)
+    argumentos.add_argument("--workers", type=int, default=1)
+    argumentos.add_argument("--saida", default="benchmarks/resultado.json")
+    argumentos.add_argument("--comparar", help="JSON de uma execução anterior")
+    argumentos.add_argument(
+        "--tolerancia", type=float, default=0.10, help="piora aceita (0.10 = 10%%)"
+    )
+    opcoes = argumentos.parse_args()
+
+    processo = None
+    url = opcoes.url
+    with tempfile.TemporaryDirectory() as diretorio:
+        if not url:
+            ambiente = {
+                **os.environ,
+                "DATABASE_URL": f"sqlite:///{diretorio}/benchmark.db",
+                "LOG_AMOSTRAGEM": "0",
+            }
+            print(f"Populando {opcoes.livros} livros...")
+            _popular_banco(ambiente, opcoes.livros, opcoes.usuarios_virtuais)
+            processo = _subir_servidor(ambiente, opcoes.porta, opcoes.workers)
+            url = f"http://127.0.0.1:{opcoes.porta}"
+
+        try:
+            print(
+                f"Rodando {opcoes.usuarios_virtuais} usuários por {opcoes.duracao}s..."
+            )
+            resultado = asyncio.run(
+                executar_carga(
+                    url, opcoes.usuarios_virtuais, opcoes.duracao, opcoes.livros
+                )
+            )
+        finally:
+            if processo:
+                processo.terminate()
+                processo.wait()
+
+    resultado = {
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _commit_atual(),
+        "python": platform.python_version(),
+        "parametros": {
+            "usuarios_virtuais": opcoes.usuarios_virtuais,
+            "duracao_s": opcoes.duracao,
+            "livros": opcoes.livros,
+            "workers": opcoes.workers,
+        },
+        **resultado,
+    }
+    Path(opcoes.saida).write_text(json.dumps(resultado, indent=2, ensure_ascii=False))
+    print(json.dumps(resultado["endpoints"], indent=2, ensure_ascii=False))
+    print(f"Vazão total: {resultado['vazao_total_rps']} req/s -> {opcoes.saida}")
+
+    if opcoes.comparar:
+        base = json.loads(Path(opcoes.comparar).read_text())
+        regressoes = comparar(resultado, base, opcoes.tolerancia)
+        if regressoes:
+            print("Regressões acima da tolerância: " + ", ".join(regressoes))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Benchmark de rajada de login.
+
+Usuários virtuais fazem login sem parar por --duracao segundos enquanto uma
+sonda chama /saude/vivo a cada 50ms. A vazão de login mede o bcrypt; a
+latência da sonda mostra se ele está travando o resto do worker.
+
+Uso (dentro de backend/):
+
+    python -m benchmarks.login --saida benchmarks/login.json
+    python -m benchmarks.login --senhas-processos 0 --comparar benchmarks/login.json
+
+--senhas-processos 0 roda o bcrypt no threadpool do worker, para comparar
+com o pool de processos.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from benchmarks.carga import (
+    Medicoes,
+    _commit_atual,
+    _medir,
+    _popular_banco,
+    _subir_servidor,
+    comparar,
+    resumir,
+)
+
+INTERVALO_SONDA = 0.05
+
+
+async def _logins(
+    cliente: httpx.AsyncClient, medicoes: Medicoes, email: str, fim: float
+):
+    while time.perf_counter() < fim:
+        await _medir(
+            cliente,
+            medicoes,
+            "login",
+            "POST",
+            "/autenticacao/login",
+            json={"email": email, "senha": "1234"},
+        )
+
+
+async def _sonda(cliente: httpx.AsyncClient, medicoes: Medicoes, fim: float):
+    while time.perf_counter() < fim:
+        await _medir(cliente, medicoes, "sonda_vivo", "GET", "/saude/vivo")
+        await asyncio.sleep(INTERVALO_SONDA)
+
+
+async def executar_rajada(url: str, usuarios_virtuais: int, duracao: float) -> dict:
+    medicoes = Medicoes()
+    limites = httpx.Limits(max_connections=usuarios_virtuais + 2)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=60) as cliente:
+        inicio = time.perf_counter()
+        fim = inicio + duracao
+        await asyncio.gather(
+            _sonda(cliente, medicoes, fim),
+            *(
+                _logins(cliente, medicoes, f"carga{numero}@livraria.com", fim)
+                for numero in range(1, usuarios_virtuais + 1)
+            ),
+        )
+        duracao_real = time.perf_counter() - inicio
+
+    return {
+        "duracao_s": round(duracao_real, 2),
+        "endpoints": resumir(medicoes, duracao_real),
+    }
+
+
+def main():
+    argumentos = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argumentos.add_argument("--url", help="servidor já rodando (não sobe um local)")
+    argumentos.add_argument("--usuarios-virtuais", type=int, default=16)
+    argumentos.add_argument("--duracao", type=float, default=15, help="segundos")
+    argumentos.add_argument("--porta", type=int, default=9101)
+    argumentos.add_argument("--workers", type=int, default=1)
+    argumentos.add_argument("--senhas-processos", type=int)
+    argumentos.add_argument("--custo", type=int, help="BCRYPT_CUSTO do servidor")
+    argumentos.add_argument("--saida", default="benchmarks/login.json")
+    argumentos.add_argument("--comparar", help="JSON de uma execução anterior")
+    argumentos.add_argument(
+        "--tolerancia", type=float, default=0.10, help="piora aceita (0.10 = 10%%)"
+    )
+    opcoes = argumentos.parse_args()
+
+    processo = None
+    url = opcoes.url
+    with tempfile.TemporaryDirectory() as diretorio:
+        if not url:
+            ambiente = {
+                **os.environ,
+                "DATABASE_URL": f"sqlite:///{diretorio}/benchmark.db",
+                "LOG_AMOSTRAGEM": "0",
+            }
+            if opcoes.senhas_processos is not None:
+                ambiente["SENHAS_PROCESSOS"] = str(opcoes.senhas_processos)
+            if opcoes.custo is not None:
+                ambiente["BCRYPT_CUSTO"] = str(opcoes.custo)
+
+            _popular_banco(ambiente, 10, opcoes.usuarios_virtuais)
+            processo = _subir_servidor(ambiente, opcoes.porta, opcoes.workers)
+            url = f"http://127.0.0.1:{opcoes.porta}"
+
+        try:
+            print(
+                f"Rajada de {opcoes.usuarios_virtuais} usuários por {opcoes.duracao}s..."
+            )
+            resultado = asyncio.run(
+                executar_rajada(url, opcoes.usuarios_virtuais, opcoes.duracao)
+            )
+        finally:
+            if processo:
+                processo.terminate()
+                processo.wait()
+
+    resultado = {
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _commit_atual(),
+        "python": platform.python_version(),
+        "parametros": {
+            "usuarios_virtuais": opcoes.usuarios_virtuais,
+            "duracao_s": opcoes.duracao,
+            "workers": opcoes.workers,
+            "senhas_processos": opcoes.senhas_processos,
+            "custo": opcoes.custo,
+        },
+        **resultado,
+    }
+    Path(opcoes.saida).write_text(json.dumps(resultado, indent=2, ensure_ascii=False))
+    print(json.dumps(resultado["endpoints"], indent=2, ensure_ascii=False))
+    print(f"-> {opcoes.saida}")
+
+    if opcoes.comparar:
+        base = json.loads(Path(opcoes.comparar).read_text())
+        regressoes = comparar(resultado, base, opcoes.tolerancia)
+        if regressoes:
+            print("Regressões acima da tolerância: " + ", ".join(regressoes))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
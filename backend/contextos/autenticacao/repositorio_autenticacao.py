@@ -1,5 +1,6 @@
 from typing import Optional
 
+from sqlalchemy import func, update
 from sqlalchemy.orm import Session
 
 from contextos.carrinho.entidade_carrinho import Carrinho
@@ -16,6 +17,31 @@ class AutenticacaoRepository(IRepository):
     def buscar_usuario_por_email(self, usuario_email: str) -> Optional[Usuario]:
         # usuario = db.query(Usuario).filter(Usuario.email.ilike(body.email)).first()
         consulta = self.db.query(Usuario)
-        consulta = consulta.filter(Usuario.email.ilike(usuario_email))
+        consulta = consulta.filter(func.lower(Usuario.email) == usuario_email.lower())
         usuario = consulta.first()
         return usuario
+
+    def buscar_usuario_por_id(self, usuario_id: int) -> Optional[Usuario]:
+        return self.db.get(Usuario, usuario_id)
+
+    def revogar_tokens(self, usuario: Usuario, **alteracoes) -> Usuario:
+        """Aplica as alterações e renova a versão dos tokens na mesma transação."""
+        for campo, valor in alteracoes.items():
+            setattr(usuario, campo, valor)
+        usuario.renovar_versao_token()
+        self.db.commit()
+        # a versão foi incrementada no banco: relê o valor final
+        self.db.refresh(usuario)
+        return usuario
+
+    def trocar_hash_da_senha(self, usuario: Usuario, nova_senha: str) -> bool:
+        # só troca se ninguém mudou a senha entre o login e esta escrita; o
+        # usuario_alterado faz o commit invalidar só este usuário no cache
+        resultado = self.db.execute(
+            update(Usuario)
+            .where(Usuario.id == usuario.id, Usuario.senha == usuario.senha)
+            .values(senha=nova_senha)
+            .execution_options(usuario_alterado=(usuario.id, usuario.email))
+        )
+        self.db.commit()
+        return resultado.rowcount == 1
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy.orm import Session
 
 from contextos.autenticacao.modelos_autenticacao import LoginData, TokenData
-from libs.database.sqlalchemy import pegar_conexao_db
+from contextos.usuarios.entidade_usuario import Usuario
+from libs.autenticacao.config import JWTBearer
+from libs.database.sqlalchemy import executar_na_sessao, pegar_sessao_db
 from contextos.autenticacao.repositorio_autenticacao import AutenticacaoRepository
 from contextos.autenticacao.services_autenticacao import AutenticacaoService
 
@@ -10,10 +12,41 @@ roteador = APIRouter(prefix="/autenticacao", tags=["Autenticação"])
 
 
 @roteador.post("/login")
-def login(body: LoginData, db: Session = Depends(pegar_conexao_db)) -> TokenData:
-    repo_autenticacao = AutenticacaoRepository(db=db)
-    servico_autenticacao = AutenticacaoService(repo_autenticacao)
+async def login(body: LoginData, db: Session = Depends(pegar_sessao_db)) -> TokenData:
+    def buscar_usuario(sessao: Session):
+        servico_autenticacao = AutenticacaoService(AutenticacaoRepository(db=sessao))
+        return servico_autenticacao.buscar_usuario_para_login(email=body.email)
 
-    token = servico_autenticacao.verificar_login(email=body.email, senha=body.senha)
+    usuario = await executar_na_sessao(db, buscar_usuario)
+
+    # o bcrypt roda no pool de processos, fora da sessão e do event loop
+    novo_hash = await AutenticacaoService.conferir_senha(usuario, body.senha)
+    # antes do commit abaixo, que expira os atributos do usuário na sessão
+    token = AutenticacaoService.gerar_token(usuario)
+
+    if novo_hash:
+
+        def atualizar_hash(sessao: Session):
+            servico_autenticacao = AutenticacaoService(
+                AutenticacaoRepository(db=sessao)
+            )
+            servico_autenticacao.atualizar_hash_da_senha(usuario, novo_hash)
+
+        await executar_na_sessao(db, atualizar_hash)
 
     return TokenData(access_token=token, token_type="bearer")
+
+
+# Revoga todos os tokens do usuário, inclusive o usado nesta chamada
+@roteador.post("/logout")
+async def logout(
+    db: Session = Depends(pegar_sessao_db),
+    usuario_do_login: Usuario = Depends(JWTBearer()),
+):
+    def revogar(sessao: Session):
+        servico_autenticacao = AutenticacaoService(AutenticacaoRepository(db=sessao))
+        servico_autenticacao.revogar_tokens(usuario_do_login.id)
+
+    await executar_na_sessao(db, revogar)
+
+    return Response(status_code=204)
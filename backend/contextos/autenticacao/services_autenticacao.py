@@ -1,13 +1,18 @@
+from typing import Optional
+
 from contextos.autenticacao.repositorio_autenticacao import AutenticacaoRepository
+from contextos.usuarios.entidade_usuario import Usuario
 from fastapi import HTTPException
 from libs.autenticacao.config import criar_token_de_acesso_a_rotas_protegidas
+from libs.autenticacao.principal import claims_de_autorizacao, versoes_tokens
+from libs.autenticacao.senhas import PoolSenhas, pool_senhas
 
 
 class AutenticacaoService:
     def __init__(self, repo: AutenticacaoRepository):
         self.repository: AutenticacaoRepository = repo
 
-    def verificar_login(self, email: str, senha: str):
+    def buscar_usuario_para_login(self, email: str) -> Usuario:
         usuario = self.repository.buscar_usuario_por_email(usuario_email=email)
 
         if usuario is None:
@@ -15,11 +20,52 @@ class AutenticacaoService:
                 status_code=400, detail="Não foi possível encontrar o usuário"
             )
 
-        if not usuario.senha == senha:
+        return usuario
+
+    @staticmethod
+    async def conferir_senha(
+        usuario: Usuario, senha: str, pool: PoolSenhas = pool_senhas
+    ) -> Optional[str]:
+        """Verifica a senha no pool de processos do bcrypt.
+
+        Devolve o hash novo quando o guardado usa outro custo (ou ainda é
+        texto puro) e deve ser substituído, ou None.
+        """
+        confere, novo_hash = await pool.verificar(senha, usuario.senha)
+
+        if not confere:
             raise HTTPException(status_code=400, detail="Senha incorreta")
 
-        token = criar_token_de_acesso_a_rotas_protegidas(
-            data={"sub": usuario.email, "id": usuario.id}
+        return novo_hash
+
+    def buscar_usuario_por_id(self, usuario_id: int) -> Usuario:
+        usuario = self.repository.buscar_usuario_por_id(usuario_id)
+
+        if usuario is None:
+            raise HTTPException(status_code=404, detail="Usuário não encontrado")
+
+        return usuario
+
+    def revogar_tokens(self, usuario_id: int, **alteracoes) -> Usuario:
+        """Invalida todos os tokens do usuário (logout, desativação, troca de
+        senha), aplicando as alterações junto."""
+        usuario = self.buscar_usuario_por_id(usuario_id)
+        usuario = self.repository.revogar_tokens(usuario, **alteracoes)
+        # neste worker vale na hora; os outros sabem na próxima releitura
+        versoes_tokens.registrar(
+            usuario.id, usuario.versao_token, usuario.token_renovado_em
         )
+        return usuario
 
-        return token
+    def atualizar_hash_da_senha(self, usuario: Usuario, novo_hash: str):
+        self.repository.trocar_hash_da_senha(usuario=usuario, nova_senha=novo_hash)
+
+    @staticmethod
+    def gerar_token(usuario: Usuario) -> str:
+        return criar_token_de_acesso_a_rotas_protegidas(
+            data={
+                "sub": usuario.email,
+                "id": usuario.id,
+                **claims_de_autorizacao(usuario),
+            }
+        )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Numeric, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Numeric, Boolean, Index
 from sqlalchemy.orm import relationship
 from libs.database.sqlalchemy import _Base
 # from contextos.livros.entidade_livro import Livro
@@ -6,6 +6,10 @@ from libs.database.sqlalchemy import _Base
 
 class Carrinho(_Base):
     __tablename__ = "carrinho"
+    # uma linha por livro no carrinho do usuário, adicionar de novo soma a quantidade
+    __table_args__ = (
+        Index("uq_carrinho_usuario_id_livro_id", "usuario_id", "livro_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
@@ -26,7 +30,6 @@ class Carrinho(_Base):
         return f"<Carrinho {self.id} - {self.usuario_id} - {self.livro_id} - {self.quantidade} >"
 
     # Todo:
-    # - coluna livro id unico (unique)
     # - remover coluna e codigo referente ao total
 
     # api de visualização deve buscar pelo id do usuario (get), id do usuario vai trazer todos os itens associados, é necessário fazer um join entre livro e carrinho:
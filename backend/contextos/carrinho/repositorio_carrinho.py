@@ -1,5 +1,10 @@
+from decimal import Decimal
 from typing import Optional
 
+from sqlalchemy import Insert, Integer, Select, func, literal, select
+from sqlalchemy.dialects.postgresql import insert as insert_postgres
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from contextos.carrinho.entidade_carrinho import Carrinho
@@ -9,32 +14,68 @@ from libs.repository.repositorio_interface import IRepository
 from contextos.usuarios.entidade_usuario import Usuario
 
 
+# Comandos compartilhados pelos repositórios síncrono e assíncrono.
+def _comando_adicionar_ou_somar(
+    dialeto: str, usuario_id: int, livro_id: int, quantidade: int
+) -> Insert:
+    if dialeto == "postgresql":
+        insert = insert_postgres
+    else:
+        insert = insert_sqlite
+
+    livro_com_estoque = select(
+        literal(usuario_id, Integer), Livro.id, literal(quantidade, Integer)
+    ).where(Livro.id == livro_id, Livro.quantidade > quantidade)
+
+    comando = insert(Carrinho).from_select(
+        ["usuario_id", "livro_id", "quantidade"], livro_com_estoque
+    )
+    nova_quantidade = Carrinho.quantidade + comando.excluded.quantidade
+    estoque = select(Livro.quantidade).where(Livro.id == livro_id).scalar_subquery()
+    return comando.on_conflict_do_update(
+        index_elements=[Carrinho.usuario_id, Carrinho.livro_id],
+        set_={"quantidade": nova_quantidade},
+        where=nova_quantidade < estoque,
+    ).returning(Carrinho.id)
+
+
+def _consulta_carrinho_agrupado(usuario_id: int) -> Select:
+    quantidade = func.sum(Carrinho.quantidade).label("quantidade")
+    total = func.sum(Carrinho.quantidade * Livro.preco).label("total")
+
+    consulta = select(Livro, quantidade, total)
+    consulta = consulta.join(Carrinho, Carrinho.livro_id == Livro.id)
+    consulta = consulta.where(Carrinho.usuario_id == usuario_id)
+    consulta = consulta.group_by(Livro.id)
+    # mantém a ordem em que os livros entraram no carrinho
+    return consulta.order_by(func.min(Carrinho.id))
+
+
 class CarrinhoRepository(IRepository):
     def __init__(self, db: Session):
         self.db = db
 
-    def buscar_livro_por_usuario(self, livro_id: str) -> Optional[Livro]:
-        consulta = self.db.query(Livro)
-        consulta = consulta.filter(Livro.id == livro_id)
-        livro = consulta.first()
-        return livro
+    def adicionar_ou_somar_item(
+        self, usuario_id: int, livro_id: int, quantidade: int
+    ) -> Optional[int]:
+        """Insere o item ou soma na linha existente, num único comando atômico.
 
-    def buscar_carrinhos_do_usuario(
-        self, livro_id: int, usuario_id: int
-    ) -> list[Carrinho]:
-        consulta = self.db.query(Carrinho)
-        consulta = consulta.filter(Carrinho.livro_id == livro_id)
-        consulta = consulta.filter(Carrinho.usuario_id == usuario_id)
-        consulta = consulta.all()
-        return consulta
+        Só grava se a quantidade final no carrinho ficar abaixo do estoque do
+        livro. Devolve o id da linha do carrinho, ou None quando nada foi gravado
+        (livro inexistente ou estoque insuficiente).
+        """
+        comando = _comando_adicionar_ou_somar(
+            self.db.get_bind().dialect.name, usuario_id, livro_id, quantidade
+        )
+        carrinho_id = self.db.execute(comando).scalar()
+        self.db.commit()
+        return carrinho_id
 
-    def buscar_carrinho_do_usuario(
+    def buscar_carrinho_agrupado_do_usuario(
         self, usuario_id: int
-    ) -> list[tuple[Carrinho, Livro]]:
-        consulta = self.db.query(Carrinho, Livro)
-        consulta = consulta.join(Livro, Carrinho.livro_id == Livro.id)
-        consulta = consulta.filter(Carrinho.usuario_id == usuario_id)
-        carrinho = consulta.all()
+    ) -> list[tuple[Livro, int, Decimal]]:
+        """Uma linha por livro: (livro, soma das quantidades, soma de quantidade * preço)."""
+        carrinho = self.db.execute(_consulta_carrinho_agrupado(usuario_id)).all()
         return carrinho
 
     def buscar_carrinho_por_id_e_livro_id(
@@ -54,3 +95,30 @@ class CarrinhoRepository(IRepository):
         consulta = consulta.filter(Livro.id == livro_id)
         livro = consulta.first()
         return livro
+
+
+class CarrinhoRepositoryAsync:
+    """Adicionar e ver o carrinho numa AsyncSession, com os mesmos comandos
+    do CarrinhoRepository. Usado pelas rotas com DB_ASYNC."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def adicionar_ou_somar_item(
+        self, usuario_id: int, livro_id: int, quantidade: int
+    ) -> Optional[int]:
+        comando = _comando_adicionar_ou_somar(
+            self.db.bind.dialect.name, usuario_id, livro_id, quantidade
+        )
+        carrinho_id = (await self.db.execute(comando)).scalar()
+        await self.db.commit()
+        return carrinho_id
+
+    async def buscar_carrinho_agrupado_do_usuario(
+        self, usuario_id: int
+    ) -> list[tuple[Livro, int, Decimal]]:
+        resultado = await self.db.execute(_consulta_carrinho_agrupado(usuario_id))
+        return resultado.all()
+
+    async def buscar_livro_por_id(self, livro_id: int) -> Optional[Livro]:
+        return await self.db.scalar(select(Livro).where(Livro.id == livro_id))
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from contextos.carrinho.entidade_carrinho import Carrinho
@@ -12,65 +13,84 @@ from contextos.carrinho.modelo_carrinho import (
 from contextos.livros.entidade_livro import Livro
 from contextos.usuarios.entidade_usuario import Usuario
 from libs.autenticacao.config import JWTBearer
-from libs.database.sqlalchemy import pegar_conexao_db
+from libs.database.sqlalchemy import (
+    SessaoRota,
+    executar_na_sessao,
+    pegar_sessao_db,
+    pegar_sessao_db_quente,
+)
 from contextos.carrinho.repositorio_carrinho import (
     CarrinhoRepository,
+    CarrinhoRepositoryAsync,
 )
-from contextos.carrinho.services_carrinho import CarrinhoService
+from contextos.carrinho.services_carrinho import CarrinhoService, CarrinhoServiceAsync
 
 roteador = APIRouter(prefix="/carrinho", tags=["Carrinho"])
 
 
 @roteador.post("/adicionar")
-def adicionar_item_no_carrinho(
+async def adicionar_item_no_carrinho(
     item: AdicionarItemCarrinho,
-    db: Session = Depends(pegar_conexao_db),
+    db: SessaoRota = Depends(pegar_sessao_db_quente),
     usuario_do_login: Usuario = Depends(JWTBearer()),
 ):
-    repo_carrinho = CarrinhoRepository(db=db)
-    servico_carrinho = CarrinhoService(repo_carrinho)
-
-    servico_carrinho.adicionar_item_no_carrinho(
+    parametros = dict(
         livro_id=item.livro_id,
         usuario_id=usuario_do_login.id,
         quantidade_item=item.quantidade,
     )
 
+    def adicionar(sessao: Session):
+        servico_carrinho = CarrinhoService(CarrinhoRepository(db=sessao))
+        servico_carrinho.adicionar_item_no_carrinho(**parametros)
+
+    async def adicionar_async(sessao: AsyncSession):
+        servico_carrinho = CarrinhoServiceAsync(CarrinhoRepositoryAsync(db=sessao))
+        await servico_carrinho.adicionar_item_no_carrinho(**parametros)
+
+    await executar_na_sessao(db, adicionar, adicionar_async)
+
     return Response(status_code=200)
 
 
 # Endpoint para visualizar o carrinho
 @roteador.get("/")
-def buscar_carrinho_do_usuario(
-    db: Session = Depends(pegar_conexao_db),
+async def buscar_carrinho_do_usuario(
+    db: SessaoRota = Depends(pegar_sessao_db_quente),
     usuario_do_login: Usuario = Depends(JWTBearer()),
 ) -> CarrinhoFinal:
-    repo_carrinho = CarrinhoRepository(db=db)
-    servico_carrinho = CarrinhoService(repo_carrinho)
+    def buscar(sessao: Session) -> CarrinhoFinal:
+        servico_carrinho = CarrinhoService(CarrinhoRepository(db=sessao))
+        return servico_carrinho.buscar_carrinho_do_usuario(usuario_do_login.id)
 
-    carrinho_final = servico_carrinho.buscar_carrinho_do_usuario(
-        usuario_id=usuario_do_login.id
-    )
+    async def buscar_async(sessao: AsyncSession) -> CarrinhoFinal:
+        servico_carrinho = CarrinhoServiceAsync(CarrinhoRepositoryAsync(db=sessao))
+        return await servico_carrinho.buscar_carrinho_do_usuario(usuario_do_login.id)
+
+    carrinho_final = await executar_na_sessao(db, buscar, buscar_async)
 
     return carrinho_final
 
 
 # Endpoint para adicionar um item ao carrinho
 @roteador.delete("/remover-item/{livro_id}/{quantidade}")
-def remover_item_no_carrinho(
+async def remover_item_no_carrinho(
     livro_id: int,
     quantidade: int,
-    db: Session = Depends(pegar_conexao_db),
+    db: Session = Depends(pegar_sessao_db),
     usuario_do_login: Usuario = Depends(JWTBearer()),
 ):
-    repo_carrinho = CarrinhoRepository(db=db)
-    servico_carrinho = CarrinhoService(repo_carrinho)
+    def remover(sessao: Session):
+        repo_carrinho = CarrinhoRepository(db=sessao)
+        servico_carrinho = CarrinhoService(repo_carrinho)
 
-    servico_carrinho.remover_item_no_carrinho(
-        livro_id=livro_id,
-        quantidade=quantidade,
-        usuario_id=usuario_do_login.id,
-    )
+        servico_carrinho.remover_item_no_carrinho(
+            livro_id=livro_id,
+            quantidade=quantidade,
+            usuario_id=usuario_do_login.id,
+        )
+
+    await executar_na_sessao(db, remover)
 
     return Response(status_code=200)
 
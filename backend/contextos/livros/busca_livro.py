@@ -0,0 +1,342 @@
+import bisect
+import math
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy import (
+    Select,
+    bindparam,
+    case,
+    column,
+    false,
+    func,
+    literal_column,
+    table,
+    text,
+)
+from sqlalchemy.orm import Session
+
+from contextos.livros.entidade_livro import Livro
+
+# Peso de cada campo no ranking: título pesa mais que o nome do autor,
+# que pesa mais que gênero e descrição.
+PESOS_CAMPOS = {"titulo": 10.0, "descricao": 2.0, "genero": 3.0, "autor": 5.0}
+
+_SELECT_DOCUMENTOS = """
+    SELECT livros.id, livros.titulo, livros.descricao, livros.genero,
+           usuarios.nome || ' ' || usuarios.sobrenome AS autor
+    FROM livros
+    JOIN usuarios ON usuarios.id = livros.usuario_id
+"""
+
+# o índice em memória também guarda o dono de cada livro, para filtrar por autor
+_SELECT_DOCUMENTOS_COM_DONO = _SELECT_DOCUMENTOS.replace(
+    "SELECT livros.id,", "SELECT livros.id, livros.usuario_id,", 1
+)
+
+
+def normalizar_termos(texto: Optional[str]) -> list[str]:
+    """Quebra o texto em termos minúsculos e sem acento."""
+    if not texto:
+        return []
+
+    texto = unicodedata.normalize("NFKD", texto)
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.findall(r"\w+", texto.lower())
+
+
+class IIndiceBuscaLivro(ABC):
+    @abstractmethod
+    def preparar(self, db: Session): ...
+
+    def carregar(self, db: Session):
+        """Chamado no startup de cada processo; o padrão não guarda nada localmente."""
+
+    @abstractmethod
+    def indexar(self, db: Session, livro_id: int): ...
+
+    @abstractmethod
+    def remover(self, db: Session, livro_id: int): ...
+
+    def indexar_varios(self, db: Session, livro_ids: list[int]):
+        for livro_id in livro_ids:
+            self.indexar(db, livro_id)
+
+    @abstractmethod
+    def filtrar(self, consulta: Select, busca: str) -> Select:
+        """Restringe a consulta de Livro aos resultados da busca, ordenados por relevância."""
+
+    def ranquear(
+        self, busca: str, usuario_id: Optional[int] = None
+    ) -> Optional[list[int]]:
+        """Ids de todos os resultados, do mais ao menos relevante.
+
+        Para índices que ranqueiam fora do banco. None (padrão): a consulta
+        usa filtrar() e o próprio banco ordena e pagina.
+        """
+        return None
+
+
+class IndiceBuscaFTS5(IIndiceBuscaLivro):
+    """Tabela virtual FTS5 do SQLite, atualizada na mesma transação do livro."""
+
+    nome_tabela = "livros_busca"
+
+    def __init__(self):
+        self.tabela = table(self.nome_tabela, column("rowid"))
+
+    def preparar(self, db: Session):
+        existe = db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nome"),
+            {"nome": self.nome_tabela},
+        ).first()
+        if existe:
+            return
+
+        db.execute(
+            text(
+                f"CREATE VIRTUAL TABLE {self.nome_tabela} USING fts5("
+                "titulo, descricao, genero, autor, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        )
+        db.execute(
+            text(
+                f"INSERT INTO {self.nome_tabela} "
+                "(rowid, titulo, descricao, genero, autor) "
+                f"{_SELECT_DOCUMENTOS} WHERE NOT livros.deletado"
+            )
+        )
+        db.commit()
+
+    def indexar(self, db: Session, livro_id: int):
+        self.remover(db, livro_id)
+        db.execute(
+            text(
+                f"INSERT INTO {self.nome_tabela} "
+                "(rowid, titulo, descricao, genero, autor) "
+                f"{_SELECT_DOCUMENTOS} "
+                "WHERE livros.id = :id AND NOT livros.deletado"
+            ),
+            {"id": livro_id},
+        )
+
+    def remover(self, db: Session, livro_id: int):
+        db.execute(
+            text(f"DELETE FROM {self.nome_tabela} WHERE rowid = :id"),
+            {"id": livro_id},
+        )
+
+    def indexar_varios(self, db: Session, livro_ids: list[int]):
+        # livros recém-inseridos: um único INSERT ... SELECT para o lote todo
+        db.execute(
+            text(
+                f"INSERT INTO {self.nome_tabela} "
+                "(rowid, titulo, descricao, genero, autor) "
+                f"{_SELECT_DOCUMENTOS} "
+                "WHERE livros.id IN :ids AND NOT livros.deletado"
+            ).bindparams(bindparam("ids", expanding=True)),
+            {"ids": livro_ids},
+        )
+
+    def filtrar(self, consulta: Select, busca: str) -> Select:
+        termos = normalizar_termos(busca)
+        if not termos:
+            return consulta
+
+        # cada termo vira um prefixo: "harr pot" -> "harr"* AND "pot"*
+        expressao = " AND ".join(f'"{termo}"*' for termo in termos)
+        coluna_tabela = literal_column(self.nome_tabela)
+        relevancia = func.bm25(coluna_tabela, *PESOS_CAMPOS.values())
+
+        consulta = consulta.join(self.tabela, self.tabela.c.rowid == Livro.id)
+        consulta = consulta.filter(coluna_tabela.op("MATCH")(expressao))
+        return consulta.order_by(relevancia, Livro.id)
+
+
+class IndiceBuscaMemoria(IIndiceBuscaLivro):
+    """Índice invertido em memória, usado quando o banco não tem FTS5."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # termo -> {livro_id: pontuação do termo no livro}
+        self._postings: dict[str, dict[int, float]] = defaultdict(dict)
+        self._termos_ordenados: list[str] = []
+        self._termos_por_livro: dict[int, set[str]] = {}
+        self._dono_por_livro: dict[int, int] = {}
+
+    def preparar(self, db: Session):
+        linhas = db.execute(
+            text(f"{_SELECT_DOCUMENTOS_COM_DONO} WHERE NOT livros.deletado")
+        ).all()
+        with self._lock:
+            self._postings.clear()
+            self._termos_por_livro.clear()
+            self._dono_por_livro.clear()
+            for linha in linhas:
+                self._adicionar(linha, ordenar=False)
+            self._termos_ordenados = sorted(self._postings)
+
+    def carregar(self, db: Session):
+        # o índice vive na memória do processo: cada worker monta o seu
+        self.preparar(db)
+
+    def indexar(self, db: Session, livro_id: int):
+        linha = db.execute(
+            text(
+                f"{_SELECT_DOCUMENTOS_COM_DONO} "
+                "WHERE livros.id = :id AND NOT livros.deletado"
+            ),
+            {"id": livro_id},
+        ).first()
+        with self._lock:
+            self._remover(livro_id)
+            if linha:
+                self._adicionar(linha)
+
+    def remover(self, db: Session, livro_id: int):
+        with self._lock:
+            self._remover(livro_id)
+
+    def indexar_varios(self, db: Session, livro_ids: list[int]):
+        linhas = db.execute(
+            text(
+                f"{_SELECT_DOCUMENTOS_COM_DONO} "
+                "WHERE livros.id IN :ids AND NOT livros.deletado"
+            ).bindparams(bindparam("ids", expanding=True)),
+            {"ids": livro_ids},
+        ).all()
+        with self._lock:
+            for linha in linhas:
+                self._remover(linha.id)
+                self._adicionar(linha)
+
+    def filtrar(self, consulta: Select, busca: str) -> Select:
+        # o repositório prefere ranquear() e carrega só os ids da página; aqui
+        # os ids e a ordem do ranking vão inteiros para a consulta
+        livro_ids = self.ranquear(busca)
+        if livro_ids is None:
+            return consulta
+        if not livro_ids:
+            return consulta.filter(false())
+
+        posicao = case(
+            {livro_id: posicao for posicao, livro_id in enumerate(livro_ids)},
+            value=Livro.id,
+        )
+        consulta = consulta.filter(Livro.id.in_(livro_ids))
+        return consulta.order_by(posicao, Livro.id)
+
+    def ranquear(
+        self, busca: str, usuario_id: Optional[int] = None
+    ) -> Optional[list[int]]:
+        termos = normalizar_termos(busca)
+        if not termos:
+            return None
+        return self._buscar_ids(termos, usuario_id)
+
+    def _buscar_ids(
+        self, termos: list[str], usuario_id: Optional[int] = None
+    ) -> list[int]:
+        with self._lock:
+            total_documentos = max(len(self._termos_por_livro), 1)
+            pontuacoes: Optional[dict[int, float]] = None
+
+            for termo in termos:
+                pontuacoes_termo: dict[int, float] = defaultdict(float)
+                inicio = bisect.bisect_left(self._termos_ordenados, termo)
+                for indexado in self._termos_ordenados[inicio:]:
+                    if not indexado.startswith(termo):
+                        break
+                    postings = self._postings[indexado]
+                    idf = math.log(1 + total_documentos / len(postings))
+                    for livro_id, peso in postings.items():
+                        pontuacoes_termo[livro_id] += peso * idf
+
+                # todos os termos precisam aparecer (AND)
+                if pontuacoes is None:
+                    pontuacoes = dict(pontuacoes_termo)
+                else:
+                    pontuacoes = {
+                        livro_id: pontuacao + pontuacoes_termo[livro_id]
+                        for livro_id, pontuacao in pontuacoes.items()
+                        if livro_id in pontuacoes_termo
+                    }
+                if not pontuacoes:
+                    return []
+
+            if usuario_id is not None:
+                pontuacoes = {
+                    livro_id: pontuacao
+                    for livro_id, pontuacao in pontuacoes.items()
+                    if self._dono_por_livro.get(livro_id) == usuario_id
+                }
+
+        # todos os resultados, sem corte: total e páginas saem exatos
+        ordenados = sorted(pontuacoes.items(), key=lambda item: (-item[1], item[0]))
+        return [livro_id for livro_id, _ in ordenados]
+
+    def _adicionar(self, linha, ordenar: bool = True):
+        livro_id = linha.id
+        termos_do_livro = set()
+        for campo, peso in PESOS_CAMPOS.items():
+            for termo in normalizar_termos(getattr(linha, campo)):
+                if ordenar and termo not in self._postings:
+                    bisect.insort(self._termos_ordenados, termo)
+                self._postings[termo][livro_id] = (
+                    self._postings[termo].get(livro_id, 0.0) + peso
+                )
+                termos_do_livro.add(termo)
+        self._termos_por_livro[livro_id] = termos_do_livro
+        self._dono_por_livro[livro_id] = linha.usuario_id
+
+    def _remover(self, livro_id: int):
+        self._dono_por_livro.pop(livro_id, None)
+        for termo in self._termos_por_livro.pop(livro_id, set()):
+            postings = self._postings.get(termo)
+            if postings is None:
+                continue
+            postings.pop(livro_id, None)
+            if not postings:
+                del self._postings[termo]
+                posicao = bisect.bisect_left(self._termos_ordenados, termo)
+                del self._termos_ordenados[posicao]
+
+
+BACKENDS_BUSCA: dict[str, type[IIndiceBuscaLivro]] = {
+    "fts5": IndiceBuscaFTS5,
+    "memoria": IndiceBuscaMemoria,
+}
+
+
+def _sqlite_tem_fts5() -> bool:
+    try:
+        conexao = sqlite3.connect(":memory:")
+        conexao.execute("CREATE VIRTUAL TABLE teste USING fts5(campo)")
+        conexao.close()
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def escolher_backend_busca(dialeto: str) -> str:
+    """Nome do backend pela variável BUSCA_BACKEND (fts5, memoria ou auto)."""
+    backend = os.getenv("BUSCA_BACKEND", "auto").lower()
+    if backend == "auto":
+        usa_fts5 = dialeto == "sqlite" and _sqlite_tem_fts5()
+        backend = "fts5" if usa_fts5 else "memoria"
+    return backend
+
+
+@lru_cache(maxsize=None)
+def pegar_indice_busca() -> IIndiceBuscaLivro:
+    from libs.database.sqlalchemy import pegar_engine
+
+    return BACKENDS_BUSCA[escolher_backend_busca(pegar_engine().dialect.name)]()
@@ -0,0 +1,15 @@
+import os
+
+from libs.cache.respostas import criar_cache_respostas
+
+# Respostas das rotas públicas de livros. As escritas em LivroService e as
+# baixas de estoque em VendaService invalidam os livros afetados.
+cache_livros = criar_cache_respostas()
+
+# CDN e clientes podem reaproveitar por alguns segundos e depois revalidam
+# com If-None-Match / If-Modified-Since
+CACHE_CONTROL_CATALOGO = (
+    f"public, max-age={int(os.getenv('CATALOGO_MAX_AGE', '10'))}, must-revalidate"
+)
+# listagem do autor logado: nunca em cache compartilhado, sempre revalida
+CACHE_CONTROL_PRIVADO = "private, no-cache"
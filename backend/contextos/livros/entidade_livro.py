@@ -1,7 +1,11 @@
+from datetime import datetime
+
 from sqlalchemy import (
     Boolean,
     Column,
+    DateTime,
     ForeignKey,
+    Index,
     Integer,
     Numeric,
     String,
@@ -13,6 +17,7 @@ from libs.database.sqlalchemy import _Base
 
 class Livro(_Base):
     __tablename__ = "livros"
+    __table_args__ = (Index("ix_livros_deletado_usuario_id", "deletado", "usuario_id"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     titulo = Column(String(200), nullable=False)
@@ -23,6 +28,9 @@ class Livro(_Base):
     descricao = Column(String(250), nullable=False)
     url_imagem = Column(String(), nullable=False)
     deletado = Column(Boolean, default=False, nullable=False)
+    # incrementada a cada alteração; base das ETags das rotas de livros
+    versao = Column(Integer, default=1, nullable=False)
+    atualizado_em = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     @classmethod
     def criar(
@@ -39,6 +47,11 @@ class Livro(_Base):
             deletado=False,
         )
 
+    def marcar_alterado(self):
+        # expressão SQL: o incremento acontece no banco, sem perder alterações concorrentes
+        self.versao = Livro.versao + 1
+        self.atualizado_em = datetime.utcnow()
+
     def decrementar_quantidade_disponivel(self, quantidade: int = 1):
         self.quantidade -= quantidade
 
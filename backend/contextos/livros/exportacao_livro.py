@@ -0,0 +1,70 @@
+import csv
+import io
+import json
+from decimal import Decimal
+from typing import Iterator
+
+from contextos.livros.entidade_livro import Livro
+from contextos.livros.modelos_livro import LivroRetorno
+
+# mesmas colunas (e ordem) do LivroRetorno
+COLUNAS_EXPORTACAO = list(LivroRetorno.model_fields)
+
+# formato -> (media type, extensão do arquivo)
+FORMATOS_EXPORTACAO = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "colunar": ("application/x-ndjson", "colunar.ndjson"),
+}
+
+
+def _valores(livro: Livro) -> list:
+    valores = [getattr(livro, coluna) for coluna in COLUNAS_EXPORTACAO]
+    return [float(valor) if isinstance(valor, Decimal) else valor for valor in valores]
+
+
+def exportar_csv(lotes: Iterator[list[Livro]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUNAS_EXPORTACAO)
+
+    for lote in lotes:
+        escritor.writerows(_valores(livro) for livro in lote)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def exportar_ndjson(lotes: Iterator[list[Livro]]) -> Iterator[str]:
+    for lote in lotes:
+        yield "".join(
+            json.dumps(
+                dict(zip(COLUNAS_EXPORTACAO, _valores(livro))), ensure_ascii=False
+            )
+            + "\n"
+            for livro in lote
+        )
+
+
+def exportar_colunar(lotes: Iterator[list[Livro]]) -> Iterator[str]:
+    """Uma linha JSON por lote, com os valores agrupados por coluna.
+
+    Cada linha equivale a um row group do Parquet: ferramentas de análise
+    montam as colunas direto, sem reprocessar linha a linha.
+    """
+    for lote in lotes:
+        linhas = [_valores(livro) for livro in lote]
+        colunas = {
+            coluna: [linha[posicao] for linha in linhas]
+            for posicao, coluna in enumerate(COLUNAS_EXPORTACAO)
+        }
+        yield json.dumps(colunas, ensure_ascii=False) + "\n"
+
+
+EXPORTADORES_POR_FORMATO = {
+    "csv": exportar_csv,
+    "ndjson": exportar_ndjson,
+    "colunar": exportar_colunar,
+}
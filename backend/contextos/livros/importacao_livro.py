@@ -0,0 +1,183 @@
+import codecs
+import csv
+import json
+import os
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from contextos.livros.modelos_livro import (
+    CadastrarLivro,
+    ErroImportacaoLivro,
+    RetornoImportacaoLivros,
+)
+
+TAMANHO_LOTE_IMPORTACAO = int(os.getenv("IMPORTACAO_TAMANHO_LOTE", "500"))
+LIMITE_ERROS_IMPORTACAO = int(os.getenv("IMPORTACAO_LIMITE_ERROS", "1000"))
+
+FORMATOS_POR_CONTENT_TYPE = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/x-jsonlines": "ndjson",
+}
+
+# (número da linha no arquivo, campos lidos, erro de leitura)
+Registro = tuple[int, Optional[dict], Optional[str]]
+
+
+def escolher_formato(formato: Optional[str], content_type: Optional[str]) -> str:
+    if formato:
+        formato = formato.lower()
+    elif content_type:
+        formato = FORMATOS_POR_CONTENT_TYPE.get(
+            content_type.split(";")[0].strip().lower()
+        )
+
+    if formato not in ("csv", "ndjson"):
+        raise HTTPException(
+            status_code=415,
+            detail="Envie o arquivo como text/csv ou application/x-ndjson.",
+        )
+    return formato
+
+
+async def _iterar_linhas(partes: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Quebra o corpo recebido em linhas sem juntar o arquivo inteiro na memória."""
+    decodificador = codecs.getincrementaldecoder("utf-8-sig")()
+    resto = ""
+    try:
+        async for parte in partes:
+            linhas = (resto + decodificador.decode(parte)).split("\n")
+            resto = linhas.pop()
+            for linha in linhas:
+                yield linha + "\n"
+        resto += decodificador.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="O arquivo deve estar em UTF-8.")
+
+    if resto:
+        yield resto
+
+
+async def iterar_registros_csv(partes: AsyncIterator[bytes]) -> AsyncIterator[Registro]:
+    """Lê o CSV registro a registro; a primeira linha é o cabeçalho."""
+    cabecalho = None
+    registro = ""
+    numero_linha = 0
+    linha_inicial = 0
+
+    async for linha in _iterar_linhas(partes):
+        numero_linha += 1
+        if not registro:
+            linha_inicial = numero_linha
+        registro += linha
+
+        # aspas abertas: o campo continua na próxima linha
+        if registro.count('"') % 2:
+            continue
+
+        campos = next(csv.reader([registro]), [])
+        registro = ""
+        if not any(campo.strip() for campo in campos):
+            continue
+
+        if cabecalho is None:
+            cabecalho = [campo.strip() for campo in campos]
+            continue
+
+        if len(campos) != len(cabecalho):
+            yield (
+                linha_inicial,
+                None,
+                f"Esperava {len(cabecalho)} colunas, encontrou {len(campos)}.",
+            )
+            continue
+
+        yield linha_inicial, dict(zip(cabecalho, campos)), None
+
+    if registro:
+        yield linha_inicial, None, "Campo entre aspas não foi fechado."
+
+
+async def iterar_registros_ndjson(
+    partes: AsyncIterator[bytes],
+) -> AsyncIterator[Registro]:
+    """Lê um objeto JSON por linha."""
+    numero_linha = 0
+    async for linha in _iterar_linhas(partes):
+        numero_linha += 1
+        if not linha.strip():
+            continue
+
+        try:
+            dados = json.loads(linha)
+        except json.JSONDecodeError as erro:
+            yield numero_linha, None, f"JSON inválido: {erro.msg}."
+            continue
+
+        if not isinstance(dados, dict):
+            yield numero_linha, None, "Cada linha deve ser um objeto JSON."
+            continue
+
+        yield numero_linha, dados, None
+
+
+LEITORES_POR_FORMATO = {
+    "csv": iterar_registros_csv,
+    "ndjson": iterar_registros_ndjson,
+}
+
+
+async def importar_livros(
+    partes: AsyncIterator[bytes],
+    formato: str,
+    cadastrar_lote: Callable[[list[CadastrarLivro]], Awaitable[int]],
+    tamanho_lote: int = TAMANHO_LOTE_IMPORTACAO,
+) -> RetornoImportacaoLivros:
+    """Valida cada registro e grava os válidos em lotes de tamanho_lote.
+
+    Linhas inválidas entram no relatório de erros e não interrompem a importação.
+    Cada lote é gravado na sua própria transação.
+    """
+    lote: list[CadastrarLivro] = []
+    importados = 0
+    com_erro = 0
+    erros: list[ErroImportacaoLivro] = []
+
+    def registrar_erro(linha: int, mensagens: list[str]):
+        nonlocal com_erro
+        com_erro += 1
+        if len(erros) < LIMITE_ERROS_IMPORTACAO:
+            erros.append(ErroImportacaoLivro(linha=linha, erros=mensagens))
+
+    async for linha, dados, erro in LEITORES_POR_FORMATO[formato](partes):
+        if erro:
+            registrar_erro(linha, [erro])
+            continue
+
+        try:
+            lote.append(CadastrarLivro(**dados))
+        except ValidationError as erro_validacao:
+            registrar_erro(
+                linha,
+                [
+                    f"{'.'.join(str(parte) for parte in detalhe['loc'])}: {detalhe['msg']}"
+                    for detalhe in erro_validacao.errors()
+                ],
+            )
+            continue
+
+        if len(lote) >= tamanho_lote:
+            importados += await cadastrar_lote(lote)
+            lote = []
+
+    if lote:
+        importados += await cadastrar_lote(lote)
+
+    return RetornoImportacaoLivros(
+        importados=importados, com_erro=com_erro, erros=erros
+    )
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 
@@ -28,8 +30,21 @@ class LivroRetorno(BaseModel):
 
 
 class RetonoPaginaLivros(BaseModel):
-    total: int
-    pagina: int
-    total_paginas: int
+    total: Optional[int] = None
+    pagina: Optional[int] = None
+    total_paginas: Optional[int] = None
     tamanho_pagina: int
+    proximo_cursor: Optional[str] = None
     data: list[LivroRetorno]
+
+
+class ErroImportacaoLivro(BaseModel):
+    linha: int
+    erros: list[str]
+
+
+class RetornoImportacaoLivros(BaseModel):
+    importados: int
+    com_erro: int
+    # só as primeiras linhas com erro são detalhadas, para a resposta não crescer sem limite
+    erros: list[ErroImportacaoLivro]
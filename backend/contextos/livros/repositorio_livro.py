@@ -1,16 +1,100 @@
-from typing import Optional
+from typing import Iterator, Optional
 
-from sqlalchemy import or_
+from sqlalchemy import Select, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from contextos.livros.busca_livro import IIndiceBuscaLivro, pegar_indice_busca
 from contextos.livros.entidade_livro import Livro
-from contextos.usuarios.entidade_usuario import Usuario
 from libs.repository.repositorio_interface import IRepository
 
+# (livros da página, total, total de páginas, tem próxima página)
+PaginaLivros = tuple[list[Livro], Optional[int], Optional[int], bool]
+
+
+# Consultas compartilhadas pelos repositórios síncrono e assíncrono: os dois
+# só diferem em como executam.
+def _consulta_livros_ativos(
+    indice_busca: IIndiceBuscaLivro, filtro: Optional[str], usuario: Optional[int]
+) -> Select:
+    consulta = select(Livro).where(Livro.deletado == False)
+
+    if filtro:
+        # resultados da busca já vêm ordenados por relevância
+        consulta = indice_busca.filtrar(consulta, filtro)
+    else:
+        consulta = consulta.order_by(Livro.id)
+
+    if usuario:
+        consulta = consulta.where(Livro.usuario_id == usuario)
+
+    return consulta
+
+
+def _consulta_total(consulta: Select) -> Select:
+    return select(func.count()).select_from(consulta.order_by(None).subquery())
+
+
+def _consulta_pagina(
+    consulta: Select, pagina: int, quantidade: int, apos_id: Optional[int]
+) -> Select:
+    # com cursor a busca parte do último id visto (keyset), sem offset
+    if apos_id is not None:
+        consulta = consulta.where(Livro.id > apos_id)
+    else:
+        consulta = consulta.offset((pagina - 1) * quantidade)
+
+    # busca um item a mais só para saber se existe próxima página
+    return consulta.limit(quantidade + 1)
+
+
+def _consulta_livros_por_id(livro_ids: list[int]) -> Select:
+    return select(Livro).where(Livro.deletado == False, Livro.id.in_(livro_ids))
+
+
+def _na_ordem(livros: list[Livro], livro_ids: list[int]) -> list[Livro]:
+    por_id = {livro.id: livro for livro in livros}
+    return [por_id[livro_id] for livro_id in livro_ids if livro_id in por_id]
+
+
+def _total_de_paginas(total_de_livros: Optional[int], quantidade: int):
+    if total_de_livros is None:
+        return None
+    return (total_de_livros + quantidade - 1) // quantidade
+
+
+def _pagina_ranqueada(
+    ids_ranqueados: list[int], pagina: int, quantidade: int, com_total: bool
+) -> tuple[list[int], Optional[int], Optional[int], bool]:
+    # o índice já filtrou e ordenou tudo: o banco só carrega a página
+    inicio = (pagina - 1) * quantidade
+    total_de_livros = len(ids_ranqueados) if com_total else None
+    return (
+        ids_ranqueados[inicio : inicio + quantidade],
+        total_de_livros,
+        _total_de_paginas(total_de_livros, quantidade),
+        len(ids_ranqueados) > inicio + quantidade,
+    )
+
+
+def _ranquear(
+    indice_busca: IIndiceBuscaLivro, filtro: Optional[str], usuario: Optional[int]
+) -> Optional[list[int]]:
+    if not filtro:
+        return None
+    return indice_busca.ranquear(filtro, usuario or None)
+
 
 class LivroRepository(IRepository):
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, indice_busca: Optional[IIndiceBuscaLivro] = None):
         self.db = db
+        self.indice_busca = indice_busca or pegar_indice_busca()
+
+    def _carregar_na_ordem(self, livro_ids: list[int]) -> list[Livro]:
+        if not livro_ids:
+            return []
+        livros = self.db.scalars(_consulta_livros_por_id(livro_ids)).all()
+        return _na_ordem(livros, livro_ids)
 
     def buscar_paginada_de_livros_ativos_com_autor_opcional(
         self,
@@ -18,40 +102,141 @@ class LivroRepository(IRepository):
         quantidade: int,
         filtro: Optional[str],
         usuario: Optional[int] = None,
-    ) -> tuple[list[Livro], int, int]:
-        consulta = self.db.query(Livro)
-        consulta = consulta.filter(Livro.deletado == False)
-
-        if filtro:
-            consulta = consulta.filter(
-                or_(
-                    Livro.titulo.ilike(filtro),
-                    Usuario.nome.ilike(filtro),
-                )
+        apos_id: Optional[int] = None,
+        com_total: bool = True,
+    ) -> PaginaLivros:
+        ids_ranqueados = _ranquear(self.indice_busca, filtro, usuario)
+        if ids_ranqueados is not None:
+            ids_da_pagina, *resto = _pagina_ranqueada(
+                ids_ranqueados, pagina, quantidade, com_total
             )
+            return (self._carregar_na_ordem(ids_da_pagina), *resto)
+
+        consulta = _consulta_livros_ativos(self.indice_busca, filtro, usuario)
 
-        if usuario:
-            consulta = consulta.filter(Livro.usuario_id == usuario)
+        total_de_livros = None
+        if com_total:
+            total_de_livros = self.db.scalar(_consulta_total(consulta))
 
-        total_de_livros = consulta.count()
+        livros = self.db.scalars(
+            _consulta_pagina(consulta, pagina, quantidade, apos_id)
+        ).all()
 
-        consulta = consulta.limit(quantidade).offset((pagina - 1) * quantidade)
+        return (
+            list(livros[:quantidade]),
+            total_de_livros,
+            _total_de_paginas(total_de_livros, quantidade),
+            len(livros) > quantidade,
+        )
 
-        livros = consulta.all()
+    def iterar_livros_ativos_com_autor_opcional(
+        self,
+        filtro: Optional[str],
+        usuario: Optional[int] = None,
+        tamanho_lote: int = 1000,
+    ) -> Iterator[list[Livro]]:
+        """Percorre o catálogo em lotes, com os mesmos filtros da listagem paginada.
 
-        total_de_paginas = (total_de_livros + quantidade - 1) // quantidade
+        yield_per usa cursor do lado do servidor: só um lote fica em memória e
+        a exportação inteira roda numa única conexão.
+        """
+        ids_ranqueados = _ranquear(self.indice_busca, filtro, usuario)
+        if ids_ranqueados is not None:
+            for inicio in range(0, len(ids_ranqueados), tamanho_lote):
+                livros = self._carregar_na_ordem(
+                    ids_ranqueados[inicio : inicio + tamanho_lote]
+                )
+                if livros:
+                    yield livros
+            return
 
-        return livros, total_de_livros, total_de_paginas
+        consulta = _consulta_livros_ativos(self.indice_busca, filtro, usuario)
+        resultado = self.db.execute(
+            consulta, execution_options={"yield_per": tamanho_lote}
+        )
+        yield from resultado.scalars().partitions()
 
     def buscar_livro_por_id(self, livro_id: int) -> Livro:
         return self.db.query(Livro).filter(Livro.id == livro_id).first()
 
     def atualizar_livro(self, livro: Livro) -> Livro:
+        livro.marcar_alterado()
         self.db.add(livro)
+        self.db.flush()
+        if livro.deletado:
+            self.indice_busca.remover(self.db, livro.id)
+        else:
+            self.indice_busca.indexar(self.db, livro.id)
         self.db.commit()
         return livro
 
     def cadastrar_livro(self, livro: Livro) -> Livro:
         self.db.add(livro)
+        self.db.flush()
+        self.indice_busca.indexar(self.db, livro.id)
         self.db.commit()
         return livro
+
+    def cadastrar_livros_em_lote(self, livros: list[dict]) -> list[int]:
+        """Insere vários livros com um único INSERT e indexa o lote na busca."""
+        livro_ids = list(
+            self.db.scalars(insert(Livro).returning(Livro.id), livros).all()
+        )
+        self.indice_busca.indexar_varios(self.db, livro_ids)
+        self.db.commit()
+        return livro_ids
+
+
+class LivroRepositoryAsync:
+    """Leituras do catálogo (listagem e detalhe) numa AsyncSession, com as
+    mesmas consultas do LivroRepository. Usado pelas rotas com DB_ASYNC."""
+
+    def __init__(
+        self, db: AsyncSession, indice_busca: Optional[IIndiceBuscaLivro] = None
+    ):
+        self.db = db
+        self.indice_busca = indice_busca or pegar_indice_busca()
+
+    async def _carregar_na_ordem(self, livro_ids: list[int]) -> list[Livro]:
+        if not livro_ids:
+            return []
+        livros = (await self.db.scalars(_consulta_livros_por_id(livro_ids))).all()
+        return _na_ordem(livros, livro_ids)
+
+    async def buscar_paginada_de_livros_ativos_com_autor_opcional(
+        self,
+        pagina: int,
+        quantidade: int,
+        filtro: Optional[str],
+        usuario: Optional[int] = None,
+        apos_id: Optional[int] = None,
+        com_total: bool = True,
+    ) -> PaginaLivros:
+        ids_ranqueados = _ranquear(self.indice_busca, filtro, usuario)
+        if ids_ranqueados is not None:
+            ids_da_pagina, *resto = _pagina_ranqueada(
+                ids_ranqueados, pagina, quantidade, com_total
+            )
+            return (await self._carregar_na_ordem(ids_da_pagina), *resto)
+
+        consulta = _consulta_livros_ativos(self.indice_busca, filtro, usuario)
+
+        total_de_livros = None
+        if com_total:
+            total_de_livros = await self.db.scalar(_consulta_total(consulta))
+
+        livros = (
+            await self.db.scalars(
+                _consulta_pagina(consulta, pagina, quantidade, apos_id)
+            )
+        ).all()
+
+        return (
+            list(livros[:quantidade]),
+            total_de_livros,
+            _total_de_paginas(total_de_livros, quantidade),
+            len(livros) > quantidade,
+        )
+
+    async def buscar_livro_por_id(self, livro_id: int) -> Optional[Livro]:
+        return await self.db.scalar(select(Livro).where(Livro.id == livro_id))
@@ -1,115 +1,284 @@
-from typing import Optional
+from functools import partial
+from typing import Iterator, Literal, Optional
 
-from fastapi import APIRouter, Depends, Query, Response
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from contextos.livros.entidade_livro import (
     Livro,
 )  # Certifique-se de que a entidade Livro esteja importada
+from contextos.livros.busca_livro import normalizar_termos
+from contextos.livros.cache_livro import (
+    CACHE_CONTROL_CATALOGO,
+    CACHE_CONTROL_PRIVADO,
+    cache_livros,
+)
+from contextos.livros.exportacao_livro import FORMATOS_EXPORTACAO
+from contextos.livros.importacao_livro import (
+    TAMANHO_LOTE_IMPORTACAO,
+    escolher_formato,
+    importar_livros,
+)
 from contextos.livros.modelos_livro import (
     CadastrarLivro,
     LivroRetorno,
     RetonoPaginaLivros,
+    RetornoImportacaoLivros,
 )
-from contextos.livros.repositorio_livro import LivroRepository
-from contextos.livros.services_livro import LivroService
+from contextos.livros.repositorio_livro import LivroRepository, LivroRepositoryAsync
+from contextos.livros.services_livro import LivroService, LivroServiceAsync
 from contextos.usuarios.entidade_usuario import Usuario
 from libs.autenticacao.config import JWTBearer
-from libs.database.sqlalchemy import pegar_conexao_db
+from libs.cache.respostas import (
+    Validadores,
+    cabecalhos_de_validacao,
+    nao_modificado,
+    responder,
+    responder_nao_modificado,
+)
+from libs.database.sqlalchemy import (
+    Sessao,
+    SessaoRota,
+    executar_na_sessao,
+    pegar_sessao_db,
+    pegar_sessao_db_quente,
+)
 
 roteador = APIRouter(prefix="/livros", tags=["Livro"])
 
 
 # Rota para cadastrar livro
 @roteador.post("/cadastrar")
-def cadastrar_livro(
+async def cadastrar_livro(
     body: CadastrarLivro,
-    db: Session = Depends(pegar_conexao_db),
+    db: Session = Depends(pegar_sessao_db),
     usuario_do_login: Usuario = Depends(JWTBearer()),
 ):
-    repo_livro = LivroRepository(db=db)
-    servico_livro = LivroService(repo_livro)
+    def cadastrar(sessao: Session) -> LivroRetorno:
+        repo_livro = LivroRepository(db=sessao)
+        servico_livro = LivroService(repo_livro)
+
+        return servico_livro.cadastrar_livro(
+            dados_do_livro=body, usuario=usuario_do_login
+        )
 
-    livro = servico_livro.cadastrar_livro(dados_do_livro=body, usuario=usuario_do_login)
+    livro = await executar_na_sessao(db, cadastrar)
 
     return livro
 
 
+# Importa um catálogo em CSV (com cabeçalho) ou NDJSON enviado no corpo
+@roteador.post("/importar")
+async def importar_catalogo(
+    request: Request,
+    formato: Optional[str] = Query(None),  # Se omitido, usa o Content-Type
+    tamanho_lote: int = Query(TAMANHO_LOTE_IMPORTACAO, ge=1, le=10000),
+    db: Session = Depends(pegar_sessao_db),
+    usuario_do_login: Usuario = Depends(JWTBearer()),
+) -> RetornoImportacaoLivros:
+    LivroService.garantir_permissao_de_cadastro(usuario_do_login)
+    formato = escolher_formato(formato, request.headers.get("content-type"))
+
+    async def cadastrar_lote(livros: list[CadastrarLivro]) -> int:
+        def cadastrar(sessao: Session) -> int:
+            repo_livro = LivroRepository(db=sessao)
+            servico_livro = LivroService(repo_livro)
+
+            return servico_livro.cadastrar_livros_em_lote(
+                livros=livros, usuario=usuario_do_login
+            )
+
+        return await executar_na_sessao(db, cadastrar)
+
+    return await importar_livros(
+        request.stream(), formato, cadastrar_lote, tamanho_lote=tamanho_lote
+    )
+
+
+# Exporta o catálogo inteiro (mesmos filtros da listagem) sem paginar
+@roteador.get("/exportar")
+async def exportar_catalogo(
+    formato: Literal["csv", "ndjson", "colunar"] = Query("csv"),
+    busca: Optional[str] = Query(None),
+    autor_id: Optional[int] = Query(None),
+    tamanho_lote: int = Query(1000, ge=1, le=10000),
+) -> StreamingResponse:
+    # A sessão da dependência é fechada antes do corpo ser enviado, então o
+    # gerador abre a própria. Gerador síncrono: o Starlette itera no threadpool.
+    def gerar_conteudo() -> Iterator[str]:
+        with Sessao() as sessao:
+            servico_livro = LivroService(LivroRepository(db=sessao))
+            yield from servico_livro.exportar_catalogo(
+                formato, filtro=busca, autor_id=autor_id, tamanho_lote=tamanho_lote
+            )
+
+    media_type, extensao = FORMATOS_EXPORTACAO[formato]
+    return StreamingResponse(
+        gerar_conteudo(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="livros.{extensao}"'},
+    )
+
+
 @roteador.get("/")
-def listar_livros(
+async def listar_livros(
+    request: Request,
     quantidade: int = Query(10, ge=1),
     pagina: int = Query(1, ge=1),
     busca: Optional[str] = Query(None),  # Parâmetro de busca opcional
-    db: Session = Depends(pegar_conexao_db),
+    cursor: Optional[str] = Query(None),  # Quando informado, ignora a página
+    # padrão: total só sem cursor, o modo cursor não paga o COUNT a cada página
+    com_total: Optional[bool] = Query(None),
+    db: SessaoRota = Depends(pegar_sessao_db_quente),
 ) -> RetonoPaginaLivros:
-    repo_livro = LivroRepository(db=db)
-    servico_livro = LivroService(repo_livro)
+    # a busca ignora caixa e acentos, então a chave também
+    chave = cache_livros.chave_catalogo(
+        "listar",
+        quantidade=quantidade,
+        pagina=None if cursor else pagina,
+        busca=" ".join(normalizar_termos(busca)) or None,
+        cursor=cursor,
+        com_total=com_total,
+    )
+    em_cache = cache_livros.pegar(chave)
+    if em_cache:
+        return responder(
+            request, em_cache, origem="HIT", cache_control=CACHE_CONTROL_CATALOGO
+        )
 
-    retorno_paginado = servico_livro.buscar_de_livros_paginado(
-        pagina=pagina, quantidade=quantidade, filtro=busca
+    parametros = dict(
+        pagina=pagina,
+        quantidade=quantidade,
+        filtro=busca,
+        cursor=cursor,
+        com_total=com_total,
+        nao_modificado=partial(nao_modificado, request),
+    )
+
+    def buscar(sessao: Session) -> tuple[Validadores, Optional[RetonoPaginaLivros]]:
+        servico_livro = LivroService(LivroRepository(db=sessao))
+        return servico_livro.buscar_de_livros_paginado_condicional(**parametros)
+
+    async def buscar_async(sessao: AsyncSession):
+        servico_livro = LivroServiceAsync(LivroRepositoryAsync(db=sessao))
+        return await servico_livro.buscar_de_livros_paginado_condicional(**parametros)
+
+    validadores, retorno_paginado = await executar_na_sessao(db, buscar, buscar_async)
+    if retorno_paginado is None:
+        return responder_nao_modificado(validadores, CACHE_CONTROL_CATALOGO)
+
+    return responder(
+        request,
+        cache_livros.guardar(chave, retorno_paginado, validadores),
+        cache_control=CACHE_CONTROL_CATALOGO,
     )
-    return retorno_paginado
 
 
 @roteador.get("/obter-livros/{id}")
-def obter_livro(id: int, db: Session = Depends(pegar_conexao_db)):
-    repo_livro = LivroRepository(db=db)
-    servico_livro = LivroService(repo_livro)
+async def obter_livro(
+    id: int, request: Request, db: SessaoRota = Depends(pegar_sessao_db_quente)
+) -> LivroRetorno:
+    chave = cache_livros.chave_livro("obter", id)
+    em_cache = cache_livros.pegar(chave)
+    if em_cache:
+        return responder(
+            request, em_cache, origem="HIT", cache_control=CACHE_CONTROL_CATALOGO
+        )
 
-    livro = servico_livro.buscar_livro_por_id(id)
+    condicao = partial(nao_modificado, request)
 
-    return livro
+    def buscar(sessao: Session) -> tuple[Validadores, Optional[LivroRetorno]]:
+        servico_livro = LivroService(LivroRepository(db=sessao))
+        return servico_livro.buscar_livro_por_id_condicional(id, condicao)
+
+    async def buscar_async(sessao: AsyncSession):
+        servico_livro = LivroServiceAsync(LivroRepositoryAsync(db=sessao))
+        return await servico_livro.buscar_livro_por_id_condicional(id, condicao)
+
+    validadores, livro = await executar_na_sessao(db, buscar, buscar_async)
+    if livro is None:
+        return responder_nao_modificado(validadores, CACHE_CONTROL_CATALOGO)
+
+    return responder(
+        request,
+        cache_livros.guardar(chave, livro, validadores),
+        cache_control=CACHE_CONTROL_CATALOGO,
+    )
 
 
 # Rota para atualizar um livro
 @roteador.put("/editar/{id}")
-def atualizar_livro(
+async def atualizar_livro(
     id: int,
     body: CadastrarLivro,
-    db: Session = Depends(pegar_conexao_db),
+    db: Session = Depends(pegar_sessao_db),
     usuario_do_login: Usuario = Depends(JWTBearer()),
 ) -> Optional[LivroRetorno]:
-    repo_livro = LivroRepository(db=db)
-    servico_livro = LivroService(repo_livro)
+    def atualizar(sessao: Session) -> LivroRetorno:
+        repo_livro = LivroRepository(db=sessao)
+        servico_livro = LivroService(repo_livro)
 
-    livro = servico_livro.atualizar_livro_existente(
-        livro_id=id,
-        dados_atualizados=body,
-        usuario=usuario_do_login,
-    )
+        return servico_livro.atualizar_livro_existente(
+            livro_id=id,
+            dados_atualizados=body,
+            usuario=usuario_do_login,
+        )
+
+    livro = await executar_na_sessao(db, atualizar)
 
     return livro
 
 
 @roteador.delete("/{id}")
-def deletar_livro(
+async def deletar_livro(
     id: int,
-    db: Session = Depends(pegar_conexao_db),
+    db: Session = Depends(pegar_sessao_db),
     usuario_do_login: Usuario = Depends(JWTBearer()),
 ):
-    repo_livro = LivroRepository(db=db)
-    servico_livro = LivroService(repo_livro)
+    def deletar(sessao: Session):
+        repo_livro = LivroRepository(db=sessao)
+        servico_livro = LivroService(repo_livro)
+
+        servico_livro.deletar_livro(livro_id=id, usuario=usuario_do_login)
 
-    servico_livro.deletar_livro(livro_id=id, usuario=usuario_do_login)
+    await executar_na_sessao(db, deletar)
 
     return Response(status_code=204)
 
 
 @roteador.get("/livros-do-autor")
-def listar_livros_do_autor(
+async def listar_livros_do_autor(
+    request: Request,
     quantidade: int = Query(10, ge=1),
     pagina: int = Query(1, ge=1),
-    db: Session = Depends(pegar_conexao_db),
+    cursor: Optional[str] = Query(None),
+    # padrão: total só sem cursor, o modo cursor não paga o COUNT a cada página
+    com_total: Optional[bool] = Query(None),
+    db: Session = Depends(pegar_sessao_db),
     usuario_do_login: Usuario = Depends(JWTBearer()),
-):
-    repo_livro = LivroRepository(db=db)
-    servico_livro = LivroService(repo_livro)
+) -> RetonoPaginaLivros:
+    def buscar(sessao: Session) -> tuple[Validadores, Optional[RetonoPaginaLivros]]:
+        repo_livro = LivroRepository(db=sessao)
+        servico_livro = LivroService(repo_livro)
 
-    livros = servico_livro.buscar_de_livros_paginado(
-        filtro=None,
-        pagina=pagina,
-        quantidade=quantidade,
-        usuario=usuario_do_login,
-    )
+        return servico_livro.buscar_de_livros_paginado_condicional(
+            filtro=None,
+            pagina=pagina,
+            quantidade=quantidade,
+            usuario=usuario_do_login,
+            cursor=cursor,
+            com_total=com_total,
+            nao_modificado=partial(nao_modificado, request),
+        )
 
-    return livros
+    validadores, livros = await executar_na_sessao(db, buscar)
+    if livros is None:
+        return responder_nao_modificado(validadores, CACHE_CONTROL_PRIVADO)
+
+    return Response(
+        content=livros.model_dump_json(),
+        media_type="application/json",
+        headers=cabecalhos_de_validacao(validadores, CACHE_CONTROL_PRIVADO),
+    )
@@ -1,31 +1,140 @@
-from typing import Optional
+from typing import Callable, Iterator, Optional
 from uuid import UUID
 
 from fastapi import HTTPException
 
+from contextos.livros.cache_livro import cache_livros
 from contextos.livros.entidade_livro import Livro
+from contextos.livros.exportacao_livro import EXPORTADORES_POR_FORMATO
 from contextos.livros.modelos_livro import (
     CadastrarLivro,
     LivroRetorno,
     RetonoPaginaLivros,
 )
-from contextos.livros.repositorio_livro import LivroRepository
+from contextos.livros.repositorio_livro import (
+    LivroRepository,
+    LivroRepositoryAsync,
+)
 from contextos.usuarios.entidade_usuario import Usuario
+from libs.cache.respostas import CacheRespostas, Validadores, gerar_etag
+from libs.paginacao.cursor import codificar_cursor, decodificar_cursor
+
+
+def _livro_retorno(livro: Livro) -> LivroRetorno:
+    return LivroRetorno(
+        id=livro.id,
+        preco=livro.preco,
+        titulo=livro.titulo,
+        genero=livro.genero,
+        deletado=livro.deletado,
+        descricao=livro.descricao,
+        usuario_id=livro.usuario_id,
+        quantidade=livro.quantidade,
+        url_imagem=livro.url_imagem,
+    )
+
+
+def _preparar_paginacao(
+    cursor: Optional[str], filtro: Optional[str], com_total: Optional[bool]
+) -> tuple[bool, Optional[int]]:
+    """Valida o cursor e devolve (com_total, apos_id) para o repositório."""
+    if com_total is None:
+        com_total = cursor is None
+
+    apos_id = None
+    if cursor and filtro:
+        # a busca é ordenada por relevância, então só pagina por número
+        raise HTTPException(
+            status_code=400, detail="Cursor não pode ser usado junto com busca."
+        )
+
+    if cursor:
+        try:
+            apos_id = decodificar_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Cursor inválido.")
+
+    return com_total, apos_id
+
+
+def _montar_pagina(
+    livros: list[Livro],
+    total_livros: Optional[int],
+    total_paginas: Optional[int],
+    tem_proxima_pagina: bool,
+    pagina: int,
+    quantidade: int,
+    filtro: Optional[str],
+    cursor: Optional[str],
+    nao_modificado: Callable[[Validadores], bool],
+) -> tuple[Validadores, Optional[RetonoPaginaLivros]]:
+    proximo_cursor = (
+        codificar_cursor(livros[-1].id) if tem_proxima_pagina and not filtro else None
+    )
+    pagina = None if cursor else pagina
+
+    # só ETag: a data mais recente da página não muda quando um livro sai
+    # dela (exclusão, novo cadastro deslocando as páginas), então um
+    # Last-Modified aqui faria If-Modified-Since responder 304 errado
+    validadores = Validadores(
+        etag=gerar_etag(
+            pagina,
+            quantidade,
+            total_livros,
+            total_paginas,
+            proximo_cursor,
+            *(f"{livro.id}:{livro.versao}" for livro in livros),
+        ),
+    )
+    if nao_modificado(validadores):
+        return validadores, None
+
+    retorno = RetonoPaginaLivros(
+        data=[_livro_retorno(livro) for livro in livros],
+        pagina=pagina,
+        total=total_livros,
+        tamanho_pagina=quantidade,
+        total_paginas=total_paginas,
+        proximo_cursor=proximo_cursor,
+    )
+
+    return validadores, retorno
+
+
+def _montar_livro(
+    livro: Optional[Livro], nao_modificado: Callable[[Validadores], bool]
+) -> tuple[Validadores, Optional[LivroRetorno]]:
+    if not livro:
+        raise HTTPException(status_code=404, detail="Livro não encontrado.")
+
+    validadores = Validadores(
+        etag=f'"livro-{livro.id}-v{livro.versao}"',
+        ultima_modificacao=livro.atualizado_em,
+    )
+    if nao_modificado(validadores):
+        return validadores, None
+
+    return validadores, _livro_retorno(livro)
 
 
 class LivroService:
-    def __init__(self, repo: LivroRepository):
+    def __init__(self, repo: LivroRepository, cache: Optional[CacheRespostas] = None):
         self.repository = repo
+        self.cache = cache or cache_livros
 
-    def cadastrar_livro(
-        self, dados_do_livro: CadastrarLivro, usuario: Usuario
-    ) -> LivroRetorno:
+    @staticmethod
+    def garantir_permissao_de_cadastro(usuario: Usuario):
         if not usuario.autor:
             raise HTTPException(
                 status_code=403,
                 detail="Usuário não tem permissão para cadastrar livro, já que não é autor.",
             )
 
+    def cadastrar_livro(
+        self, dados_do_livro: CadastrarLivro, usuario: Usuario
+    ) -> LivroRetorno:
+        self.garantir_permissao_de_cadastro(usuario)
+
         livro = Livro.criar(
             usuario_id=usuario.id,
             preco=dados_do_livro.preco,
@@ -37,6 +146,7 @@ class LivroService:
         )
 
         livro = self.repository.cadastrar_livro(livro=livro)
+        self.cache.invalidar_catalogo()
 
         return LivroRetorno(
             id=livro.id,
@@ -50,62 +160,102 @@ class LivroService:
             url_imagem=livro.url_imagem,
         )
 
+    def cadastrar_livros_em_lote(
+        self, livros: list[CadastrarLivro], usuario: Usuario
+    ) -> int:
+        self.garantir_permissao_de_cadastro(usuario)
+
+        if not livros:
+            return 0
+
+        livro_ids = self.repository.cadastrar_livros_em_lote(
+            [
+                dict(dados_do_livro.model_dump(), usuario_id=usuario.id, deletado=False)
+                for dados_do_livro in livros
+            ]
+        )
+        self.cache.invalidar_catalogo()
+
+        return len(livro_ids)
+
     def buscar_de_livros_paginado(
         self,
         pagina: int,
         quantidade: int,
         filtro: Optional[str] = None,
         usuario: Optional[Usuario] = None,
+        cursor: Optional[str] = None,
+        com_total: Optional[bool] = None,
     ) -> RetonoPaginaLivros:
-        livros, total_livros, total_paginas = (
+        _, retorno = self.buscar_de_livros_paginado_condicional(
+            pagina, quantidade, filtro, usuario, cursor, com_total
+        )
+        return retorno
+
+    def buscar_de_livros_paginado_condicional(
+        self,
+        pagina: int,
+        quantidade: int,
+        filtro: Optional[str] = None,
+        usuario: Optional[Usuario] = None,
+        cursor: Optional[str] = None,
+        com_total: Optional[bool] = None,
+        nao_modificado: Callable[[Validadores], bool] = lambda _: False,
+    ) -> tuple[Validadores, Optional[RetonoPaginaLivros]]:
+        """Busca a página e calcula o ETag pelas versões dos livros.
+
+        Sem com_total, o total só é contado na paginação por número. Se
+        nao_modificado aceitar os validadores, devolve None no lugar do
+        retorno: o cliente já tem a página e nada precisa ser montado.
+        """
+        com_total, apos_id = _preparar_paginacao(cursor, filtro, com_total)
+
+        livros, total_livros, total_paginas, tem_proxima_pagina = (
             self.repository.buscar_paginada_de_livros_ativos_com_autor_opcional(
                 pagina,
                 quantidade,
                 filtro,
                 usuario.id if usuario else None,
+                apos_id=apos_id,
+                com_total=com_total,
             )
         )
 
-        retorno = RetonoPaginaLivros(
-            data=[
-                LivroRetorno(
-                    id=livro.id,
-                    preco=livro.preco,
-                    titulo=livro.titulo,
-                    genero=livro.genero,
-                    deletado=livro.deletado,
-                    descricao=livro.descricao,
-                    usuario_id=livro.usuario_id,
-                    quantidade=livro.quantidade,
-                    url_imagem=livro.url_imagem,
-                )
-                for livro in livros
-            ],
-            pagina=pagina,
-            total=total_livros,
-            tamanho_pagina=quantidade,
-            total_paginas=total_paginas,
+        return _montar_pagina(
+            livros,
+            total_livros,
+            total_paginas,
+            tem_proxima_pagina,
+            pagina,
+            quantidade,
+            filtro,
+            cursor,
+            nao_modificado,
         )
 
-        return retorno
+    def exportar_catalogo(
+        self,
+        formato: str,
+        filtro: Optional[str] = None,
+        autor_id: Optional[int] = None,
+        tamanho_lote: int = 1000,
+    ) -> Iterator[str]:
+        lotes = self.repository.iterar_livros_ativos_com_autor_opcional(
+            filtro, autor_id, tamanho_lote=tamanho_lote
+        )
+        return EXPORTADORES_POR_FORMATO[formato](lotes)
 
     def buscar_livro_por_id(self, livro_id: int) -> Optional[LivroRetorno]:
-        livro = self.repository.buscar_livro_por_id(livro_id)
-
-        if not livro:
-            raise HTTPException(status_code=404, detail="Livro não encontrado.")
+        _, retorno = self.buscar_livro_por_id_condicional(livro_id)
+        return retorno
 
-        return LivroRetorno(
-            id=livro.id,
-            preco=livro.preco,
-            titulo=livro.titulo,
-            genero=livro.genero,
-            deletado=livro.deletado,
-            descricao=livro.descricao,
-            usuario_id=livro.usuario_id,
-            quantidade=livro.quantidade,
-            url_imagem=livro.url_imagem,
-        )
+    def buscar_livro_por_id_condicional(
+        self,
+        livro_id: int,
+        nao_modificado: Callable[[Validadores], bool] = lambda _: False,
+    ) -> tuple[Validadores, Optional[LivroRetorno]]:
+        livro = self.repository.buscar_livro_por_id(livro_id)
+        return _montar_livro(livro, nao_modificado)
 
     def atualizar_livro_existente(
         self,
@@ -138,6 +288,7 @@ class LivroService:
             setattr(livro, campo, valor)
 
         livro_atualizado = self.repository.atualizar_livro(livro)
+        self.cache.invalidar_livros(livro_atualizado.id)
 
         return LivroRetorno(
             id=livro_atualizado.id,
@@ -171,5 +322,48 @@ class LivroService:
 
         livro.deletar()
         self.repository.atualizar_livro(livro)
+        self.cache.invalidar_livros(livro.id)
 
         return None
+
+
+class LivroServiceAsync:
+    """Listagem e detalhe do catálogo sobre o LivroRepositoryAsync."""
+
+    def __init__(self, repo: LivroRepositoryAsync):
+        self.repository = repo
+
+    async def buscar_de_livros_paginado_condicional(
+        self,
+        pagina: int,
+        quantidade: int,
+        filtro: Optional[str] = None,
+        usuario: Optional[Usuario] = None,
+        cursor: Optional[str] = None,
+        com_total: Optional[bool] = None,
+        nao_modificado: Callable[[Validadores], bool] = lambda _: False,
+    ) -> tuple[Validadores, Optional[RetonoPaginaLivros]]:
+        com_total, apos_id = _preparar_paginacao(cursor, filtro, com_total)
+
+        pagina_de_livros = (
+            await self.repository.buscar_paginada_de_livros_ativos_com_autor_opcional(
+                pagina,
+                quantidade,
+                filtro,
+                usuario.id if usuario else None,
+                apos_id=apos_id,
+                com_total=com_total,
+            )
+        )
+
+        return _montar_pagina(
+            *pagina_de_livros, pagina, quantidade, filtro, cursor, nao_modificado
+        )
+
+    async def buscar_livro_por_id_condicional(
+        self,
+        livro_id: int,
+        nao_modificado: Callable[[Validadores], bool] = lambda _: False,
+    ) -> tuple[Validadores, Optional[LivroRetorno]]:
+        livro = await self.repository.buscar_livro_por_id(livro_id)
+        return _montar_livro(livro, nao_modificado)
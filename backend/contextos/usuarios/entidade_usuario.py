@@ -1,4 +1,16 @@
-from sqlalchemy import create_engine, Column, Integer, String, Date, Boolean
+from datetime import datetime
+
+from sqlalchemy import (
+    create_engine,
+    Column,
+    Integer,
+    String,
+    Date,
+    DateTime,
+    Boolean,
+    Index,
+    func,
+)
 from libs.database.sqlalchemy import _Base
 
 
@@ -14,6 +26,18 @@ class Usuario(_Base):
     deletado = Column(Boolean, default=False, nullable=False)
     senha = Column(String(255), nullable=False)
     autor = Column(Boolean, default=False, nullable=False)
+    # vai no token (claim ver); tokens com versão menor foram revogados
+    versao_token = Column(Integer, default=1, nullable=False)
+    # quando a versão mudou pela última vez; depois da validade de um token,
+    # nenhum token revogado por essa mudança ainda está em circulação
+    token_renovado_em = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # o login e o JWTBearer procuram o email sem diferenciar maiúsculas
+        Index("ix_usuarios_email_lower", func.lower(email)),
+        # releitura periódica das revogações recentes (VersoesTokens)
+        Index("ix_usuarios_token_renovado_em", token_renovado_em),
+    )
 
     @classmethod
     def criar(cls, nome, sobrenome, data_nascimento, email, senha):
@@ -27,5 +51,11 @@ class Usuario(_Base):
             senha=senha,
         )
 
+    def renovar_versao_token(self):
+        """Revoga todos os tokens já emitidos para o usuário."""
+        # expressão SQL: o incremento acontece no banco, como Livro.marcar_alterado
+        self.versao_token = Usuario.versao_token + 1
+        self.token_renovado_em = datetime.utcnow()
+
     def __repr__(self):
         return f"<Usuario {self.id} - {self.nome} {self.sobrenome} - {self.ativo} - {self.deletado} >"
@@ -12,6 +12,22 @@ class CadastrarUsuario(BaseModel):
         min_anystr_length = 1
         anystr_strip_whitespace = True
 
+# Retorno do cadastro: nunca inclui o hash da senha
+class UsuarioRetorno(BaseModel):
+    id: int
+    nome: str
+    sobrenome: str
+    data_nascimento: date
+    email: str
+    ativo: bool
+    deletado: bool
+    autor: bool
+
+# Troca de senha: revoga os tokens emitidos antes dela
+class TrocarSenha(BaseModel):
+    senha_atual: str
+    nova_senha: str = Field(..., min_length=8, description="Nova senha (mínimo de 8 caracteres)")
+
 # Modelo de entrada para o login
 class LoginData(BaseModel):
     email: str
@@ -1,58 +1,132 @@
 from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 
+from contextos.autenticacao.modelos_autenticacao import TokenData
+from contextos.autenticacao.repositorio_autenticacao import AutenticacaoRepository
+from contextos.autenticacao.services_autenticacao import AutenticacaoService
 from contextos.usuarios.entidade_usuario import Usuario
-from contextos.usuarios.modelos_usuario import CadastrarUsuario
+from contextos.usuarios.modelos_usuario import (
+    CadastrarUsuario,
+    TrocarSenha,
+    UsuarioRetorno,
+)
 from libs.autenticacao.config import JWTBearer
-from libs.database.sqlalchemy import pegar_conexao_db
+from libs.autenticacao.senhas import pool_senhas
+from libs.database.sqlalchemy import executar_na_sessao, pegar_sessao_db
 
 roteador = APIRouter(prefix="/usuarios", tags=["Usuario"])
 
 
 # Rota para cadastrar usuário
 @roteador.post("/cadastrar")
-def cadastrar_usuario(
+async def cadastrar_usuario(
     body: CadastrarUsuario,
-    db: Session = Depends(pegar_conexao_db),
+    db: Session = Depends(pegar_sessao_db),
     usuario_do_login: Usuario = Depends(JWTBearer()),
-):
-    existe_usuario_no_banco = (
-        db.query(Usuario).filter(Usuario.email == body.email).first()
-    )
+) -> UsuarioRetorno:
+    # hash no pool de processos antes de abrir a transação
+    senha_hash = await pool_senhas.gerar_hash(body.senha)
+
+    def cadastrar(sessao: Session) -> UsuarioRetorno:
+        existe_usuario_no_banco = (
+            sessao.query(Usuario).filter(Usuario.email == body.email).first()
+        )
+
+        if existe_usuario_no_banco:
+            raise HTTPException(status_code=400, detail="Usuário já cadastrado")
 
-    if existe_usuario_no_banco:
-        raise HTTPException(status_code=400, detail="Usuário já cadastrado")
+        usuario = Usuario(
+            email=body.email,
+            nome=body.nome,
+            sobrenome=body.sobrenome,
+            senha=senha_hash,
+            data_nascimento=body.data_nascimento,
+        )
 
-    usuario = Usuario(
-        email=body.email,
-        nome=body.nome,
-        sobrenome=body.sobrenome,
-        senha=body.senha,
-        data_nascimento=body.data_nascimento,
-    )
+        sessao.add(usuario)
+        sessao.commit()
+        sessao.refresh(usuario)
 
-    db.add(usuario)
-    db.commit()
+        return UsuarioRetorno(
+            id=usuario.id,
+            nome=usuario.nome,
+            sobrenome=usuario.sobrenome,
+            data_nascimento=usuario.data_nascimento,
+            email=usuario.email,
+            ativo=usuario.ativo,
+            deletado=usuario.deletado,
+            autor=usuario.autor,
+        )
 
-    return usuario
+    return await executar_na_sessao(db, cadastrar)
 
 
 @roteador.post("/ativar/autor/{id}")
-def ativar_autor(
+async def ativar_autor(
     id: int,
-    db: Session = Depends(pegar_conexao_db),
+    db: Session = Depends(pegar_sessao_db),
     usuario_do_login: Usuario = Depends(JWTBearer()),
 ):
-    existe_usuario_no_banco = db.query(Usuario).filter(Usuario.id == id).first()
+    def ativar(sessao: Session):
+        existe_usuario_no_banco = sessao.query(Usuario).filter(Usuario.id == id).first()
 
-    if not existe_usuario_no_banco:
-        raise HTTPException(status_code=400, detail="Usuário não encontrado")
+        if not existe_usuario_no_banco:
+            raise HTTPException(status_code=400, detail="Usuário não encontrado")
 
-    existe_usuario_no_banco: Usuario
+        existe_usuario_no_banco: Usuario
 
-    existe_usuario_no_banco.autor = True
+        existe_usuario_no_banco.autor = True
 
-    db.add(existe_usuario_no_banco)
-    db.commit()
+        sessao.add(existe_usuario_no_banco)
+        # o commit tira o usuário do cache do JWTBearer. Os tokens já emitidos
+        # continuam valendo; no AUTH_MODO=claims eles dizem autor=false até o
+        # próximo login
+        sessao.commit()
+
+    await executar_na_sessao(db, ativar)
 
     return Response(status_code=200)
+
+
+# O próprio usuário desativa a conta; os tokens dele deixam de valer na hora
+@roteador.post("/desativar")
+async def desativar_usuario(
+    db: Session = Depends(pegar_sessao_db),
+    usuario_do_login: Usuario = Depends(JWTBearer()),
+):
+    def desativar(sessao: Session):
+        servico_autenticacao = AutenticacaoService(AutenticacaoRepository(db=sessao))
+        servico_autenticacao.revogar_tokens(usuario_do_login.id, ativo=False)
+
+    await executar_na_sessao(db, desativar)
+
+    return Response(status_code=204)
+
+
+# Troca a senha, revoga os tokens anteriores e devolve um token novo
+@roteador.put("/senha")
+async def trocar_senha(
+    body: TrocarSenha,
+    db: Session = Depends(pegar_sessao_db),
+    usuario_do_login: Usuario = Depends(JWTBearer()),
+) -> TokenData:
+    def buscar_usuario(sessao: Session) -> Usuario:
+        servico_autenticacao = AutenticacaoService(AutenticacaoRepository(db=sessao))
+        return servico_autenticacao.buscar_usuario_por_id(usuario_do_login.id)
+
+    usuario = await executar_na_sessao(db, buscar_usuario)
+
+    # os dois bcrypts rodam no pool de processos, fora da sessão
+    await AutenticacaoService.conferir_senha(usuario, body.senha_atual)
+    senha_hash = await pool_senhas.gerar_hash(body.nova_senha)
+
+    def trocar(sessao: Session) -> str:
+        servico_autenticacao = AutenticacaoService(AutenticacaoRepository(db=sessao))
+        usuario = servico_autenticacao.revogar_tokens(
+            usuario_do_login.id, senha=senha_hash
+        )
+        return AutenticacaoService.gerar_token(usuario)
+
+    token = await executar_na_sessao(db, trocar)
+
+    return TokenData(access_token=token, token_type="bearer")
@@ -21,7 +21,9 @@ class Venda(_Base):
 
     id = Column(BaseUUID(), primary_key=True, default=uuid.uuid4, nullable=False)
     data_venda = Column(DateTime, default=datetime.utcnow, nullable=False)
-    id_usuario_comprador = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
+    id_usuario_comprador = Column(
+        Integer, ForeignKey("usuarios.id"), nullable=False, index=True
+    )
 
     itens = relationship("VendaItem", back_populates="venda")
 
@@ -53,8 +55,8 @@ class VendaItem(_Base):
     __tablename__ = "venda_item"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    venda_id = Column(BaseUUID(), ForeignKey("vendas.id"), nullable=False)
-    livro_id = Column(Integer, ForeignKey("livros.id"), nullable=False)
+    venda_id = Column(BaseUUID(), ForeignKey("vendas.id"), nullable=False, index=True)
+    livro_id = Column(Integer, ForeignKey("livros.id"), nullable=False, index=True)
     quantidade = Column(Integer, nullable=False)
     preco_unitario = Column(Numeric(10, 2), nullable=False)
 
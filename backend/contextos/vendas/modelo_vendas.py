@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 from uuid import UUID
 
 from pydantic import BaseModel
@@ -68,3 +69,15 @@ class CompraRetorno(BaseModel):
 class ComprasEVendasRetorno(BaseModel):
     compras: list[CompraRetorno]
     vendas: list[VendaRetorno]
+
+
+class RetornoPaginaVendas(BaseModel):
+    tamanho_pagina: int
+    proximo_cursor: Optional[str] = None
+    data: list[VendaItemRetorno]
+
+
+class RetornoPaginaCompras(BaseModel):
+    tamanho_pagina: int
+    proximo_cursor: Optional[str] = None
+    data: list[CompraItemRetorno]
@@ -1,6 +1,24 @@
-from typing import Optional
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterator, Optional
+from uuid import UUID
 
-from sqlalchemy.orm import Session
+from sqlalchemy import (
+    Executable,
+    Select,
+    Update,
+    and_,
+    case,
+    delete,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query, Session, contains_eager, joinedload, selectinload
 
 from contextos.carrinho.entidade_carrinho import Carrinho
 from contextos.livros.entidade_livro import Livro
@@ -8,6 +26,70 @@ from contextos.vendas.entidade_vendas import Venda, VendaItem
 from libs.repository.repositorio_interface import IRepository
 
 
+# Comandos da compra, compartilhados pelos repositórios síncrono e assíncrono.
+def _consulta_itens_para_compra(usuario_id: int) -> Select:
+    return (
+        select(
+            Livro.id.label("livro_id"),
+            Livro.titulo,
+            Livro.preco,
+            Livro.quantidade.label("estoque"),
+            Carrinho.quantidade,
+        )
+        .join(Livro, Carrinho.livro_id == Livro.id)
+        .where(Carrinho.usuario_id == usuario_id)
+        .order_by(Carrinho.id)
+    )
+
+
+def _comando_reservar_estoque(quantidades_por_livro: dict[int, int]) -> Update:
+    if len(quantidades_por_livro) == 1:
+        ((livro_id, quantidade),) = quantidades_por_livro.items()
+        baixa = literal(quantidade)
+    else:
+        baixa = case(quantidades_por_livro, value=Livro.id)
+
+    return (
+        update(Livro)
+        .where(Livro.id.in_(quantidades_por_livro), Livro.quantidade >= baixa)
+        .values(
+            quantidade=Livro.quantidade - baixa,
+            versao=Livro.versao + 1,
+            atualizado_em=datetime.utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _comandos_inserir_venda(
+    venda_id: UUID, usuario_id: int, itens: list[dict]
+) -> list[Executable]:
+    return [
+        insert(Venda).values(id=venda_id, id_usuario_comprador=usuario_id),
+        insert(VendaItem).values([{**item, "venda_id": venda_id} for item in itens]),
+    ]
+
+
+def _comandos_tirar_do_carrinho(
+    usuario_id: int, quantidades_por_livro: dict[int, int]
+) -> list[Executable]:
+    comprada = case(quantidades_por_livro, value=Carrinho.livro_id)
+    do_usuario = and_(
+        Carrinho.usuario_id == usuario_id,
+        Carrinho.livro_id.in_(quantidades_por_livro),
+    )
+    return [
+        # o DELETE antes: depois do UPDATE a sobra poderia cair na condição dele
+        delete(Carrinho)
+        .where(do_usuario, Carrinho.quantidade <= comprada)
+        .execution_options(synchronize_session=False),
+        update(Carrinho)
+        .where(do_usuario, Carrinho.quantidade > comprada)
+        .values(quantidade=Carrinho.quantidade - comprada)
+        .execution_options(synchronize_session=False),
+    ]
+
+
 class VendaRepository(IRepository):
     def __init__(self, db: Session):
         self.db = db
@@ -25,33 +107,161 @@ class VendaRepository(IRepository):
         else:
             self.tx.rollback()
 
-    def buscar_vendas_do_usuario(self, usuario_id: int) -> list[Venda]:
-        consulta = self.db.query(VendaItem)
+    def _consulta_vendas_do_usuario(self, usuario_id: int) -> Query:
+        """Itens vendidos pelo autor, com venda e livro carregados e o total da venda.
+
+        O total considera todos os itens da venda (inclusive de outros autores)
+        e é somado no banco, então tudo sai em uma única consulta.
+        """
+        vendas_do_autor = (
+            select(VendaItem.venda_id)
+            .join(Livro, VendaItem.livro_id == Livro.id)
+            .where(Livro.usuario_id == usuario_id)
+        )
+        totais = (
+            select(
+                VendaItem.venda_id,
+                func.sum(VendaItem.preco_unitario * VendaItem.quantidade).label(
+                    "total"
+                ),
+            )
+            .where(VendaItem.venda_id.in_(vendas_do_autor))
+            .group_by(VendaItem.venda_id)
+            .subquery()
+        )
+
+        consulta = self.db.query(VendaItem, totais.c.total)
         consulta = consulta.join(Livro, VendaItem.livro_id == Livro.id)
+        consulta = consulta.join(totais, totais.c.venda_id == VendaItem.venda_id)
         consulta = consulta.filter(Livro.usuario_id == usuario_id)
-        vendas_do_autor = consulta.all()
-        return vendas_do_autor
+        consulta = consulta.options(
+            contains_eager(VendaItem.livro),
+            joinedload(VendaItem.venda),
+        )
+        return consulta
 
-    def buscar_compras_do_usuario(self, usuario_id: int) -> list[Venda]:
+    def _consulta_compras_do_usuario(self, usuario_id: int) -> Query:
+        # itens e livros vêm em uma segunda consulta (selectin), sem lazy load
         consulta = self.db.query(Venda)
         consulta = consulta.filter(Venda.id_usuario_comprador == usuario_id)
-        compras = consulta.all()
+        consulta = consulta.options(
+            selectinload(Venda.itens).joinedload(VendaItem.livro),
+        )
+        return consulta
+
+    def buscar_vendas_do_usuario(
+        self, usuario_id: int
+    ) -> list[tuple[VendaItem, Decimal]]:
+        vendas_do_autor = self._consulta_vendas_do_usuario(usuario_id).all()
+        return vendas_do_autor
+
+    def buscar_compras_do_usuario(self, usuario_id: int) -> list[Venda]:
+        compras = self._consulta_compras_do_usuario(usuario_id).all()
         return compras
 
+    def buscar_pagina_de_vendas_do_usuario(
+        self, usuario_id: int, quantidade: int, apos_id: Optional[int] = None
+    ) -> list[tuple[VendaItem, Decimal]]:
+        """Busca quantidade + 1 itens para o serviço saber se há próxima página."""
+        consulta = self._consulta_vendas_do_usuario(usuario_id)
+        if apos_id is not None:
+            consulta = consulta.filter(VendaItem.id > apos_id)
+        consulta = consulta.order_by(VendaItem.id)
+        return consulta.limit(quantidade + 1).all()
+
+    def buscar_pagina_de_compras_do_usuario(
+        self,
+        usuario_id: int,
+        quantidade: int,
+        apos: Optional[tuple[datetime, UUID]] = None,
+    ) -> list[Venda]:
+        """Compras da mais recente para a mais antiga, paginadas por (data, id)."""
+        consulta = self._consulta_compras_do_usuario(usuario_id)
+        if apos is not None:
+            data_venda, venda_id = apos
+            consulta = consulta.filter(
+                or_(
+                    Venda.data_venda < data_venda,
+                    and_(Venda.data_venda == data_venda, Venda.id < venda_id),
+                )
+            )
+        consulta = consulta.order_by(Venda.data_venda.desc(), Venda.id.desc())
+        return consulta.limit(quantidade + 1).all()
+
+    def iterar_vendas_do_usuario(
+        self, usuario_id: int, tamanho_lote: int = 500
+    ) -> Iterator[tuple[VendaItem, Decimal]]:
+        # yield_per usa cursor do lado do servidor e mantém só um lote em memória
+        consulta = self._consulta_vendas_do_usuario(usuario_id)
+        consulta = consulta.order_by(VendaItem.id).yield_per(tamanho_lote)
+        yield from consulta
+
+    def iterar_compras_do_usuario(
+        self, usuario_id: int, tamanho_lote: int = 500
+    ) -> Iterator[Venda]:
+        consulta = self._consulta_compras_do_usuario(usuario_id)
+        consulta = consulta.order_by(Venda.data_venda.desc(), Venda.id.desc())
+        yield from consulta.yield_per(tamanho_lote)
+
     def buscar_livro_por_id(self, livro_id: int) -> Optional[Livro]:
         livro = self.db.query(Livro).filter(Livro.id == livro_id).first()
         return livro
 
-    def buscar_carrinho_do_usuario(
-        self, usuario_id: int
-    ) -> list[tuple[Carrinho, Livro]]:
-        consulta = self.db.query(Carrinho, Livro)
-        consulta = consulta.join(Livro, Carrinho.livro_id == Livro.id)
-        consulta = consulta.filter(Carrinho.usuario_id == usuario_id)
-        carrinho = consulta.all()
-        return carrinho
-
-    def salvar_venda_e_livro(self, venda: Venda, livro: Livro):
-        self.db.add(venda)
-        self.db.add(livro)
-        self.db.commit()
+    def buscar_itens_do_carrinho_para_compra(self, usuario_id: int) -> list:
+        """Linhas (livro_id, titulo, preco, estoque, quantidade) do carrinho."""
+        return self.db.execute(_consulta_itens_para_compra(usuario_id)).all()
+
+    def reservar_estoque(self, quantidades_por_livro: dict[int, int]) -> bool:
+        """Baixa o estoque de todos os livros num único UPDATE condicional.
+
+        Só tem efeito se todos tiverem unidades suficientes: o banco trava as
+        linhas e reavalia a condição, então compras simultâneas não vendem além
+        do estoque. Devolve False se algum livro não tinha estoque.
+        """
+        resultado = self.db.execute(_comando_reservar_estoque(quantidades_por_livro))
+        return resultado.rowcount == len(quantidades_por_livro)
+
+    def inserir_venda(self, venda_id: UUID, usuario_id: int, itens: list[dict]):
+        """Insere a venda e todos os itens com um INSERT de várias linhas."""
+        for comando in _comandos_inserir_venda(venda_id, usuario_id, itens):
+            self.db.execute(comando)
+
+    def tirar_do_carrinho(self, usuario_id: int, quantidades_por_livro: dict[int, int]):
+        """Tira do carrinho só o que foi comprado.
+
+        O que outra requisição pôs no carrinho depois da leitura fica: livros
+        novos não são tocados e, se a quantidade de um livro subiu, sobra a
+        diferença.
+        """
+        for comando in _comandos_tirar_do_carrinho(usuario_id, quantidades_por_livro):
+            self.db.execute(comando)
+
+
+class VendaRepositoryAsync:
+    """Comandos da compra (carrinho e venda direta) numa AsyncSession, os
+    mesmos do VendaRepository. Usado pelas rotas com DB_ASYNC."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def buscar_livro_por_id(self, livro_id: int) -> Optional[Livro]:
+        return await self.db.scalar(select(Livro).where(Livro.id == livro_id))
+
+    async def buscar_itens_do_carrinho_para_compra(self, usuario_id: int) -> list:
+        resultado = await self.db.execute(_consulta_itens_para_compra(usuario_id))
+        return resultado.all()
+
+    async def reservar_estoque(self, quantidades_por_livro: dict[int, int]) -> bool:
+        comando = _comando_reservar_estoque(quantidades_por_livro)
+        resultado = await self.db.execute(comando)
+        return resultado.rowcount == len(quantidades_por_livro)
+
+    async def inserir_venda(self, venda_id: UUID, usuario_id: int, itens: list[dict]):
+        for comando in _comandos_inserir_venda(venda_id, usuario_id, itens):
+            await self.db.execute(comando)
+
+    async def tirar_do_carrinho(
+        self, usuario_id: int, quantidades_por_livro: dict[int, int]
+    ):
+        for comando in _comandos_tirar_do_carrinho(usuario_id, quantidades_por_livro):
+            await self.db.execute(comando)
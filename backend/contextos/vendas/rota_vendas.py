@@ -1,59 +1,140 @@
-from fastapi import APIRouter, Depends
+from typing import Iterator, Literal, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from contextos.usuarios.entidade_usuario import Usuario
-from contextos.vendas.modelo_vendas import ComprasEVendasRetorno
-from contextos.vendas.repositorio_vendas import VendaRepository
-from contextos.vendas.services_vendas import VendaService
+from contextos.vendas.modelo_vendas import (
+    ComprasEVendasRetorno,
+    RetornoPaginaCompras,
+    RetornoPaginaVendas,
+)
+from contextos.vendas.repositorio_vendas import VendaRepository, VendaRepositoryAsync
+from contextos.vendas.services_vendas import VendaService, VendaServiceAsync
 from libs.autenticacao.config import JWTBearer
-from libs.database.sqlalchemy import pegar_conexao_db
+from libs.database.sqlalchemy import (
+    Sessao,
+    SessaoRota,
+    executar_na_sessao,
+    pegar_sessao_db,
+    pegar_sessao_db_quente,
+)
 
 roteador = APIRouter(prefix="/venda", tags=["Venda"])
 
 
 # Endpoint para adicionar um item ao carrinho
 @roteador.post("/comprar-do-carrinho")
-def finalizar_compra_pelo_carrinho(
-    db: Session = Depends(pegar_conexao_db),
+async def finalizar_compra_pelo_carrinho(
+    db: SessaoRota = Depends(pegar_sessao_db_quente),
     usuario_do_login: Usuario = Depends(JWTBearer()),
 ):
-    repo_venda = VendaRepository(db=db)
-    servico_venda = VendaService(repo_venda)
+    def finalizar(sessao: Session) -> UUID:
+        servico_venda = VendaService(VendaRepository(db=sessao))
+        return servico_venda.finalizar_compra_pelo_carrinho(usuario_do_login.id)
 
-    id_da_venda = servico_venda.finalizar_compra_pelo_carrinho(
-        usuario_comprador=usuario_do_login.id
-    )
+    async def finalizar_async(sessao: AsyncSession) -> UUID:
+        servico_venda = VendaServiceAsync(VendaRepositoryAsync(db=sessao))
+        return await servico_venda.finalizar_compra_pelo_carrinho(usuario_do_login.id)
+
+    id_da_venda = await executar_na_sessao(db, finalizar, finalizar_async)
 
     return {"id": id_da_venda}
 
 
 # Endpoint para adicionar um item ao carrinho
 @roteador.post("/venda-direta/{livro_id}")
-def finalizar_venda_direta(
+async def finalizar_venda_direta(
     livro_id: int,
-    db: Session = Depends(pegar_conexao_db),
+    db: SessaoRota = Depends(pegar_sessao_db_quente),
     usuario_do_login: Usuario = Depends(JWTBearer()),
 ):
-    repo_venda = VendaRepository(db=db)
-    servico_venda = VendaService(repo_venda)
+    def finalizar(sessao: Session) -> UUID:
+        servico_venda = VendaService(VendaRepository(db=sessao))
+        return servico_venda.finalizar_venda_direta(livro_id, usuario_do_login.id)
 
-    id_da_venda = servico_venda.finalizar_venda_direta(
-        livro_id=livro_id,
-        usuario_comprador=usuario_do_login.id,
-    )
+    async def finalizar_async(sessao: AsyncSession) -> UUID:
+        servico_venda = VendaServiceAsync(VendaRepositoryAsync(db=sessao))
+        return await servico_venda.finalizar_venda_direta(livro_id, usuario_do_login.id)
+
+    id_da_venda = await executar_na_sessao(db, finalizar, finalizar_async)
     return {"id": id_da_venda}
 
 
 @roteador.get("/listar")
-def listar_compras_e_vendas(
-    db: Session = Depends(pegar_conexao_db),
+async def listar_compras_e_vendas(
+    db: Session = Depends(pegar_sessao_db),
     usuario_do_login: Usuario = Depends(JWTBearer()),
 ) -> ComprasEVendasRetorno:
-    repo_venda = VendaRepository(db=db)
-    servico_venda = VendaService(repo_venda)
+    def listar(sessao: Session) -> ComprasEVendasRetorno:
+        repo_venda = VendaRepository(db=sessao)
+        servico_venda = VendaService(repo_venda)
 
-    retorno = servico_venda.listar_compras_e_vendas_do_usuario(
-        usuario_id=usuario_do_login.id
-    )
+        return servico_venda.listar_compras_e_vendas_do_usuario(
+            usuario_id=usuario_do_login.id
+        )
+
+    retorno = await executar_na_sessao(db, listar)
 
     return retorno
+
+
+@roteador.get("/vendas")
+async def listar_vendas(
+    quantidade: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    db: Session = Depends(pegar_sessao_db),
+    usuario_do_login: Usuario = Depends(JWTBearer()),
+) -> RetornoPaginaVendas:
+    def listar(sessao: Session) -> RetornoPaginaVendas:
+        repo_venda = VendaRepository(db=sessao)
+        servico_venda = VendaService(repo_venda)
+
+        return servico_venda.listar_vendas_paginado(
+            usuario_id=usuario_do_login.id, quantidade=quantidade, cursor=cursor
+        )
+
+    return await executar_na_sessao(db, listar)
+
+
+@roteador.get("/compras")
+async def listar_compras(
+    quantidade: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    db: Session = Depends(pegar_sessao_db),
+    usuario_do_login: Usuario = Depends(JWTBearer()),
+) -> RetornoPaginaCompras:
+    def listar(sessao: Session) -> RetornoPaginaCompras:
+        repo_venda = VendaRepository(db=sessao)
+        servico_venda = VendaService(repo_venda)
+
+        return servico_venda.listar_compras_paginado(
+            usuario_id=usuario_do_login.id, quantidade=quantidade, cursor=cursor
+        )
+
+    return await executar_na_sessao(db, listar)
+
+
+@roteador.get("/exportar")
+async def exportar_compras_ou_vendas(
+    tipo: Literal["compras", "vendas"] = Query("compras"),
+    usuario_do_login: Usuario = Depends(JWTBearer()),
+) -> StreamingResponse:
+    # A sessão da dependência é fechada antes do corpo ser enviado, então o
+    # gerador abre a própria. Gerador síncrono: o Starlette itera no threadpool.
+    def gerar_linhas() -> Iterator[str]:
+        with Sessao() as sessao:
+            servico_venda = VendaService(VendaRepository(db=sessao))
+            if tipo == "vendas":
+                yield from servico_venda.exportar_vendas_ndjson(usuario_do_login.id)
+            else:
+                yield from servico_venda.exportar_compras_ndjson(usuario_do_login.id)
+
+    return StreamingResponse(
+        gerar_linhas(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{tipo}.ndjson"'},
+    )
@@ -1,22 +1,71 @@
 from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterator, Optional
+from uuid import UUID, uuid4
 
-from sqlalchemy import UUID
+from fastapi import HTTPException
 
+from contextos.livros.cache_livro import cache_livros
+from contextos.livros.entidade_livro import Livro
 from contextos.vendas.entidade_vendas import Venda, VendaItem
 from contextos.vendas.modelo_vendas import (
     CompraItemRetorno,
     CompraRetorno,
     ComprasEVendasRetorno,
     LivroInfoRetorno,
+    RetornoPaginaCompras,
+    RetornoPaginaVendas,
     VendaItemRetorno,
     VendaRetorno,
 )
-from contextos.vendas.repositorio_vendas import VendaRepository
+from contextos.vendas.repositorio_vendas import VendaRepository, VendaRepositoryAsync
+from libs.cache.respostas import CacheRespostas
+from libs.database.concorrencia import repetir_em_conflito, repetir_em_conflito_async
+from libs.paginacao.cursor import (
+    codificar_cursor,
+    codificar_cursor_dados,
+    decodificar_cursor,
+    decodificar_cursor_dados,
+)
+
+
+def _estoque_insuficiente(titulo: str, estoque: int, quantidade_pedida: int):
+    raise HTTPException(
+        status_code=400,
+        detail=f"Quantidade insuficiente do livro {titulo}, restam apenas {estoque} unidades, você tentou comprar {quantidade_pedida}, por favor, atualize a quantidade do livro no carrinho.",
+    )
+
+
+def _faltou_estoque_no_carrinho(itens_atuais: list, itens_do_carrinho: list):
+    # com o estoque relido, aponta qual item ficou sem unidades
+    item = next(
+        (item for item in itens_atuais if item.quantidade > item.estoque),
+        itens_do_carrinho[0],
+    )
+    _estoque_insuficiente(item.titulo, item.estoque, quantidade_pedida=item.quantidade)
+
+
+def _item_da_venda_direta(livro: Livro) -> dict:
+    return dict(livro_id=livro.id, quantidade=1, preco_unitario=livro.preco)
+
+
+def _itens_da_venda_do_carrinho(itens_do_carrinho: list) -> list[dict]:
+    return [
+        dict(
+            livro_id=item.livro_id,
+            quantidade=item.quantidade,
+            preco_unitario=item.preco,
+        )
+        for item in itens_do_carrinho
+    ]
 
 
 class VendaService:
-    def __init__(self, repo: VendaRepository):
+    def __init__(self, repo: VendaRepository, cache: Optional[CacheRespostas] = None):
         self.repository = repo
+        # baixa de estoque muda o livro exibido nas rotas públicas de livros
+        self.cache = cache or cache_livros
 
     def listar_compras_e_vendas_do_usuario(
         self, usuario_id: int
@@ -29,15 +78,9 @@ class VendaService:
         )
 
         itens_retorno_vendas = defaultdict(list)
-        for item in vendas_usuario:
+        for item, total_da_venda in vendas_usuario:
             itens_retorno_vendas[item.venda.id].append(
-                VendaItemRetorno(
-                    id=item.venda.id,
-                    nome_do_livro=item.livro.titulo,
-                    data_venda=item.venda.data_venda,
-                    valor_total_da_venda=item.venda.total_da_venda,
-                    quantidade=item.quantidade,
-                )
+                self._venda_item_retorno(item, total_da_venda)
             )
 
         venda_retorno = []
@@ -46,86 +89,241 @@ class VendaService:
 
         compra_retorno: list[CompraRetorno] = []
         for venda in compras_usuario:
-            compra_retorno.append(
-                CompraRetorno(
-                    compra=CompraItemRetorno(
-                        id=venda.id,
-                        data_venda=venda.data_venda,
-                        quantidade=venda.total_de_itens_vendidos,
-                        valor_total_da_venda=venda.total_da_venda,
-                        nome_do_livro=[
-                            LivroInfoRetorno(
-                                id=item.livro.id,
-                                titulo=item.livro.titulo,
-                                preco=item.preco_unitario,
-                                quantidade=item.quantidade,
-                            )
-                            for item in venda.itens
-                        ],
-                    ),
-                )
-            )
+            compra_retorno.append(CompraRetorno(compra=self._compra_retorno(venda)))
 
         return ComprasEVendasRetorno(
             vendas=venda_retorno,
             compras=compra_retorno,
         )
 
-    def finalizar_venda_direta(self, livro_id: int, usuario_comprador: int) -> UUID:
-        livro = self.repository.buscar_livro_por_id(livro_id)
-        if not livro:
-            raise ValueError("Livro não encontrado")
+    def listar_vendas_paginado(
+        self, usuario_id: int, quantidade: int, cursor: Optional[str] = None
+    ) -> RetornoPaginaVendas:
+        apos_id = None
+        if cursor:
+            try:
+                apos_id = decodificar_cursor(cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Cursor inválido.")
 
-        if livro.quantidade == 0:
-            raise ValueError(
-                f"Quantidade insuficiente do livro {livro.titulo}, restam apenas {livro.quantidade} unidades, você tentou comprar 1, por favor, atualize a quantidade do livro no carrinho."
-            )
+        itens = self.repository.buscar_pagina_de_vendas_do_usuario(
+            usuario_id=usuario_id, quantidade=quantidade, apos_id=apos_id
+        )
+        tem_proxima_pagina = len(itens) > quantidade
+        itens = itens[:quantidade]
+
+        return RetornoPaginaVendas(
+            data=[self._venda_item_retorno(item, total) for item, total in itens],
+            tamanho_pagina=quantidade,
+            proximo_cursor=(
+                codificar_cursor(itens[-1][0].id) if tem_proxima_pagina else None
+            ),
+        )
+
+    def listar_compras_paginado(
+        self, usuario_id: int, quantidade: int, cursor: Optional[str] = None
+    ) -> RetornoPaginaCompras:
+        apos = None
+        if cursor:
+            try:
+                dados_cursor = decodificar_cursor_dados(cursor)
+                apos = (
+                    datetime.fromisoformat(dados_cursor["data"]),
+                    UUID(dados_cursor["id"]),
+                )
+            except (ValueError, TypeError, KeyError):
+                raise HTTPException(status_code=400, detail="Cursor inválido.")
+
+        compras = self.repository.buscar_pagina_de_compras_do_usuario(
+            usuario_id=usuario_id, quantidade=quantidade, apos=apos
+        )
+        tem_proxima_pagina = len(compras) > quantidade
+        compras = compras[:quantidade]
 
-        venda = Venda.criar(id_usuario_comprador=usuario_comprador)
+        proximo_cursor = None
+        if tem_proxima_pagina:
+            ultima = compras[-1]
+            proximo_cursor = codificar_cursor_dados(
+                {"data": ultima.data_venda.isoformat(), "id": str(ultima.id)}
+            )
 
-        venda_item = VendaItem.criar(
-            quantidade=1,
-            venda_id=venda.id,
-            livro_id=livro.id,
-            preco_unitario=livro.preco,
+        return RetornoPaginaCompras(
+            data=[self._compra_retorno(venda) for venda in compras],
+            tamanho_pagina=quantidade,
+            proximo_cursor=proximo_cursor,
         )
 
-        venda.adicionar_item(venda_item)
-        livro.decrementar_quantidade_disponivel()
+    def exportar_vendas_ndjson(self, usuario_id: int) -> Iterator[str]:
+        for item, total in self.repository.iterar_vendas_do_usuario(usuario_id):
+            yield self._venda_item_retorno(item, total).model_dump_json() + "\n"
+
+    def exportar_compras_ndjson(self, usuario_id: int) -> Iterator[str]:
+        for venda in self.repository.iterar_compras_do_usuario(usuario_id):
+            yield self._compra_retorno(venda).model_dump_json() + "\n"
 
-        self.repository.salvar_venda_e_livro(venda=venda, livro=livro)
+    def _venda_item_retorno(
+        self, item: VendaItem, total_da_venda: Decimal
+    ) -> VendaItemRetorno:
+        return VendaItemRetorno(
+            id=item.venda.id,
+            nome_do_livro=item.livro.titulo,
+            data_venda=item.venda.data_venda,
+            valor_total_da_venda=total_da_venda,
+            quantidade=item.quantidade,
+        )
 
-        return venda.id
+    def _compra_retorno(self, venda: Venda) -> CompraItemRetorno:
+        return CompraItemRetorno(
+            id=venda.id,
+            data_venda=venda.data_venda,
+            quantidade=venda.total_de_itens_vendidos,
+            valor_total_da_venda=venda.total_da_venda,
+            nome_do_livro=[
+                LivroInfoRetorno(
+                    id=item.livro.id,
+                    titulo=item.livro.titulo,
+                    preco=item.preco_unitario,
+                    quantidade=item.quantidade,
+                )
+                for item in venda.itens
+            ],
+        )
+
+    def finalizar_venda_direta(self, livro_id: int, usuario_comprador: int) -> UUID:
+        return repetir_em_conflito(
+            self.repository.db,
+            lambda: self._finalizar_venda_direta(livro_id, usuario_comprador),
+        )
 
     def finalizar_compra_pelo_carrinho(self, usuario_comprador: int) -> UUID:
-        venda = Venda.criar(id_usuario_comprador=usuario_comprador)
+        return repetir_em_conflito(
+            self.repository.db,
+            lambda: self._finalizar_compra_pelo_carrinho(usuario_comprador),
+        )
+
+    def _finalizar_venda_direta(self, livro_id: int, usuario_comprador: int) -> UUID:
+        livro = self.repository.buscar_livro_por_id(livro_id)
+        if not livro:
+            raise HTTPException(status_code=404, detail="Livro não encontrado")
+
+        if not self.repository.reservar_estoque({livro.id: 1}):
+            self.repository.db.rollback()
+            self.repository.db.refresh(livro)
+            _estoque_insuficiente(livro.titulo, livro.quantidade, quantidade_pedida=1)
+
+        venda_id = uuid4()
+        self.repository.inserir_venda(
+            venda_id=venda_id,
+            usuario_id=usuario_comprador,
+            itens=[_item_da_venda_direta(livro)],
+        )
+        self.repository.db.commit()
+        self.cache.invalidar_livros(livro.id)
+
+        return venda_id
 
-        itens_do_carrinho = self.repository.buscar_carrinho_do_usuario(
+    def _finalizar_compra_pelo_carrinho(self, usuario_comprador: int) -> UUID:
+        # Número fixo de comandos, independente do tamanho do carrinho:
+        # um SELECT, um UPDATE de estoque, dois INSERTs e um DELETE e um
+        # UPDATE no carrinho.
+        itens_do_carrinho = self.repository.buscar_itens_do_carrinho_para_compra(
             usuario_comprador
         )
+        if not itens_do_carrinho:
+            raise HTTPException(status_code=400, detail="Carrinho vazio.")
 
-        for carrinho, livro in itens_do_carrinho:
-            venda_item = VendaItem.criar(
-                venda_id=venda.id,
-                livro_id=livro.id,
-                quantidade=carrinho.quantidade,
-                preco_unitario=livro.preco,
+        quantidades = {item.livro_id: item.quantidade for item in itens_do_carrinho}
+        if not self.repository.reservar_estoque(quantidades):
+            self.repository.db.rollback()
+            # relê o estoque para apontar qual item ficou sem unidades
+            itens_atuais = self.repository.buscar_itens_do_carrinho_para_compra(
+                usuario_comprador
             )
-            venda.adicionar_item(venda_item)
+            _faltou_estoque_no_carrinho(itens_atuais, itens_do_carrinho)
 
-            # Remover item do estoque
-            if livro.quantidade < carrinho.quantidade:
-                raise ValueError(
-                    # status_code=400,
-                    detail=f"Quantidade insuficiente do livro {livro.titulo}, restam apenas {livro.quantidade} unidades, você tentou comprar {carrinho.quantidade}, por favor, atualize a quantidade do livro no carrinho.",
-                )
+        venda_id = uuid4()
+        self.repository.inserir_venda(
+            venda_id=venda_id,
+            usuario_id=usuario_comprador,
+            itens=_itens_da_venda_do_carrinho(itens_do_carrinho),
+        )
+        self.repository.tirar_do_carrinho(usuario_comprador, quantidades)
+        self.repository.db.commit()
+        self.cache.invalidar_livros(*quantidades)
 
-            livro.quantidade -= carrinho.quantidade
+        return venda_id
 
-            self.repository.db.delete(carrinho)
 
-        self.repository.db.add(venda)
+class VendaServiceAsync:
+    """Compra pelo carrinho e venda direta sobre o VendaRepositoryAsync, com
+    os mesmos comandos e a mesma repetição em conflito do VendaService."""
 
-        self.repository.db.commit()
+    def __init__(
+        self, repo: VendaRepositoryAsync, cache: Optional[CacheRespostas] = None
+    ):
+        self.repository = repo
+        self.cache = cache or cache_livros
+
+    async def finalizar_venda_direta(
+        self, livro_id: int, usuario_comprador: int
+    ) -> UUID:
+        return await repetir_em_conflito_async(
+            self.repository.db,
+            lambda: self._finalizar_venda_direta(livro_id, usuario_comprador),
+        )
+
+    async def finalizar_compra_pelo_carrinho(self, usuario_comprador: int) -> UUID:
+        return await repetir_em_conflito_async(
+            self.repository.db,
+            lambda: self._finalizar_compra_pelo_carrinho(usuario_comprador),
+        )
+
+    async def _finalizar_venda_direta(
+        self, livro_id: int, usuario_comprador: int
+    ) -> UUID:
+        livro = await self.repository.buscar_livro_por_id(livro_id)
+        if not livro:
+            raise HTTPException(status_code=404, detail="Livro não encontrado")
+
+        if not await self.repository.reservar_estoque({livro.id: 1}):
+            await self.repository.db.rollback()
+            await self.repository.db.refresh(livro)
+            _estoque_insuficiente(livro.titulo, livro.quantidade, quantidade_pedida=1)
+
+        venda_id = uuid4()
+        await self.repository.inserir_venda(
+            venda_id=venda_id,
+            usuario_id=usuario_comprador,
+            itens=[_item_da_venda_direta(livro)],
+        )
+        await self.repository.db.commit()
+        self.cache.invalidar_livros(livro.id)
+
+        return venda_id
+
+    async def _finalizar_compra_pelo_carrinho(self, usuario_comprador: int) -> UUID:
+        itens_do_carrinho = await self.repository.buscar_itens_do_carrinho_para_compra(
+            usuario_comprador
+        )
+        if not itens_do_carrinho:
+            raise HTTPException(status_code=400, detail="Carrinho vazio.")
+
+        quantidades = {item.livro_id: item.quantidade for item in itens_do_carrinho}
+        if not await self.repository.reservar_estoque(quantidades):
+            await self.repository.db.rollback()
+            itens_atuais = await self.repository.buscar_itens_do_carrinho_para_compra(
+                usuario_comprador
+            )
+            _faltou_estoque_no_carrinho(itens_atuais, itens_do_carrinho)
+
+        venda_id = uuid4()
+        await self.repository.inserir_venda(
+            venda_id=venda_id,
+            usuario_id=usuario_comprador,
+            itens=_itens_da_venda_do_carrinho(itens_do_carrinho),
+        )
+        await self.repository.tirar_do_carrinho(usuario_comprador, quantidades)
+        await self.repository.db.commit()
+        self.cache.invalidar_livros(*quantidades)
 
-        return venda.id
+        return venda_id
@@ -1,4 +1,6 @@
+import os
 from datetime import datetime, timedelta
+from typing import Optional
 
 from fastapi import HTTPException, Request
 from fastapi.security import (
@@ -7,8 +9,19 @@ from fastapi.security import (
     OAuth2PasswordBearer,
     OAuth2PasswordRequestForm,
 )
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from jose import jwt
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from libs.autenticacao.principal import (
+    AUTH_MODO,
+    UsuarioAutenticado,
+    versao_do_token,
+    versoes_tokens,
+)
+from libs.autenticacao.senhas import contexto_senhas
+from libs.autenticacao.tokens import DECODIFICADORES_JWT, VerificadorTokens
+from libs.cache.lru import CacheTTL
 
 SECRET_KEY = "TiaraEhTierA"
 ALGORITHM = "HS256"
@@ -16,7 +29,94 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-bcrypt = CryptContext(schemes=["bcrypt"], deprecated="auto")
+bcrypt = contexto_senhas()
+
+# Usuários autenticados recentemente (UsuarioAutenticado, imutável), evita ir
+# ao banco a cada requisição protegida
+cache_usuarios = CacheTTL(
+    tamanho_maximo=int(os.getenv("CACHE_USUARIOS_TAMANHO", "1024")),
+    ttl_segundos=float(os.getenv("CACHE_USUARIOS_TTL", "60")),
+)
+
+
+# jose (padrão) ou hmac, só biblioteca padrão e bem mais barato por token
+JWT_BACKEND = os.getenv("JWT_BACKEND", "jose").lower()
+
+# Tokens já validados -> claims; cada entrada vale no máximo até o exp do token
+cache_tokens = CacheTTL(
+    tamanho_maximo=int(os.getenv("CACHE_TOKENS_TAMANHO", "4096")),
+    ttl_segundos=float(os.getenv("CACHE_TOKENS_TTL", "300")),
+)
+verificador_tokens = VerificadorTokens(
+    DECODIFICADORES_JWT[JWT_BACKEND](SECRET_KEY, ALGORITHM),
+    cache=cache_tokens if os.getenv("CACHE_TOKENS", "1") != "0" else None,
+)
+
+
+def invalidar_usuario_em_cache(usuario_id: int, email: Optional[str] = None):
+    """Tira o usuário do cache; os commits que alteram Usuario já chamam sozinhos."""
+    cache_usuarios.invalidar(("id", usuario_id))
+    if email:
+        cache_usuarios.invalidar(("sub", email.lower()))
+
+
+# Colunas guardadas no cache_usuarios: qualquer escrita nelas invalida o usuário
+_CAMPOS_EM_CACHE = ("email", "ativo", "deletado", "autor", "versao_token")
+
+
+# before_flush: depois do flush os campos atribuídos com expressão SQL (como a
+# versao_token) já estão expirados e sem histórico
+@event.listens_for(Session, "before_flush")
+def _anotar_usuarios_alterados(sessao: Session, _contexto, _instancias):
+    from contextos.usuarios.entidade_usuario import Usuario
+
+    alterados = sessao.info.setdefault("usuarios_alterados", set())
+    for usuario in (*sessao.dirty, *sessao.deleted):
+        if not isinstance(usuario, Usuario):
+            continue
+
+        estado = inspect(usuario)
+        historicos = [estado.attrs[campo].history for campo in _CAMPOS_EM_CACHE]
+        if usuario in sessao.deleted or any(h.has_changes() for h in historicos):
+            # email antigo e novo: o cache também é indexado pelo sub do token
+            emails = estado.attrs.email.history.sum()
+            alterados.add((usuario.id, *emails))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _anotar_update_em_massa(estado: ORMExecuteState):
+    from contextos.usuarios.entidade_usuario import Usuario
+
+    if not (estado.is_update or estado.is_delete) or estado.bind_mapper is None:
+        return
+    if estado.bind_mapper.class_ is not Usuario:
+        return
+
+    # escritas de uma linha só dizem qual é com
+    # .execution_options(usuario_alterado=(id, email))
+    alterado = estado.execution_options.get("usuario_alterado")
+    if alterado is not None:
+        estado.session.info.setdefault("usuarios_alterados", set()).add(alterado)
+    else:
+        # não dá para saber quais linhas mudaram: esvazia o cache no commit
+        estado.session.info["usuarios_todos_alterados"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_usuarios_alterados(sessao: Session):
+    if sessao.info.pop("usuarios_todos_alterados", False):
+        cache_usuarios.limpar()
+    for usuario_id, *emails in sessao.info.pop("usuarios_alterados", ()):
+        cache_usuarios.invalidar(("id", usuario_id))
+        for email in emails:
+            if email:
+                cache_usuarios.invalidar(("sub", email.lower()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _esquecer_usuarios_alterados(sessao: Session):
+    sessao.info.pop("usuarios_todos_alterados", None)
+    sessao.info.pop("usuarios_alterados", None)
 
 
 def verify_password(plain_password, hashed_password):
@@ -37,7 +137,7 @@ def criar_token_de_acesso_a_rotas_protegidas(
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=60)
+        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
@@ -64,21 +164,22 @@ class JWTBearer(HTTPBearer):
             if not dados_token:
                 raise HTTPException(status_code=403, detail="Invalid token")
 
-            from contextos.usuarios.entidade_usuario import Usuario
-            from libs.database.sqlalchemy import Sessao
+            usuario = None
+            if AUTH_MODO == "claims":
+                usuario = UsuarioAutenticado.das_claims(dados_token)
+                if usuario and not versoes_tokens.em_dia(usuario):
+                    raise self.token_revogado()
+
+            if usuario is None:
+                usuario = await self.buscar_usuario_do_token(dados_token)
+                if usuario and versao_do_token(dados_token) < usuario.versao_token:
+                    if AUTH_MODO == "claims":
+                        versoes_tokens.registrar(usuario.id, usuario.versao_token)
+                    raise self.token_revogado()
 
-            db = Sessao()
-            usuario = (
-                db.query(Usuario)
-                .filter(
-                    Usuario.email.ilike(dados_token.get("sub", "sem-email-no-sub?"))
-                )
-                .first()
-            )
             if not usuario:
                 raise HTTPException(status_code=403, detail="Invalid token")
 
-            usuario: Usuario
             if not usuario.ativo:
                 raise HTTPException(status_code=403, detail="Usuario desativado")
 
@@ -89,12 +190,51 @@ class JWTBearer(HTTPBearer):
         else:
             raise HTTPException(status_code=403, detail="Invalid authorization code")
 
+    @staticmethod
+    def token_revogado() -> HTTPException:
+        # logout, troca de senha ou desativação depois que o token foi emitido
+        return HTTPException(
+            status_code=401,
+            detail="Token revogado, faça login novamente",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    async def buscar_usuario_do_token(
+        self, dados_token: dict
+    ) -> Optional[UsuarioAutenticado]:
+        from sqlalchemy import func, select
+
+        from contextos.usuarios.entidade_usuario import Usuario
+        from libs.database.sqlalchemy import consultar
+
+        usuario_id = dados_token.get("id")
+        if usuario_id is not None:
+            chave = ("id", usuario_id)
+        else:
+            chave = ("sub", str(dados_token.get("sub", "sem-email-no-sub?")).lower())
+
+        usuario = cache_usuarios.pegar(chave)
+        if usuario is not None:
+            return usuario
+
+        consulta = select(
+            *(getattr(Usuario, campo) for campo in UsuarioAutenticado._fields)
+        )
+        if usuario_id is not None:
+            consulta = consulta.where(Usuario.id == usuario_id)
+        else:
+            consulta = consulta.where(func.lower(Usuario.email) == chave[1])
+
+        # só as colunas, numa tupla imutável: pode ser compartilhada entre
+        # requisições sem carregar a senha nem depender de sessão
+        linha = next(iter(await consultar(consulta.limit(1))), None)
+        usuario = UsuarioAutenticado(**linha._mapping) if linha else None
+        if usuario:
+            cache_usuarios.guardar(chave, usuario)
+        return usuario
+
     def verify_jwt(self, jwt_token: str):
-        try:
-            payload = jwt.decode(jwt_token, SECRET_KEY, algorithms=[ALGORITHM])
-            return payload
-        except JWTError:
-            return False
+        return verificador_tokens.verificar(jwt_token) or False
 
 
 def verificar_token_de_acesso_a_rotas_protegidas(request: Request): ...
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from loguru import logger
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+# banco: JWTBearer carrega o usuário (com cache); claims: monta o usuário só
+# com as claims do token, sem banco, enquanto a versão do token estiver em dia.
+# Nos dois modos token com versão menor que a do usuário foi revogado (401).
+AUTH_MODO = os.getenv("AUTH_MODO", "banco").lower()
+# de quanto em quanto tempo cada worker relê as versões dos tokens do banco
+AUTH_VERSOES_INTERVALO = float(os.getenv("AUTH_VERSOES_INTERVALO", "30"))
+
+
+class UsuarioAutenticado(NamedTuple):
+    """Usuário montado com as claims do token, sem ir ao banco.
+
+    Tem os campos do Usuario que rotas e serviços usam depois da
+    autenticação (id, email, autor) e os que o JWTBearer confere.
+    """
+
+    id: int
+    email: str
+    autor: bool
+    ativo: bool
+    versao_token: int
+    deletado: bool = False
+
+    @classmethod
+    def das_claims(cls, claims: dict) -> Optional["UsuarioAutenticado"]:
+        try:
+            return cls(
+                id=int(claims["id"]),
+                email=str(claims["sub"]),
+                autor=bool(claims["autor"]),
+                ativo=bool(claims["ativo"]),
+                versao_token=int(claims["ver"]),
+            )
+        except (KeyError, TypeError, ValueError):
+            # token de antes das claims de autorização
+            return None
+
+
+def versao_do_token(claims: dict) -> int:
+    # tokens de antes da claim ver são da primeira versão
+    try:
+        return int(claims.get("ver", 1))
+    except (TypeError, ValueError):
+        return 1
+
+
+def claims_de_autorizacao(usuario) -> dict:
+    """Claims que deixam o JWTBearer dispensar o banco no modo claims."""
+    return {
+        "autor": bool(usuario.autor),
+        "ativo": bool(usuario.ativo and not usuario.deletado),
+        "ver": usuario.versao_token,
+    }
+
+
+class VersoesTokens:
+    """Versão atual dos tokens de quem revogou tokens recentemente.
+
+    Só guarda revogações mais novas que a validade de um token: depois dela
+    os tokens revogados já venceram e o usuário volta a valer como versão 1
+    aqui (tokens novos levam a versão nova, que é maior). Revogações feitas
+    neste worker valem na hora, as de outros workers chegam na próxima
+    releitura (AUTH_VERSOES_INTERVALO).
+    """
+
+    def __init__(self):
+        # usuario_id -> (versão, quando foi renovada)
+        self._versoes: dict[int, tuple[int, datetime]] = {}
+        self._lock = threading.Lock()
+        self._proxima_limpeza = 0.0
+
+    def atual(self, usuario_id: int) -> int:
+        versao, _ = self._versoes.get(usuario_id, (1, None))
+        return versao
+
+    def em_dia(self, usuario: UsuarioAutenticado) -> bool:
+        # versão maior que a conhecida: token emitido por outro worker depois
+        # de uma renovação que este ainda não releu
+        return usuario.versao_token >= self.atual(usuario.id)
+
+    def registrar(
+        self, usuario_id: int, versao: int, renovado_em: Optional[datetime] = None
+    ):
+        renovado_em = renovado_em or datetime.utcnow()
+        with self._lock:
+            if versao > self._versoes.get(usuario_id, (1, None))[0]:
+                self._versoes[usuario_id] = (versao, renovado_em)
+
+            # limpeza amortizada: o dicionário não cresce nem sem a releitura
+            if time.monotonic() >= self._proxima_limpeza:
+                self._descartar_vencidas(self._limite())
+                self._proxima_limpeza = time.monotonic() + 60
+
+    def recarregar(self, db: Session):
+        from contextos.usuarios.entidade_usuario import Usuario
+
+        limite = self._limite()
+        linhas = db.query(
+            Usuario.id, Usuario.versao_token, Usuario.token_renovado_em
+        ).filter(Usuario.token_renovado_em >= limite)
+        for usuario_id, versao, renovado_em in linhas:
+            self.registrar(usuario_id, versao, renovado_em)
+
+        with self._lock:
+            self._descartar_vencidas(limite)
+
+    def limpar(self):
+        with self._lock:
+            self._versoes.clear()
+
+    def __len__(self):
+        return len(self._versoes)
+
+    @staticmethod
+    def _limite() -> datetime:
+        from libs.autenticacao.config import ACCESS_TOKEN_EXPIRE_MINUTES
+
+        return datetime.utcnow() - timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+
+    def _descartar_vencidas(self, limite: datetime):
+        vencidas = [
+            usuario_id
+            for usuario_id, (_, renovado_em) in self._versoes.items()
+            if renovado_em < limite
+        ]
+        for usuario_id in vencidas:
+            del self._versoes[usuario_id]
+
+
+versoes_tokens = VersoesTokens()
+
+
+async def acompanhar_versoes_tokens(intervalo: float = AUTH_VERSOES_INTERVALO):
+    """Relê as revogações recentes periodicamente; é assim que um worker
+    fica sabendo das revogações feitas nos outros."""
+    from libs.database.sqlalchemy import executar_em_nova_sessao
+
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            await executar_em_nova_sessao(versoes_tokens.recarregar)
+        except SQLAlchemyError as erro:
+            logger.warning(f"Não foi possível reler as versões dos tokens: {erro}")
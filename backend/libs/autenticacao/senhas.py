@@ -0,0 +1,147 @@
+import asyncio
+import hmac
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing import get_context
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+
+# custo (log2 das rodadas) do bcrypt; hashes com outro custo são refeitos no login
+BCRYPT_CUSTO = int(os.getenv("BCRYPT_CUSTO", "12"))
+
+
+def _processos_senhas_padrao() -> int:
+    """Divide as CPUs entre os workers: cada worker tem o próprio pool, então
+    o bcrypt de todos somados ocupa no máximo as CPUs disponíveis."""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    # o servidor.py exporta WEB_WORKERS já resolvido; sem ele, um processo só
+    workers = int(os.getenv("WEB_WORKERS", "1")) or cpus
+    return max(1, cpus // workers)
+
+
+# processos dedicados ao bcrypt, por worker; 0 roda no threadpool do próprio worker
+SENHAS_PROCESSOS = int(os.getenv("SENHAS_PROCESSOS") or _processos_senhas_padrao())
+# tarefas aceitas além das que estão rodando; acima disso responde 503
+SENHAS_FILA = int(os.getenv("SENHAS_FILA", "32"))
+
+# o passlib 1.7 não reconhece a versão do bcrypt 4.x e registra um traceback
+# inofensivo em cada processo; o hash funciona normalmente
+logging.getLogger("passlib.handlers.bcrypt").setLevel(logging.ERROR)
+
+
+@lru_cache(maxsize=None)
+def contexto_senhas(custo: int = BCRYPT_CUSTO) -> CryptContext:
+    # mínimo e máximo iguais ao custo: needs_update marca qualquer outro custo
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=custo,
+        bcrypt__min_rounds=custo,
+        bcrypt__max_rounds=custo,
+    )
+
+
+def gerar_hash_senha(senha: str, custo: int = BCRYPT_CUSTO) -> str:
+    return contexto_senhas(custo).hash(senha)
+
+
+def verificar_e_atualizar_senha(
+    senha: str, armazenada: str, custo: int = BCRYPT_CUSTO
+) -> tuple[bool, Optional[str]]:
+    """Confere a senha e devolve o hash novo quando o guardado precisa ser refeito.
+
+    Senhas gravadas em texto puro, de antes do bcrypt, também são aceitas uma
+    última vez e já voltam com o hash para substituí-las.
+    """
+    contexto = contexto_senhas(custo)
+    if contexto.identify(armazenada, required=False) is None:
+        if hmac.compare_digest(senha.encode(), armazenada.encode()):
+            return True, contexto.hash(senha)
+        return False, None
+
+    return contexto.verify_and_update(senha, armazenada)
+
+
+class PoolSenhas:
+    """Processos dedicados ao bcrypt, para o custo dele não travar o event
+    loop nem o threadpool durante rajadas de login.
+
+    O número de tarefas pendentes é limitado: acima do limite a requisição
+    recebe 503 com Retry-After em vez de esperar numa fila sem fim.
+    """
+
+    def __init__(self, processos: int, fila: int, custo: int):
+        self.processos = processos
+        self.limite_pendentes = max(processos, 1) + fila
+        self.custo = custo
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pendentes = 0
+        self._lock = threading.Lock()
+
+    def _pegar_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: o worker do uvicorn tem threads, fork copiaria locks presos
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processos, mp_context=get_context("spawn")
+                )
+            return self._executor
+
+    async def _executar(self, funcao: Callable[..., Any], *argumentos) -> Any:
+        with self._lock:
+            if self._pendentes >= self.limite_pendentes:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Muitas verificações de senha em andamento, tente novamente.",
+                    headers={"Retry-After": "1"},
+                )
+            self._pendentes += 1
+
+        try:
+            if self.processos <= 0:
+                return await run_in_threadpool(funcao, *argumentos)
+            return await asyncio.wrap_future(
+                self._pegar_executor().submit(funcao, *argumentos)
+            )
+        finally:
+            with self._lock:
+                self._pendentes -= 1
+
+    async def gerar_hash(self, senha: str) -> str:
+        return await self._executar(gerar_hash_senha, senha, self.custo)
+
+    async def verificar(
+        self, senha: str, armazenada: str
+    ) -> tuple[bool, Optional[str]]:
+        return await self._executar(
+            verificar_e_atualizar_senha, senha, armazenada, self.custo
+        )
+
+    def encerrar(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _descartar_herdado(self):
+        # no filho de um fork os processos do pool são do pai
+        self._executor = None
+        self._pendentes = 0
+        self._lock = threading.Lock()
+
+
+pool_senhas = PoolSenhas(
+    processos=SENHAS_PROCESSOS, fila=SENHAS_FILA, custo=BCRYPT_CUSTO
+)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=pool_senhas._descartar_herdado)
@@ -0,0 +1,151 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from jose import JWTError, jwt
+
+from libs.cache.lru import CacheTTL
+
+
+class TokenInvalido(Exception):
+    pass
+
+
+class IDecodificadorJWT(ABC):
+    """Confere assinatura e claims registradas e devolve as claims do token."""
+
+    def __init__(self, chave: str, algoritmo: str):
+        self.chave = chave
+        self.algoritmo = algoritmo
+
+    @abstractmethod
+    def decodificar(self, token: str) -> dict: ...
+
+
+class DecodificadorJose(IDecodificadorJWT):
+    def decodificar(self, token: str) -> dict:
+        try:
+            return jwt.decode(token, self.chave, algorithms=[self.algoritmo])
+        except JWTError as erro:
+            raise TokenInvalido(str(erro)) from erro
+
+
+class DecodificadorHMAC(IDecodificadorJWT):
+    """HS256/384/512 só com a biblioteca padrão.
+
+    Faz as mesmas verificações que o jose faz com as opções padrão (algoritmo
+    do cabeçalho, assinatura, exp, nbf, iat, aud, sub, jti), sem a camada de
+    JWK/JWS genérica que domina o custo dele em tokens pequenos.
+    """
+
+    _HASHES = {
+        "HS256": hashlib.sha256,
+        "HS384": hashlib.sha384,
+        "HS512": hashlib.sha512,
+    }
+
+    def __init__(self, chave: str, algoritmo: str):
+        if algoritmo not in self._HASHES:
+            raise ValueError(f"Algoritmo {algoritmo} não suportado pelo backend hmac")
+        super().__init__(chave, algoritmo)
+        self._chave = chave.encode()
+        self._hash = self._HASHES[algoritmo]
+
+    def decodificar(self, token: str) -> dict:
+        try:
+            cabecalho_b64, claims_b64, assinatura_b64 = token.encode("ascii").split(
+                b"."
+            )
+            cabecalho = json.loads(_b64url(cabecalho_b64))
+            assinatura = _b64url(assinatura_b64)
+        except (ValueError, UnicodeError, binascii.Error) as erro:
+            raise TokenInvalido("Token malformado") from erro
+
+        if not isinstance(cabecalho, dict) or cabecalho.get("alg") != self.algoritmo:
+            raise TokenInvalido("Algoritmo não permitido")
+
+        esperada = hmac.new(
+            self._chave, cabecalho_b64 + b"." + claims_b64, self._hash
+        ).digest()
+        if not hmac.compare_digest(esperada, assinatura):
+            raise TokenInvalido("Assinatura inválida")
+
+        try:
+            claims = json.loads(_b64url(claims_b64))
+        except (ValueError, binascii.Error) as erro:
+            raise TokenInvalido("Claims malformadas") from erro
+        if not isinstance(claims, dict):
+            raise TokenInvalido("Claims malformadas")
+
+        _validar_claims(claims)
+        return claims
+
+
+def _b64url(parte: bytes) -> bytes:
+    return base64.urlsafe_b64decode(parte + b"=" * (-len(parte) % 4))
+
+
+def _validar_claims(claims: dict):
+    agora = int(time.time())
+    try:
+        if "exp" in claims and int(claims["exp"]) < agora:
+            raise TokenInvalido("Token expirado")
+        if "nbf" in claims and int(claims["nbf"]) > agora:
+            raise TokenInvalido("Token ainda não é válido")
+        if "iat" in claims:
+            int(claims["iat"])
+    except (TypeError, ValueError) as erro:
+        raise TokenInvalido("exp/nbf/iat devem ser números") from erro
+
+    # a API não emite aud: como no jose sem audience, token com aud é recusado
+    if "aud" in claims:
+        raise TokenInvalido("Audiência inválida")
+    if "sub" in claims and not isinstance(claims["sub"], str):
+        raise TokenInvalido("sub deve ser texto")
+    if "jti" in claims and not isinstance(claims["jti"], str):
+        raise TokenInvalido("jti deve ser texto")
+
+
+DECODIFICADORES_JWT: dict[str, type[IDecodificadorJWT]] = {
+    "jose": DecodificadorJose,
+    "hmac": DecodificadorHMAC,
+}
+
+
+class VerificadorTokens:
+    """Decodifica tokens guardando as claims dos já validados.
+
+    O SPA repete o mesmo bearer em toda requisição; com o token inteiro como
+    chave (a assinatura faz parte dele), um acerto pula HMAC, JSON e validação
+    das claims. Cada entrada expira no exp do token, nunca depois. Tokens
+    inválidos não entram no cache, para não ocupá-lo com lixo.
+    """
+
+    def __init__(self, decodificador: IDecodificadorJWT, cache: Optional[CacheTTL]):
+        self.decodificador = decodificador
+        self.cache = cache
+
+    def verificar(self, token: str) -> Optional[dict]:
+        if self.cache is not None:
+            claims = self.cache.pegar(token)
+            if claims is not None:
+                return claims
+
+        try:
+            claims = self.decodificador.decodificar(token)
+        except TokenInvalido:
+            return None
+
+        if self.cache is not None:
+            ttl = self.cache.ttl_segundos
+            if "exp" in claims:
+                ttl = min(ttl, int(claims["exp"]) - time.time())
+            if ttl > 0:
+                self.cache.guardar(token, claims, ttl_segundos=ttl)
+
+        return claims
@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+_AUSENTE = object()
+
+
+class CacheTTL:
+    """Cache LRU limitado em tamanho, com expiração por tempo (TTL) e contadores."""
+
+    def __init__(self, tamanho_maximo: int = 1024, ttl_segundos: float = 60.0):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl_segundos = ttl_segundos
+        self.acertos = 0
+        self.falhas = 0
+        self._itens: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def pegar(self, chave: Hashable, padrao: Any = None) -> Any:
+        with self._lock:
+            item = self._itens.get(chave, _AUSENTE)
+            if item is _AUSENTE:
+                self.falhas += 1
+                return padrao
+
+            expira_em, valor = item
+            if expira_em <= time.monotonic():
+                del self._itens[chave]
+                self.falhas += 1
+                return padrao
+
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return valor
+
+    def guardar(
+        self, chave: Hashable, valor: Any, ttl_segundos: Optional[float] = None
+    ):
+        ttl = self.ttl_segundos if ttl_segundos is None else ttl_segundos
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + ttl, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+
+    def invalidar(self, chave: Hashable):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                "tamanho": len(self._itens),
+                "tamanho_maximo": self.tamanho_maximo,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": self.acertos / total if total else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._itens)
@@ -0,0 +1,290 @@
+import hashlib
+import os
+import pickle
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Hashable, NamedTuple, Optional
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from libs.cache.lru import CacheTTL
+
+
+class Validadores(NamedTuple):
+    etag: str
+    ultima_modificacao: Optional[datetime] = None
+
+
+class RespostaEmCache(NamedTuple):
+    corpo: bytes
+    validadores: Validadores
+
+
+class IBackendCache(ABC):
+    """Onde as respostas ficam guardadas, junto com os contadores de versão.
+
+    Um contador pode ser descartado, mas nunca pode voltar a um valor que ele
+    já teve: respostas antigas gravadas com aquela versão voltariam a valer.
+    """
+
+    @abstractmethod
+    def pegar(self, chave: Hashable) -> Optional[Any]: ...
+
+    @abstractmethod
+    def guardar(self, chave: Hashable, valor: Any): ...
+
+    @abstractmethod
+    def limpar(self): ...
+
+    @abstractmethod
+    def pegar_contador(self, chave: Hashable) -> int: ...
+
+    @abstractmethod
+    def incrementar_contador(self, chave: Hashable) -> int: ...
+
+    @abstractmethod
+    def estatisticas(self) -> dict: ...
+
+
+class BackendCacheLocal(IBackendCache):
+    """LRU com TTL na memória do próprio processo.
+
+    Os contadores também ficam num LRU limitado. Todo incremento recebe o
+    próximo número de uma sequência única do backend, e um contador ausente
+    vale o maior número já descartado (o piso). Assim um contador descartado
+    e lido de novo nunca repete uma versão antiga dele: no pior caso as
+    respostas dele viram falhas de cache.
+    """
+
+    def __init__(
+        self,
+        tamanho_maximo: int,
+        ttl_segundos: float,
+        tamanho_maximo_contadores: Optional[int] = None,
+    ):
+        self._cache = CacheTTL(tamanho_maximo=tamanho_maximo, ttl_segundos=ttl_segundos)
+        self._contadores: OrderedDict[Hashable, int] = OrderedDict()
+        self._tamanho_maximo_contadores = (
+            tamanho_maximo_contadores or 4 * tamanho_maximo
+        )
+        self._sequencia = 0
+        self._piso = 0
+        self._lock = threading.Lock()
+
+    def pegar(self, chave: Hashable) -> Optional[Any]:
+        return self._cache.pegar(chave)
+
+    def guardar(self, chave: Hashable, valor: Any):
+        self._cache.guardar(chave, valor)
+
+    def limpar(self):
+        self._cache.limpar()
+        with self._lock:
+            self._contadores.clear()
+            # respostas montadas antes do limpar não podem ser achadas depois
+            self._piso = self._sequencia
+
+    def pegar_contador(self, chave: Hashable) -> int:
+        with self._lock:
+            valor = self._contadores.get(chave)
+            if valor is None:
+                return self._piso
+            self._contadores.move_to_end(chave)
+            return valor
+
+    def incrementar_contador(self, chave: Hashable) -> int:
+        with self._lock:
+            self._sequencia += 1
+            self._contadores[chave] = self._sequencia
+            self._contadores.move_to_end(chave)
+            while len(self._contadores) > self._tamanho_maximo_contadores:
+                _, descartado = self._contadores.popitem(last=False)
+                self._piso = max(self._piso, descartado)
+            return self._sequencia
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            contadores = len(self._contadores)
+        return {**self._cache.estatisticas(), "contadores": contadores}
+
+
+class BackendCacheCompartilhado(BackendCacheLocal):
+    """Simula um cache compartilhado (Redis, memcached) dentro do processo.
+
+    Valores são guardados serializados, como iriam pela rede, então o código
+    que usa o cache não pode depender de receber o mesmo objeto que guardou.
+    Trocar por um cliente real só exige implementar IBackendCache.
+    """
+
+    def pegar(self, chave: Hashable) -> Optional[Any]:
+        valor = super().pegar(self._chave(chave))
+        return None if valor is None else pickle.loads(valor)
+
+    def guardar(self, chave: Hashable, valor: Any):
+        super().guardar(self._chave(chave), pickle.dumps(valor))
+
+    def pegar_contador(self, chave: Hashable) -> int:
+        return super().pegar_contador(self._chave(chave))
+
+    def incrementar_contador(self, chave: Hashable) -> int:
+        return super().incrementar_contador(self._chave(chave))
+
+    @staticmethod
+    def _chave(chave: Hashable) -> str:
+        return (
+            ":".join(str(parte) for parte in chave)
+            if isinstance(chave, tuple)
+            else str(chave)
+        )
+
+
+BACKENDS_CACHE: dict[str, type[BackendCacheLocal]] = {
+    "local": BackendCacheLocal,
+    "compartilhado": BackendCacheCompartilhado,
+}
+
+
+class CacheRespostas:
+    """Guarda o JSON já serializado das respostas junto com ETag/Last-Modified.
+
+    As chaves carregam versões: escrever num livro incrementa a versão dele e
+    a do catálogo, e as respostas antigas simplesmente deixam de ser achadas.
+    Como a versão é lida antes da consulta ao banco, uma resposta montada em
+    paralelo com uma escrita fica gravada com a versão velha e nunca é servida.
+    """
+
+    def __init__(self, backend: IBackendCache, ativo: bool = True):
+        self.backend = backend
+        self.ativo = ativo
+
+    def chave_catalogo(self, rota: str, **parametros) -> tuple:
+        versao = self.backend.pegar_contador(("versao", "catalogo"))
+        return (rota, versao, *sorted(parametros.items()))
+
+    def chave_livro(self, rota: str, livro_id: int) -> tuple:
+        versao = self.backend.pegar_contador(("versao", "livro", livro_id))
+        return (rota, livro_id, versao)
+
+    def pegar(self, chave: tuple) -> Optional[RespostaEmCache]:
+        if not self.ativo:
+            return None
+        return self.backend.pegar(chave)
+
+    def guardar(
+        self,
+        chave: tuple,
+        modelo: BaseModel,
+        validadores: Optional[Validadores] = None,
+    ) -> RespostaEmCache:
+        corpo = modelo.model_dump_json().encode()
+        resposta = RespostaEmCache(
+            corpo=corpo, validadores=validadores or Validadores(gerar_etag(corpo))
+        )
+        if self.ativo:
+            self.backend.guardar(chave, resposta)
+        return resposta
+
+    def invalidar_livros(self, *livro_ids: int):
+        for livro_id in livro_ids:
+            self.backend.incrementar_contador(("versao", "livro", livro_id))
+        self.invalidar_catalogo()
+
+    def invalidar_catalogo(self):
+        """Para livros recém-criados: ainda não há resposta em cache com o id
+        deles, só as listagens precisam mudar."""
+        # listagens mostram quantidade e preço, então qualquer escrita as invalida
+        self.backend.incrementar_contador(("versao", "catalogo"))
+
+    def limpar(self):
+        self.backend.limpar()
+
+    def estatisticas(self) -> dict:
+        return self.backend.estatisticas()
+
+
+def gerar_etag(*partes) -> str:
+    resumo = hashlib.blake2b(digest_size=16)
+    for parte in partes:
+        resumo.update(parte if isinstance(parte, bytes) else str(parte).encode())
+        resumo.update(b"|")
+    return '"' + resumo.hexdigest() + '"'
+
+
+def nao_modificado(request: Request, validadores: Validadores) -> bool:
+    """Avalia If-None-Match e, só na ausência dele, If-Modified-Since."""
+    cabecalho = request.headers.get("if-none-match")
+    if cabecalho:
+        if cabecalho.strip() == "*":
+            return True
+        # comparação fraca (RFC 9110), aceita W/"..." devolvido por proxies
+        etags = {valor.strip().removeprefix("W/") for valor in cabecalho.split(",")}
+        return validadores.etag in etags
+
+    cabecalho = request.headers.get("if-modified-since")
+    if cabecalho and validadores.ultima_modificacao:
+        try:
+            desde = parsedate_to_datetime(cabecalho)
+        except (TypeError, ValueError):
+            return False
+        if desde.tzinfo is None:
+            desde = desde.replace(tzinfo=timezone.utc)
+        # o cabeçalho HTTP tem precisão de segundos
+        modificado = validadores.ultima_modificacao.replace(
+            microsecond=0, tzinfo=timezone.utc
+        )
+        return modificado <= desde
+
+    return False
+
+
+def cabecalhos_de_validacao(
+    validadores: Validadores, cache_control: Optional[str] = None
+) -> dict[str, str]:
+    cabecalhos = {"ETag": validadores.etag}
+    if validadores.ultima_modificacao:
+        cabecalhos["Last-Modified"] = format_datetime(
+            validadores.ultima_modificacao.replace(tzinfo=timezone.utc), usegmt=True
+        )
+    if cache_control:
+        cabecalhos["Cache-Control"] = cache_control
+    return cabecalhos
+
+
+def responder(
+    request: Request,
+    resposta: RespostaEmCache,
+    origem: str = "MISS",
+    cache_control: Optional[str] = None,
+) -> Response:
+    cabecalhos = cabecalhos_de_validacao(resposta.validadores, cache_control)
+    cabecalhos["X-Cache"] = origem
+    if nao_modificado(request, resposta.validadores):
+        return Response(status_code=304, headers=cabecalhos)
+    return Response(
+        content=resposta.corpo, media_type="application/json", headers=cabecalhos
+    )
+
+
+def responder_nao_modificado(
+    validadores: Validadores, cache_control: Optional[str] = None
+) -> Response:
+    return Response(
+        status_code=304, headers=cabecalhos_de_validacao(validadores, cache_control)
+    )
+
+
+def criar_cache_respostas() -> CacheRespostas:
+    backend = os.getenv("CACHE_RESPOSTAS_BACKEND", "local").lower()
+    return CacheRespostas(
+        BACKENDS_CACHE[backend](
+            tamanho_maximo=int(os.getenv("CACHE_RESPOSTAS_TAMANHO", "2048")),
+            ttl_segundos=float(os.getenv("CACHE_RESPOSTAS_TTL", "30")),
+            # 0: quatro vezes o número de respostas guardadas
+            tamanho_maximo_contadores=int(os.getenv("CACHE_RESPOSTAS_CONTADORES", "0")),
+        ),
+        ativo=os.getenv("CACHE_RESPOSTAS", "1") != "0",
+    )
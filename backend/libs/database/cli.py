@@ -0,0 +1,48 @@
+"""Comandos do banco, rodados fora do startup da API (deploy, make banco).
+
+python -m libs.database.cli criar-tabelas
+python -m libs.database.cli popular [--livros N] [--usuarios N]
+python -m libs.database.cli preparar [--livros N] [--usuarios N]
+"""
+
+import argparse
+from typing import Optional
+
+from libs.database.sqlalchemy import (
+    SEED_LIVROS,
+    SEED_USUARIOS,
+    criar_tabela,
+    popular_tabela,
+)
+
+
+def _popular(opcoes: argparse.Namespace):
+    if popular_tabela(opcoes.livros, opcoes.usuarios):
+        print(f"Banco populado com {opcoes.livros} livros.")
+    else:
+        print("Banco já populado, nada a fazer.")
+
+
+def main(argumentos: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description="Comandos do banco de dados.")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    comandos.add_parser("criar-tabelas", help="aplica as migrações pendentes")
+    for nome, ajuda in (
+        ("popular", "carga de desenvolvimento (só em banco vazio)"),
+        ("preparar", "criar-tabelas seguido de popular"),
+    ):
+        comando = comandos.add_parser(nome, help=ajuda)
+        comando.add_argument("--livros", type=int, default=SEED_LIVROS)
+        comando.add_argument("--usuarios", type=int, default=SEED_USUARIOS)
+
+    opcoes = parser.parse_args(argumentos)
+    if opcoes.comando in ("criar-tabelas", "preparar"):
+        criar_tabela()
+        print("Tabelas criadas/migradas.")
+    if opcoes.comando in ("popular", "preparar"):
+        _popular(opcoes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, TypeVar
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+T = TypeVar("T")
+
+# SQLSTATE do Postgres para falha de serialização e deadlock
+_CODIGOS_CONFLITO_POSTGRES = {"40001", "40P01"}
+
+
+def eh_conflito_de_concorrencia(erro: DBAPIError) -> bool:
+    """Erros transitórios em que repetir a transação inteira costuma resolver."""
+    codigo = getattr(erro.orig, "pgcode", None) or getattr(erro.orig, "sqlstate", None)
+    if codigo in _CODIGOS_CONFLITO_POSTGRES:
+        return True
+
+    mensagem = str(erro.orig).lower()
+    return "database is locked" in mensagem or "database table is locked" in mensagem
+
+
+def repetir_em_conflito(
+    db: Session,
+    funcao: Callable[[], T],
+    tentativas: int = 3,
+    espera_segundos: float = 0.05,
+) -> T:
+    """Executa a transação de funcao, desfazendo e repetindo em caso de conflito.
+
+    Dorme entre as tentativas, então só pode rodar no threadpool
+    (executar_na_sessao), nunca na thread do event loop.
+    """
+    _garantir_fora_do_event_loop()
+    for tentativa in range(1, tentativas + 1):
+        try:
+            return funcao()
+        except DBAPIError as erro:
+            db.rollback()
+            if tentativa == tentativas or not eh_conflito_de_concorrencia(erro):
+                raise
+            # espera crescente com um pouco de aleatoriedade para não colidir de novo
+            time.sleep(espera_segundos * tentativa * (1 + random.random()))
+
+
+async def repetir_em_conflito_async(
+    db: AsyncSession,
+    funcao: Callable[[], Awaitable[T]],
+    tentativas: int = 3,
+    espera_segundos: float = 0.05,
+) -> T:
+    """repetir_em_conflito para os repositórios assíncronos: espera com
+    asyncio.sleep, sem travar o event loop."""
+    for tentativa in range(1, tentativas + 1):
+        try:
+            return await funcao()
+        except DBAPIError as erro:
+            await db.rollback()
+            if tentativa == tentativas or not eh_conflito_de_concorrencia(erro):
+                raise
+            await asyncio.sleep(espera_segundos * tentativa * (1 + random.random()))
+
+
+def _garantir_fora_do_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    raise RuntimeError(
+        "repetir_em_conflito travaria o event loop; rode via executar_na_sessao"
+    )
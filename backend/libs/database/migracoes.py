@@ -0,0 +1,285 @@
+import os
+from datetime import datetime
+from typing import Callable, NamedTuple, Optional
+
+from loguru import logger
+from sqlalchemy import (
+    Column,
+    DateTime,
+    MetaData,
+    String,
+    Table,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex
+
+from libs.database.sqlalchemy import _Base
+
+# linhas por transação nos preenchimentos de coluna nova
+MIGRACOES_LOTE = int(os.getenv("MIGRACOES_LOTE", "1000"))
+
+_metadata_migracoes = MetaData()
+
+tabela_migracoes = Table(
+    "schema_migracoes",
+    _metadata_migracoes,
+    Column("id", String(100), primary_key=True),
+    Column("aplicada_em", DateTime, nullable=False, default=datetime.utcnow),
+)
+
+
+class Migracao(NamedTuple):
+    id: str
+    aplicar: Callable[[Engine], None]
+
+
+def _criar_tabelas(engine: Engine):
+    # em banco novo já cria as tabelas com todos os índices declarados
+    with engine.begin() as conexao:
+        _Base.metadata.create_all(conexao)
+
+
+def criar_indices(engine: Engine, *nomes: str):
+    """Cria os índices (declarados nos modelos) que ainda não existem no banco.
+
+    No Postgres usa CREATE INDEX CONCURRENTLY fora de transação, para não
+    travar escrita nas tabelas enquanto o índice é construído.
+    """
+    indices = {
+        indice.name: indice
+        for tabela in _Base.metadata.sorted_tables
+        for indice in tabela.indexes
+    }
+
+    postgres = engine.dialect.name == "postgresql"
+    opcoes = {"isolation_level": "AUTOCOMMIT"} if postgres else {}
+
+    with engine.connect().execution_options(**opcoes) as conexao:
+        for nome in nomes:
+            indice = indices.get(nome)
+            if indice is None:
+                # índice que uma migração posterior substituiu no modelo
+                continue
+            if postgres:
+                indice.dialect_kwargs["postgresql_concurrently"] = True
+            conexao.execute(CreateIndex(indice, if_not_exists=True))
+        conexao.commit()
+
+
+def preencher_em_lotes(
+    engine: Engine,
+    tabela: str,
+    atribuicao: str,
+    condicao: str,
+    tamanho_lote: Optional[int] = None,
+) -> int:
+    """Roda UPDATE tabela SET atribuicao WHERE condicao por faixas de id.
+
+    Cada faixa é uma transação: a escrita na tabela só fica travada durante
+    um lote, não pela tabela inteira. A condição deve deixar de valer para
+    as linhas já preenchidas, assim uma migração interrompida continua de
+    onde parou. Devolve o número de linhas alteradas.
+    """
+    with engine.connect() as conexao:
+        menor, maior = conexao.execute(
+            text(f"SELECT MIN(id), MAX(id) FROM {tabela}")
+        ).one()
+    if menor is None:
+        return 0
+
+    tamanho_lote = tamanho_lote or MIGRACOES_LOTE
+    comando = text(
+        f"UPDATE {tabela} SET {atribuicao} "
+        f"WHERE id >= :inicio AND id < :fim AND ({condicao})"
+    )
+    alteradas = 0
+    for inicio in range(menor, maior + 1, tamanho_lote):
+        with engine.begin() as conexao:
+            resultado = conexao.execute(
+                comando, {"inicio": inicio, "fim": inicio + tamanho_lote}
+            )
+        alteradas += resultado.rowcount
+    return alteradas
+
+
+def _carrinho_unico_por_usuario_e_livro(engine: Engine):
+    # junta as linhas repetidas na de menor id antes de criar o índice único
+    with engine.begin() as conexao:
+        conexao.execute(
+            text(
+                """
+                UPDATE carrinho SET quantidade = (
+                    SELECT SUM(repetido.quantidade) FROM carrinho AS repetido
+                    WHERE repetido.usuario_id = carrinho.usuario_id
+                    AND repetido.livro_id = carrinho.livro_id
+                )
+                WHERE id IN (
+                    SELECT MIN(id) FROM carrinho
+                    GROUP BY usuario_id, livro_id HAVING COUNT(*) > 1
+                )
+                """
+            )
+        )
+        conexao.execute(
+            text(
+                """
+                DELETE FROM carrinho WHERE id NOT IN (
+                    SELECT MIN(id) FROM carrinho GROUP BY usuario_id, livro_id
+                )
+                """
+            )
+        )
+        conexao.execute(text("DROP INDEX IF EXISTS ix_carrinho_usuario_id_livro_id"))
+
+    criar_indices(engine, "uq_carrinho_usuario_id_livro_id")
+
+
+def _versao_dos_livros(engine: Engine):
+    colunas = {coluna["name"] for coluna in inspect(engine).get_columns("livros")}
+    with engine.begin() as conexao:
+        if "versao" not in colunas:
+            conexao.execute(
+                text("ALTER TABLE livros ADD COLUMN versao INTEGER NOT NULL DEFAULT 1")
+            )
+        if "atualizado_em" not in colunas:
+            # o SQLite não aceita default não constante no ADD COLUMN; a coluna
+            # nasce anulável e é preenchida em lotes abaixo
+            conexao.execute(
+                text("ALTER TABLE livros ADD COLUMN atualizado_em TIMESTAMP")
+            )
+
+    preencher_em_lotes(
+        engine,
+        "livros",
+        "atualizado_em = CURRENT_TIMESTAMP",
+        "atualizado_em IS NULL",
+    )
+
+    if engine.dialect.name == "postgresql":
+        _atualizado_em_nao_nulo_no_postgres(engine)
+
+
+def _atualizado_em_nao_nulo_no_postgres(engine: Engine):
+    # SET NOT NULL direto varre a tabela com ela travada. Com um CHECK já
+    # validado (o VALIDATE não bloqueia escrita) o Postgres 12+ pula a
+    # varredura.
+    with engine.begin() as conexao:
+        conexao.execute(
+            text(
+                "ALTER TABLE livros DROP CONSTRAINT IF EXISTS "
+                "ck_livros_atualizado_em_nao_nulo"
+            )
+        )
+        conexao.execute(
+            text(
+                "ALTER TABLE livros ADD CONSTRAINT ck_livros_atualizado_em_nao_nulo "
+                "CHECK (atualizado_em IS NOT NULL) NOT VALID"
+            )
+        )
+    with engine.begin() as conexao:
+        conexao.execute(
+            text(
+                "ALTER TABLE livros VALIDATE CONSTRAINT "
+                "ck_livros_atualizado_em_nao_nulo"
+            )
+        )
+    with engine.begin() as conexao:
+        conexao.execute(
+            text("ALTER TABLE livros ALTER COLUMN atualizado_em SET NOT NULL")
+        )
+        conexao.execute(
+            text("ALTER TABLE livros DROP CONSTRAINT ck_livros_atualizado_em_nao_nulo")
+        )
+
+
+def _versao_dos_tokens(engine: Engine):
+    colunas = {coluna["name"] for coluna in inspect(engine).get_columns("usuarios")}
+    if "versao_token" not in colunas:
+        with engine.begin() as conexao:
+            conexao.execute(
+                text(
+                    "ALTER TABLE usuarios "
+                    "ADD COLUMN versao_token INTEGER NOT NULL DEFAULT 1"
+                )
+            )
+
+
+def _renovacao_dos_tokens(engine: Engine):
+    colunas = {coluna["name"] for coluna in inspect(engine).get_columns("usuarios")}
+    if "token_renovado_em" not in colunas:
+        with engine.begin() as conexao:
+            conexao.execute(
+                text("ALTER TABLE usuarios ADD COLUMN token_renovado_em TIMESTAMP")
+            )
+    # sem a data das revogações anteriores: trata como recentes, para que
+    # os tokens revogados continuem recusados até vencerem
+    preencher_em_lotes(
+        engine,
+        "usuarios",
+        "token_renovado_em = CURRENT_TIMESTAMP",
+        "versao_token > 1 AND token_renovado_em IS NULL",
+    )
+
+    criar_indices(engine, "ix_usuarios_token_renovado_em")
+
+
+# Ordem de aplicação. Migração já publicada não deve ser editada, crie outra.
+MIGRACOES: list[Migracao] = [
+    Migracao("0001_tabelas_iniciais", _criar_tabelas),
+    Migracao(
+        "0002_indices_consultas_frequentes",
+        lambda engine: criar_indices(
+            engine,
+            "ix_carrinho_usuario_id_livro_id",
+            "ix_livros_deletado_usuario_id",
+            "ix_venda_item_livro_id",
+            "ix_venda_item_venda_id",
+            "ix_vendas_id_usuario_comprador",
+            "ix_usuarios_email_lower",
+        ),
+    ),
+    Migracao("0003_carrinho_unico", _carrinho_unico_por_usuario_e_livro),
+    Migracao("0004_versao_dos_livros", _versao_dos_livros),
+    Migracao("0005_versao_dos_tokens", _versao_dos_tokens),
+    Migracao("0006_renovacao_dos_tokens", _renovacao_dos_tokens),
+]
+
+
+def aplicar_migracoes(engine: Engine) -> list[str]:
+    """Aplica as migrações pendentes e devolve os ids aplicados agora."""
+    _metadata_migracoes.create_all(engine)
+
+    with engine.connect() as conexao:
+        aplicadas = set(conexao.execute(select(tabela_migracoes.c.id)).scalars())
+
+    aplicadas_agora = []
+    for migracao in MIGRACOES:
+        if migracao.id in aplicadas:
+            continue
+
+        logger.info(f"Aplicando migração {migracao.id}")
+        migracao.aplicar(engine)
+
+        try:
+            with engine.begin() as conexao:
+                conexao.execute(tabela_migracoes.insert().values(id=migracao.id))
+        except IntegrityError:
+            # outro worker aplicou a mesma migração ao mesmo tempo
+            pass
+
+        aplicadas_agora.append(migracao.id)
+
+    return aplicadas_agora
+
+
+def migracoes_pendentes(conexao: Connection) -> list[str]:
+    """Ids de MIGRACOES ainda não aplicados (todos, se nem a tabela existe)."""
+    if not inspect(conexao).has_table(tabela_migracoes.name):
+        return [migracao.id for migracao in MIGRACOES]
+
+    aplicadas = set(conexao.execute(select(tabela_migracoes.c.id)).scalars())
+    return [migracao.id for migracao in MIGRACOES if migracao.id not in aplicadas]
@@ -0,0 +1,160 @@
+import os
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Perfil opcional: desligado não registra eventos na engine nem middleware
+SQL_PERFIL = os.getenv("SQL_PERFIL", "false").lower() in ("1", "true", "sim")
+SQL_LENTA_SEGUNDOS = float(os.getenv("SQL_LENTA_MS", "100")) / 1000
+# profundidade máxima da pilha percorrida atrás do método do repositório
+_PROFUNDIDADE_PILHA = 40
+
+_perfil_atual: ContextVar[Optional[dict]] = ContextVar("perfil_sql", default=None)
+
+
+def metodo_do_repositorio() -> Optional[str]:
+    """Acha na pilha o método de repositório (contextos/*/repositorio_*.py) que disparou o SQL."""
+    quadro = sys._getframe(1)
+    for _ in range(_PROFUNDIDADE_PILHA):
+        if quadro is None:
+            return None
+        codigo = quadro.f_code
+        if "repositorio_" in codigo.co_filename:
+            instancia = quadro.f_locals.get("self")
+            classe = type(instancia).__name__ if instancia is not None else None
+            return f"{classe}.{codigo.co_name}" if classe else codigo.co_name
+        quadro = quadro.f_back
+    return None
+
+
+def perfilar_engine(engine_perfilada: Engine):
+    """Marca cada comando com o método do repositório e registra os lentos.
+
+    O método vai como comentário no SQL (aparece em pg_stat_statements e logs
+    do banco). O id da requisição fica só no log: no texto do SQL ele tornaria
+    cada comando único e anularia o cache de comandos preparados do driver.
+    """
+
+    @event.listens_for(engine_perfilada, "before_cursor_execute", retval=True)
+    def _antes(conexao, cursor, comando, parametros, contexto, executemany):
+        metodo = metodo_do_repositorio()
+        conexao.info.setdefault("perfil_sql", []).append((time.perf_counter(), metodo))
+        if metodo:
+            comando = f"/* repositorio={metodo} */ {comando}"
+        return comando, parametros
+
+    @event.listens_for(engine_perfilada, "after_cursor_execute")
+    def _depois(conexao, cursor, comando, parametros, contexto, executemany):
+        pilha = conexao.info.get("perfil_sql")
+        if not pilha:
+            return
+        inicio, metodo = pilha.pop()
+        duracao = time.perf_counter() - inicio
+
+        perfil = _perfil_atual.get()
+        if perfil is not None:
+            perfil["consultas"] += 1
+            perfil["tempo_db"] += duracao
+
+        if duracao >= SQL_LENTA_SEGUNDOS:
+            _registrar_consulta_lenta(
+                conexao, cursor, comando, parametros, executemany, metodo, duracao
+            )
+
+    @event.listens_for(engine_perfilada, "handle_error")
+    def _erro(contexto_erro):
+        conexao = contexto_erro.connection
+        if conexao is not None and conexao.info.get("perfil_sql"):
+            conexao.info["perfil_sql"].pop()
+
+
+def _plano_de_execucao(conexao, comando: str, parametros) -> Optional[list]:
+    dialeto = conexao.dialect.name
+    if dialeto == "sqlite":
+        prefixo = "EXPLAIN QUERY PLAN "
+    elif dialeto == "postgresql":
+        prefixo = "EXPLAIN "
+    else:
+        return None
+
+    # cursor direto do driver para o EXPLAIN não passar de novo pelos eventos
+    cursor = conexao.connection.cursor()
+    try:
+        cursor.execute(prefixo + comando, parametros)
+        return [tuple(linha) for linha in cursor.fetchall()]
+    except Exception as erro:
+        return [f"não foi possível obter o plano: {erro}"]
+    finally:
+        cursor.close()
+
+
+def _registrar_consulta_lenta(
+    conexao, cursor, comando, parametros, executemany, metodo, duracao
+):
+    perfil = _perfil_atual.get()
+    plano = None if executemany else _plano_de_execucao(conexao, comando, parametros)
+    logger.warning(
+        "SQL lento | requisicao={} | repositorio={} | {:.1f}ms | {} | plano={}",
+        perfil["id"] if perfil else "-",
+        metodo or "-",
+        duracao * 1000,
+        " ".join(comando.split()),
+        plano,
+    )
+
+
+class PerfilSQL:
+    """Middleware ASGI que soma o tempo de banco de cada requisição.
+
+    Devolve o X-Request-ID (recebido ou gerado) e um Server-Timing com o
+    tempo de banco e o restante da aplicação até o início da resposta.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        id_requisicao = None
+        for chave, valor in scope.get("headers", []):
+            if chave == b"x-request-id":
+                id_requisicao = valor.decode("latin-1")[:64]
+                break
+
+        perfil = {
+            "id": id_requisicao or uuid.uuid4().hex,
+            "consultas": 0,
+            "tempo_db": 0.0,
+        }
+        token = _perfil_atual.set(perfil)
+        inicio = time.perf_counter()
+
+        async def enviar(mensagem: Message):
+            if mensagem["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - inicio) * 1000
+                db_ms = perfil["tempo_db"] * 1000
+                cabecalhos = MutableHeaders(scope=mensagem)
+                cabecalhos.append("X-Request-ID", perfil["id"])
+                cabecalhos.append(
+                    "Server-Timing",
+                    f'db;dur={db_ms:.1f};desc="{perfil["consultas"]} consultas", '
+                    f"app;dur={max(total_ms - db_ms, 0):.1f}, "
+                    f"total;dur={total_ms:.1f}",
+                )
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _perfil_atual.reset(token)
@@ -1,24 +1,112 @@
+import os
 from datetime import date
-from typing import Type
+from functools import lru_cache
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, TypeVar, Union
 
-from sqlalchemy import create_engine
+from sqlalchemy import Executable, create_engine, event
+from sqlalchemy.engine import URL, Engine, Row, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm.session import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from starlette.concurrency import run_in_threadpool
+
+from libs.database.perfil import SQL_PERFIL, perfilar_engine
+from libs.metricas.metricas import instrumentar_engine
+
+T = TypeVar("T")
 
 _Base = declarative_base()
 
-# Criar uma conexão com o banco de dados SQLite
-engine = create_engine("sqlite:///banco-de-dados.db", echo=False)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///banco-de-dados.db")
+
+# Pragmas aplicados em cada conexão nova do SQLite. WAL deixa leitores e o
+# escritor trabalharem ao mesmo tempo e o busy_timeout faz o escritor esperar
+# a vez em vez de falhar com "database is locked".
+PRAGMAS_SQLITE = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-64000")),  # 64MB
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+
+def _ler_bool(nome: str, padrao: bool) -> bool:
+    return os.getenv(nome, str(padrao)).lower() in ("1", "true", "sim")
+
+
+def _opcoes_engine(url: URL, assincrona: bool = False) -> dict:
+    opcoes = {
+        "echo": _ler_bool("DB_ECHO", False),
+        "pool_pre_ping": _ler_bool("DB_POOL_PRE_PING", True),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # cada conexão teria o próprio banco vazio: uma só, usada por todas as
+        # threads (testes e `DATABASE_URL=sqlite://` em desenvolvimento)
+        opcoes["poolclass"] = StaticPool
+        opcoes["connect_args"] = {"check_same_thread": False}
+    else:
+        opcoes["pool_size"] = int(os.getenv("DB_POOL_SIZE", "10"))
+        opcoes["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+        opcoes["pool_timeout"] = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+        # o aiosqlite usa NullPool por padrão, que abriria uma conexão por sessão
+        if assincrona and url.get_backend_name() == "sqlite":
+            opcoes["poolclass"] = AsyncAdaptedQueuePool
+
+    return opcoes
+
+
+def aplicar_pragmas_sqlite(engine_sqlite: Engine):
+    @event.listens_for(engine_sqlite, "connect")
+    def _aplicar_pragmas(conexao_dbapi, _registro):
+        cursor = conexao_dbapi.cursor()
+        for pragma, valor in PRAGMAS_SQLITE.items():
+            cursor.execute(f"PRAGMA {pragma} = {valor}")
+        cursor.close()
 
-# Criar as tabelas no banco de dados
-_Base.metadata.create_all(engine)
 
-# Configurar o session maker
-Sessao = sessionmaker(bind=engine)
-SessaoType = Type[Sessao]
+def criar_engine(url: Union[str, URL, None] = None, **opcoes) -> Engine:
+    """Cria a engine a partir de DATABASE_URL e das variáveis DB_* / SQLITE_*."""
+    url = make_url(url or DATABASE_URL)
+    nova_engine = create_engine(url, **{**_opcoes_engine(url), **opcoes})
 
-session = Sessao()
+    if url.get_backend_name() == "sqlite":
+        aplicar_pragmas_sqlite(nova_engine)
+    instrumentar_engine(nova_engine, nome="sincrona")
+    if SQL_PERFIL:
+        perfilar_engine(nova_engine)
+
+    return nova_engine
+
+
+@lru_cache(maxsize=None)
+def pegar_engine() -> Engine:
+    """Engine síncrona do processo, criada no primeiro uso.
+
+    Nada conecta no import: cada worker monta a própria engine quando começa
+    a atender, sem herdar conexões de outro processo.
+    """
+    return criar_engine()
+
+
+@lru_cache(maxsize=None)
+def _fabrica_sessao() -> sessionmaker[Session]:
+    return sessionmaker(bind=pegar_engine())
+
+
+def Sessao() -> Session:
+    return _fabrica_sessao()()
 
 
 # Função para obter a sessão do banco de dados
@@ -30,93 +118,276 @@ def pegar_conexao_db() -> Session:
         db.close()
 
 
-def popular_tabela():
-    from contextos.livros.entidade_livro import Livro
-    from contextos.usuarios.entidade_usuario import Usuario
-    from contextos.vendas.entidade_vendas import Venda, VendaItem
+# Com DB_ASYNC=true as rotas quentes (listagem e detalhe de livros, carrinho,
+# compra) usam AsyncSession e os repositórios assíncronos, e as consultas
+# avulsas (consultar) vão pelo driver assíncrono (aiosqlite/asyncpg), tudo no
+# event loop sem ocupar o threadpool. As demais rotas seguem com os
+# repositórios síncronos no threadpool.
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "sim")
 
-    usuario = Usuario.criar(
-        nome="Westo",
-        sobrenome="Coto",
-        data_nascimento=date.today(),
-        email="westo@coto.com",
-        senha="1234",
-    )
-    usuario.id = 2
-
-    usuario_admin = Usuario.criar(
-        nome="admin",
-        sobrenome="livraria",
-        data_nascimento=date.today(),
-        email="admin@email.com",
-        senha="1234",
-    )
-    usuario_admin.id = 1
+_DRIVERS_ASYNC = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
 
+
+def _url_async(url: URL) -> Union[URL, str]:
+    url_configurada = os.getenv("DATABASE_URL_ASYNC")
+    if url_configurada:
+        return url_configurada
+
+    driver = _DRIVERS_ASYNC.get(url.get_backend_name(), url.drivername)
+    return url.set(drivername=driver)
+
+
+@lru_cache(maxsize=None)
+def pegar_engine_async() -> AsyncEngine:
+    # criado sob demanda para não exigir o driver assíncrono no modo síncrono
+    url = make_url(_url_async(make_url(DATABASE_URL)))
+    engine_async = create_async_engine(url, **_opcoes_engine(url, assincrona=True))
+
+    if url.get_backend_name() == "sqlite":
+        aplicar_pragmas_sqlite(engine_async.sync_engine)
+    instrumentar_engine(engine_async.sync_engine, nome="assincrona")
+    if SQL_PERFIL:
+        perfilar_engine(engine_async.sync_engine)
+
+    return engine_async
+
+
+@lru_cache(maxsize=None)
+def pegar_fabrica_sessao_async() -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(bind=pegar_engine_async(), expire_on_commit=False)
+
+
+async def pegar_sessao_db() -> AsyncIterator[Session]:
+    """Dependência das rotas: a sessão síncrona que os repositórios usam
+    dentro de executar_na_sessao."""
+    db = Sessao()
     try:
-        db = Sessao()
-        db.add(usuario)
-        db.add(usuario_admin)
-        db.commit()
-    except Exception as e:
-        e
-        pass
+        yield db
     finally:
-        db.close()
+        # devolver a conexão ao pool faz rollback: I/O, então fora do loop
+        await run_in_threadpool(db.close)
 
-    try:
-        livros = []
-        for x in range(100):
-            livro = Livro.criar(
-                titulo=f"Livro {x}",
-                descricao=f"Descricao do livro hype {x}",
-                genero=f"Genero {x}",
-                preco=x,
-                quantidade=x,
-                usuario_id=1,
-                url_imagem=f"Imagem {x}",
-            )
-            livros.append(livro)
 
-        db = Sessao()
-        db.add_all(livros)
-        db.commit()
+# sessão das rotas quentes: AsyncSession com DB_ASYNC, Session sem ele
+SessaoRota = Union[Session, AsyncSession]
 
-    except Exception as e:
-        e
-        pass
 
+async def pegar_sessao_db_quente() -> AsyncIterator[SessaoRota]:
+    """Dependência das rotas quentes.
+
+    Com DB_ASYNC, uma AsyncSession para os repositórios assíncronos: nem a
+    consulta nem o fechamento passam pelo threadpool. Sem ele, a mesma sessão
+    síncrona de pegar_sessao_db.
+    """
+    if DB_ASYNC:
+        async with pegar_fabrica_sessao_async()() as db:
+            yield db
+        return
+
+    db = Sessao()
     try:
-        db = Sessao()
-        livros = db.query(Livro).limit(5).all()
+        yield db
+    finally:
+        await run_in_threadpool(db.close)
 
-        venda = Venda.criar(id_usuario_comprador=2)
 
-        for livro in livros:
-            item = VendaItem.criar(
-                venda_id=venda.id,
-                livro_id=livro.id,
-                quantidade=2,
-                preco_unitario=livro.preco,
+async def executar_na_sessao(
+    db: SessaoRota,
+    funcao: Callable[[Session], T],
+    assincrona: Optional[Callable[[AsyncSession], Awaitable[T]]] = None,
+) -> T:
+    """Roda código síncrono de repositório/serviço no threadpool, como o
+    FastAPI faria com uma rota def.
+
+    Nunca no event loop: carregar objetos do ORM, montar os modelos pydantic
+    e as esperas entre tentativas de repetir_em_conflito travariam todas as
+    requisições do worker. Com uma AsyncSession (pegar_sessao_db_quente e
+    DB_ASYNC) roda a versão assíncrona, com os repositórios assíncronos.
+    """
+    if isinstance(db, AsyncSession):
+        if assincrona is None:
+            raise TypeError("AsyncSession sem a versão assíncrona da operação")
+        return await assincrona(db)
+
+    return await run_in_threadpool(funcao, db)
+
+
+async def executar_em_nova_sessao(funcao: Callable[[Session], T]) -> T:
+    """Igual a executar_na_sessao, mas abre e fecha a própria sessão."""
+
+    def executar() -> Any:
+        with Sessao() as db:
+            return funcao(db)
+
+    return await run_in_threadpool(executar)
+
+
+async def consultar(consulta: Executable) -> list[Row]:
+    """Um SELECT avulso, fora dos repositórios (JWTBearer, versões dos tokens).
+
+    Com DB_ASYNC vai pelo driver assíncrono sem ocupar thread; sem ele, pelo
+    threadpool. Devolve as linhas já lidas; entidades voltam desanexadas,
+    com os atributos carregados.
+    """
+    if DB_ASYNC:
+        async with pegar_fabrica_sessao_async()() as db:
+            return list((await db.execute(consulta)).all())
+
+    def executar() -> list[Row]:
+        with Sessao() as db:
+            return list(db.execute(consulta).all())
+
+    return await run_in_threadpool(executar)
+
+
+async def iniciar_banco():
+    """Startup de cada processo: cria a engine e carrega o que o índice de
+    busca guarda na memória. Criar tabelas e popular fica com o comando
+    `python -m libs.database.cli`."""
+    from contextos.livros.busca_livro import pegar_indice_busca
+
+    pegar_engine()
+    await executar_em_nova_sessao(pegar_indice_busca().carregar)
+
+
+async def encerrar_banco():
+    """Fecha as conexões do processo; o próximo uso cria engines novas."""
+    if pegar_engine_async.cache_info().currsize:
+        await pegar_engine_async().dispose()
+    if pegar_engine.cache_info().currsize:
+        pegar_engine().dispose()
+    _esquecer_engines()
+
+
+def _esquecer_engines():
+    pegar_fabrica_sessao_async.cache_clear()
+    pegar_engine_async.cache_clear()
+    _fabrica_sessao.cache_clear()
+    pegar_engine.cache_clear()
+
+
+def _descartar_engines_herdadas():
+    # No filho de um fork (gunicorn --preload, multiprocessing) as conexões do
+    # pool pertencem ao pai: não podem ser usadas nem fechadas aqui, só largadas.
+    if pegar_engine_async.cache_info().currsize:
+        pegar_engine_async().sync_engine.dispose(close=False)
+    if pegar_engine.cache_info().currsize:
+        pegar_engine().dispose(close=False)
+    _esquecer_engines()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_descartar_engines_herdadas)
+
+
+# Escala da carga inicial; os benchmarks sobem esses números
+SEED_LIVROS = int(os.getenv("SEED_LIVROS", "100"))
+SEED_USUARIOS = int(os.getenv("SEED_USUARIOS", "0"))
+_TAMANHO_LOTE_SEED = 5000
+
+
+def popular_tabela(
+    quantidade_livros: int = SEED_LIVROS, quantidade_usuarios: int = SEED_USUARIOS
+) -> bool:
+    """Carga de desenvolvimento: admin, um comprador, livros e uma venda.
+
+    Devolve False sem alterar nada se o banco já foi populado.
+    """
+    from sqlalchemy import insert
+
+    from contextos.livros.busca_livro import pegar_indice_busca
+    from contextos.livros.entidade_livro import Livro
+    from contextos.usuarios.entidade_usuario import Usuario
+    from contextos.vendas.entidade_vendas import Venda, VendaItem
+    from libs.autenticacao.senhas import gerar_hash_senha
+
+    with Sessao() as db:
+        if db.get(Usuario, 1) is not None:
+            return False
+
+        # todos os usuários da carga usam a mesma senha: um bcrypt só
+        senha = gerar_hash_senha("1234")
+
+        usuario_admin = Usuario.criar(
+            nome="admin",
+            sobrenome="livraria",
+            data_nascimento=date.today(),
+            email="admin@email.com",
+            senha=senha,
+        )
+        usuario_admin.id = 1
+
+        usuario = Usuario.criar(
+            nome="Westo",
+            sobrenome="Coto",
+            data_nascimento=date.today(),
+            email="westo@coto.com",
+            senha=senha,
+        )
+        usuario.id = 2
+
+        db.add_all([usuario_admin, usuario])
+        # compradores extras para os benchmarks: carga1@livraria.com, carga2@...
+        db.add_all(
+            Usuario.criar(
+                nome="Carga",
+                sobrenome=str(numero),
+                data_nascimento=date.today(),
+                email=f"carga{numero}@livraria.com",
+                senha=senha,
             )
-            venda.adicionar_item(item)
+            for numero in range(1, quantidade_usuarios + 1)
+        )
+        db.commit()
+
+        indice_busca = pegar_indice_busca()
+        # em lotes: um INSERT de várias linhas e uma indexação por lote
+        for inicio in range(0, quantidade_livros, _TAMANHO_LOTE_SEED):
+            fim = min(inicio + _TAMANHO_LOTE_SEED, quantidade_livros)
+            livro_ids = db.scalars(
+                insert(Livro).returning(Livro.id),
+                [
+                    dict(
+                        titulo=f"Livro {x}",
+                        descricao=f"Descricao do livro hype {x}",
+                        genero=f"Genero {x}",
+                        preco=x,
+                        quantidade=x,
+                        usuario_id=1,
+                        url_imagem=f"Imagem {x}",
+                        deletado=False,
+                    )
+                    for x in range(inicio, fim)
+                ],
+            ).all()
+            indice_busca.indexar_varios(db, list(livro_ids))
+            db.commit()
 
-        db = Sessao()
+        venda = Venda.criar(id_usuario_comprador=2)
+        for livro in db.query(Livro).order_by(Livro.id).limit(5):
+            venda.adicionar_item(
+                VendaItem.criar(
+                    venda_id=venda.id,
+                    livro_id=livro.id,
+                    quantidade=2,
+                    preco_unitario=livro.preco,
+                )
+            )
         db.add(venda)
         db.commit()
 
-    except Exception as e:
-        e
-        pass
-
-    db = Sessao()
-    x = db.query(Venda).first()
-    x
+    return True
 
 
 def criar_tabela():
+    from contextos.carrinho.entidade_carrinho import Carrinho
+    from contextos.livros.busca_livro import pegar_indice_busca
     from contextos.livros.entidade_livro import Livro
     from contextos.usuarios.entidade_usuario import Usuario
     from contextos.vendas.entidade_vendas import Venda, VendaItem
+    from libs.database.migracoes import aplicar_migracoes
+
+    aplicar_migracoes(pegar_engine())
 
-    _Base.metadata.create_all(engine)
+    with Sessao() as db:
+        pegar_indice_busca().preparar(db)
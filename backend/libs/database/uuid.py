@@ -1,3 +1,4 @@
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.types import TypeDecorator, CHAR
 import uuid
 
@@ -14,7 +15,7 @@ class BaseUUID(TypeDecorator):
 
     def load_dialect_impl(self, dialect):
         if dialect.name == "postgresql":
-            return dialect.type_descriptor(uuid.UUID())
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=False))
         else:
             return dialect.type_descriptor(
                 CHAR(36)
@@ -36,4 +37,6 @@ class BaseUUID(TypeDecorator):
     def process_result_value(self, value, dialect):
         if value is None:
             return None
+        if isinstance(value, uuid.UUID):
+            return value  # drivers como asyncpg já devolvem uuid.UUID
         return uuid.UUID(value)  # Converte a string de volta para um objeto UUID
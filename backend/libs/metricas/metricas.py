@@ -0,0 +1,269 @@
+import asyncio
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import APIRouter, Response
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from libs.metricas.registro import (
+    Contador,
+    DiretorioMetricas,
+    Histograma,
+    Medidor,
+    RegistroMetricas,
+)
+
+# de quanto em quanto tempo cada worker grava o retrato das suas métricas
+METRICAS_INTERVALO = float(os.getenv("METRICAS_INTERVALO", "5"))
+
+registro = RegistroMetricas()
+
+requisicoes_total = registro.registrar(
+    Contador(
+        "http_requisicoes_total",
+        "Requisições HTTP atendidas.",
+        ("metodo", "rota", "status"),
+    )
+)
+duracao_requisicao = registro.registrar(
+    Histograma(
+        "http_requisicao_duracao_segundos",
+        "Tempo até o fim da resposta, por rota (template do caminho).",
+        ("metodo", "rota"),
+    )
+)
+requisicoes_em_andamento = registro.registrar(
+    Medidor("http_requisicoes_em_andamento", "Requisições sendo atendidas agora.")
+)
+consultas_total = registro.registrar(
+    Contador(
+        "db_consultas_total",
+        "Comandos SQL executados, por contexto da rota (livros, carrinho, venda...).",
+        ("contexto", "operacao"),
+    )
+)
+duracao_consulta = registro.registrar(
+    Histograma(
+        "db_consulta_duracao_segundos",
+        "Duração de cada comando SQL, por contexto da rota.",
+        ("contexto",),
+    )
+)
+consultas_por_requisicao = registro.registrar(
+    Histograma(
+        "db_consultas_por_requisicao",
+        "Quantidade de comandos SQL em cada requisição, por rota.",
+        ("rota",),
+        limites=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+    )
+)
+
+# Requisição em andamento: o scope (para achar a rota) e o total de consultas.
+# É um dict mutável para que as consultas feitas no threadpool, que recebe uma
+# cópia do contexto, atualizem o mesmo objeto.
+_requisicao_atual: ContextVar[Optional[dict]] = ContextVar(
+    "requisicao_atual", default=None
+)
+
+_engines: dict[str, Engine] = {}
+
+
+def rota_do_scope(scope: Scope) -> str:
+    rota = scope.get("route")
+    # sem rota (404) agrupa tudo numa série só, para não explodir a cardinalidade
+    return getattr(rota, "path", None) or "sem_rota"
+
+
+def contexto_atual() -> str:
+    requisicao = _requisicao_atual.get()
+    if requisicao is None:
+        return "fora_de_requisicao"
+    rota = rota_do_scope(requisicao["scope"])
+    return rota.strip("/").split("/")[0] or "raiz"
+
+
+def instrumentar_engine(engine_instrumentada: Engine, nome: str):
+    """Conta e cronometra cada comando SQL da engine e expõe o pool dela."""
+    _engines[nome] = engine_instrumentada
+
+    @event.listens_for(engine_instrumentada, "before_cursor_execute")
+    def _antes(conexao, cursor, comando, parametros, contexto, executemany):
+        conexao.info.setdefault("metricas_inicio", []).append(time.perf_counter())
+
+    @event.listens_for(engine_instrumentada, "after_cursor_execute")
+    def _depois(conexao, cursor, comando, parametros, contexto, executemany):
+        _registrar_consulta(conexao, comando)
+
+    @event.listens_for(engine_instrumentada, "handle_error")
+    def _erro(contexto_erro):
+        if contexto_erro.connection is not None and contexto_erro.statement:
+            _registrar_consulta(contexto_erro.connection, contexto_erro.statement)
+
+
+def _registrar_consulta(conexao, comando: str):
+    inicios = conexao.info.get("metricas_inicio")
+    if not inicios:
+        return
+    duracao = time.perf_counter() - inicios.pop()
+
+    contexto = contexto_atual()
+    operacao = comando.lstrip().split(None, 1)[0].upper() if comando.strip() else ""
+    consultas_total.incrementar(contexto=contexto, operacao=operacao)
+    duracao_consulta.observar(duracao, contexto=contexto)
+
+    requisicao = _requisicao_atual.get()
+    if requisicao is not None:
+        requisicao["consultas"] += 1
+
+
+def _coletar_pool(metodo: str):
+    def coletar():
+        for nome, engine_instrumentada in _engines.items():
+            valor = getattr(engine_instrumentada.pool, metodo, None)
+            # NullPool/StaticPool não têm contadores
+            if callable(valor):
+                yield {"engine": nome}, valor()
+
+    return coletar
+
+
+for _metodo, _descricao in (
+    ("size", "Tamanho configurado do pool de conexões."),
+    ("checkedout", "Conexões emprestadas no momento."),
+    ("checkedin", "Conexões ociosas no pool."),
+    (
+        "overflow",
+        "Conexões além do tamanho do pool (negativo: o pool ainda não encheu).",
+    ),
+):
+    registro.registrar(
+        Medidor(
+            f"db_pool_{_metodo}",
+            _descricao,
+            ("engine",),
+            coletar=_coletar_pool(_metodo),
+        )
+    )
+
+
+def _coletar_caches(campo: str):
+    def coletar():
+        # importados aqui para o módulo de métricas não depender dos contextos
+        from contextos.livros.cache_livro import cache_livros
+        from libs.autenticacao.config import cache_tokens, cache_usuarios
+
+        caches = {
+            "respostas_livros": cache_livros,
+            "usuarios": cache_usuarios,
+            "tokens": cache_tokens,
+        }
+        for nome, cache in caches.items():
+            yield {"cache": nome}, cache.estatisticas()[campo]
+
+    return coletar
+
+
+for _campo, _descricao in (
+    ("acertos", "Leituras atendidas pelo cache."),
+    ("falhas", "Leituras que não acharam o item no cache."),
+    ("taxa_acerto", "Acertos / leituras desde o início do processo."),
+    ("tamanho", "Itens guardados no cache."),
+):
+    registro.registrar(
+        Medidor(
+            f"cache_{_campo}",
+            _descricao,
+            ("cache",),
+            coletar=_coletar_caches(_campo),
+        )
+    )
+
+
+class MetricasHTTP:
+    """Middleware ASGI que mede cada requisição pelo template da rota."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        status_code = 500
+        requisicao = {"scope": scope, "consultas": 0}
+        token = _requisicao_atual.set(requisicao)
+        requisicoes_em_andamento.incrementar()
+
+        async def enviar(mensagem: Message):
+            nonlocal status_code
+            if mensagem["type"] == "http.response.start":
+                status_code = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            requisicoes_em_andamento.decrementar()
+            _requisicao_atual.reset(token)
+
+            rota = rota_do_scope(scope)
+            metodo = scope["method"]
+            requisicoes_total.incrementar(metodo=metodo, rota=rota, status=status_code)
+            duracao_requisicao.observar(
+                time.perf_counter() - inicio, metodo=metodo, rota=rota
+            )
+            consultas_por_requisicao.observar(requisicao["consultas"], rota=rota)
+
+
+def pegar_diretorio_metricas() -> Optional[DiretorioMetricas]:
+    """Com vários workers cada processo tem o próprio registro. Com
+    METRICAS_DIR (o servidor.py cria um quando sobe mais de um worker) cada
+    worker grava o seu retrato lá e o /metrics de qualquer um deles devolve
+    todos juntos."""
+    caminho = os.getenv("METRICAS_DIR")
+    return DiretorioMetricas(caminho) if caminho else None
+
+
+def gravar_retrato():
+    """Grava as métricas deste worker no METRICAS_DIR, se houver."""
+    diretorio = pegar_diretorio_metricas()
+    if diretorio is not None:
+        diretorio.gravar(registro)
+
+
+async def gravar_metricas_periodicamente(intervalo: float = METRICAS_INTERVALO):
+    """Mantém o retrato deste worker em dia para a coleta feita pelos outros."""
+    if pegar_diretorio_metricas() is None:
+        return
+
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            gravar_retrato()
+        except OSError as erro:
+            logger.warning(f"Não foi possível gravar as métricas: {erro}")
+
+
+roteador = APIRouter(tags=["Métricas"])
+
+
+@roteador.get("/metrics", include_in_schema=False)
+def exportar_metricas():
+    diretorio = pegar_diretorio_metricas()
+    if diretorio is None:
+        conteudo = registro.exportar()
+    else:
+        diretorio.gravar(registro)
+        conteudo = diretorio.exportar(registro)
+
+    return Response(
+        content=conteudo,
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
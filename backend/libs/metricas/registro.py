@@ -0,0 +1,278 @@
+import bisect
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+# limites (em segundos) parecidos com os padrões do cliente oficial do Prometheus
+LIMITES_PADRAO = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatar_rotulos(nomes: tuple[str, ...], valores: tuple, extra: str = "") -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _formatar_numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, descricao: str, rotulos: Iterable[str] = ()):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self._lock = threading.Lock()
+
+    def _chave(self, rotulos: dict) -> tuple:
+        return tuple(rotulos.get(nome, "") for nome in self.rotulos)
+
+    # gauges valem por processo: juntando processos, cada um vira uma série
+    # com o rótulo pid em vez de serem somados
+    por_processo = False
+
+    def exportar(
+        self, valores: Optional[dict] = None, rotulos: Optional[tuple] = None
+    ) -> list[str]:
+        linhas = [
+            f"# HELP {self.nome} {self.descricao}",
+            f"# TYPE {self.nome} {self.tipo}",
+        ]
+        linhas.extend(
+            self._amostras(
+                self.valores() if valores is None else valores,
+                self.rotulos if rotulos is None else rotulos,
+            )
+        )
+        return linhas
+
+    def valores(self) -> dict[tuple, Any]:
+        """Cópia dos valores atuais, por chave de rótulos."""
+        raise NotImplementedError
+
+    def somar(self, valor: Any, outro: Any) -> Any:
+        raise NotImplementedError
+
+    def _amostras(self, valores: dict[tuple, Any], rotulos: tuple) -> list[str]:
+        raise NotImplementedError
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, nome: str, descricao: str, rotulos: Iterable[str] = ()):
+        super().__init__(nome, descricao, rotulos)
+        self._valores: dict[tuple, float] = {}
+
+    def incrementar(self, valor: float = 1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valores(self) -> dict[tuple, float]:
+        with self._lock:
+            return dict(self._valores)
+
+    def somar(self, valor: float, outro: float) -> float:
+        return valor + outro
+
+    def _amostras(self, valores: dict[tuple, float], rotulos: tuple) -> list[str]:
+        return [
+            f"{self.nome}{_formatar_rotulos(rotulos, chave)} {_formatar_numero(valor)}"
+            for chave, valor in valores.items()
+        ]
+
+
+class Medidor(Contador):
+    """Gauge: valor que sobe e desce, ou é lido na hora da coleta."""
+
+    tipo = "gauge"
+    por_processo = True
+
+    def __init__(
+        self,
+        nome: str,
+        descricao: str,
+        rotulos: Iterable[str] = (),
+        coletar: Optional[Callable[[], Iterable[tuple[dict, float]]]] = None,
+    ):
+        super().__init__(nome, descricao, rotulos)
+        self.coletar = coletar
+
+    def decrementar(self, valor: float = 1, **rotulos):
+        self.incrementar(-valor, **rotulos)
+
+    def definir(self, valor: float, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = valor
+
+    def valores(self) -> dict[tuple, float]:
+        if self.coletar:
+            for rotulos, valor in self.coletar():
+                self.definir(valor, **rotulos)
+        return super().valores()
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(
+        self,
+        nome: str,
+        descricao: str,
+        rotulos: Iterable[str] = (),
+        limites: Iterable[float] = LIMITES_PADRAO,
+    ):
+        super().__init__(nome, descricao, rotulos)
+        self.limites = tuple(sorted(limites))
+        # chave -> [contagem por faixa..., soma, total]
+        self._series: dict[tuple, list] = {}
+
+    def observar(self, valor: float, **rotulos):
+        chave = self._chave(rotulos)
+        posicao = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [0] * (len(self.limites) + 1) + [0.0, 0]
+            serie[posicao] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def valores(self) -> dict[tuple, list]:
+        with self._lock:
+            return {chave: list(serie) for chave, serie in self._series.items()}
+
+    def somar(self, serie: list, outra: list) -> list:
+        return [valor + outro for valor, outro in zip(serie, outra)]
+
+    def _amostras(self, valores: dict[tuple, list], rotulos: tuple) -> list[str]:
+        linhas = []
+        for chave, serie in valores.items():
+            acumulado = 0
+            for limite, contagem in zip(self.limites + (float("inf"),), serie):
+                acumulado += contagem
+                rotulos_faixa = _formatar_rotulos(
+                    rotulos, chave, f'le="{_formatar_numero(float(limite))}"'
+                )
+                linhas.append(f"{self.nome}_bucket{rotulos_faixa} {acumulado}")
+            rotulos_serie = _formatar_rotulos(rotulos, chave)
+            linhas.append(
+                f"{self.nome}_sum{rotulos_serie} {_formatar_numero(serie[-2])}"
+            )
+            linhas.append(f"{self.nome}_count{rotulos_serie} {serie[-1]}")
+        return linhas
+
+
+class RegistroMetricas:
+    """Conjunto de métricas exportado no formato texto do Prometheus."""
+
+    def __init__(self):
+        self.metricas: list[_Metrica] = []
+
+    def registrar(self, metrica: _Metrica) -> _Metrica:
+        self.metricas.append(metrica)
+        return metrica
+
+    def exportar(self) -> str:
+        linhas = []
+        for metrica in self.metricas:
+            linhas.extend(metrica.exportar())
+        return "\n".join(linhas) + "\n"
+
+
+def _processo_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class DiretorioMetricas:
+    """Junta as métricas de vários processos (workers) numa coleta só.
+
+    Cada processo grava um retrato do próprio registro em <pid>.json; a
+    coleta, em qualquer worker, lê todos os arquivos. Contadores e
+    histogramas são somados, inclusive os de workers que já saíram (assim
+    nunca diminuem); gauges saem por processo, com o rótulo pid, só dos
+    vivos. Os outros workers aparecem com o retrato da última gravação.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = Path(caminho)
+        self.caminho.mkdir(parents=True, exist_ok=True)
+
+    def gravar(self, registro: "RegistroMetricas", pid: Optional[int] = None):
+        pid = pid or os.getpid()
+        retrato = {
+            metrica.nome: [
+                [list(chave), valor] for chave, valor in metrica.valores().items()
+            ]
+            for metrica in registro.metricas
+        }
+        # troca atômica: quem lê nunca vê o arquivo pela metade
+        temporario = self.caminho / f"{pid}.json.tmp"
+        temporario.write_text(json.dumps(retrato))
+        os.replace(temporario, self.caminho / f"{pid}.json")
+
+    def exportar(self, registro: "RegistroMetricas") -> str:
+        retratos: dict[int, dict] = {}
+        for arquivo in self.caminho.glob("*.json"):
+            try:
+                retratos[int(arquivo.stem)] = json.loads(arquivo.read_text())
+            except (OSError, ValueError):
+                continue
+
+        vivos = {pid for pid in retratos if _processo_vivo(pid)}
+        linhas = []
+        for metrica in registro.metricas:
+            valores: dict[tuple, Any] = {}
+            for pid, retrato in sorted(retratos.items()):
+                for chave, valor in retrato.get(metrica.nome, []):
+                    if metrica.por_processo:
+                        if pid in vivos:
+                            valores[(pid, *chave)] = valor
+                        continue
+                    chave = tuple(chave)
+                    valores[chave] = (
+                        metrica.somar(valores[chave], valor)
+                        if chave in valores
+                        else valor
+                    )
+            rotulos = ("pid", *metrica.rotulos) if metrica.por_processo else None
+            linhas.extend(metrica.exportar(valores, rotulos))
+        return "\n".join(linhas) + "\n"
+
+    def limpar(self):
+        """Apaga os retratos: para subir o servidor com as métricas zeradas."""
+        for arquivo in self.caminho.glob("*.json*"):
+            arquivo.unlink(missing_ok=True)
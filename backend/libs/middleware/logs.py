@@ -1,63 +1,156 @@
+import json
+import os
+import random
 import sys
 import time
+from datetime import datetime, timezone
+from typing import Optional
 
-from fastapi import Request
 from loguru import logger
-from rich.logging import RichHandler
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+# texto: linha colorida para desenvolvimento; json: um objeto por linha
+LOG_FORMATO = os.getenv("LOG_FORMATO", "json").lower()
+# fração das requisições registradas; erros e requisições lentas sempre entram
+LOG_AMOSTRAGEM = float(os.getenv("LOG_AMOSTRAGEM", "1.0"))
+LOG_LENTO_SEGUNDOS = float(os.getenv("LOG_LENTO_MS", "500")) / 1000
 
-class ConsoleLogs(BaseHTTPMiddleware):
-    def __init__(
-        self,
-        app,
-    ):
-        super().__init__(app)
-        logger.remove()
-        logger.add(
+
+_sink_logs: Optional[int] = None
+
+
+def configurar_logs(formato: str = LOG_FORMATO):
+    """Troca o stderr padrão do loguru pelo sink no formato configurado.
+
+    Uma vez por processo (o lifespan de cada worker chama): não mexe nos
+    sinks que outros módulos ou os testes adicionaram. A escrita acontece
+    numa thread do loguru (enqueue=True), fora do event loop.
+    """
+    global _sink_logs
+    if _sink_logs is not None:
+        return
+
+    try:
+        # só o handler padrão do loguru (id 0)
+        logger.remove(0)
+    except ValueError:
+        pass
+
+    if formato == "json":
+        _sink_logs = logger.add(sys.stderr, format="{message}", enqueue=True)
+    else:
+        _sink_logs = logger.add(
             sys.stderr,
             format=(
                 "<green>{level: <4}</green>:     "
                 "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | "
                 "<level>{message}</level>"
             ),
+            enqueue=True,
         )
 
-    async def dispatch(self, request: Request, call_next):
-        tempo_inicio_requisicao = time.perf_counter()
 
-        resposta = await call_next(request)
+def encerrar_logs():
+    """Esvazia a fila do sink de configurar_logs e fecha a thread dele."""
+    global _sink_logs
+    if _sink_logs is not None:
+        logger.remove(_sink_logs)
+        _sink_logs = None
 
-        tempo_fim_requisicao = time.perf_counter()
 
-        calculo_diferenca_tempo = tempo_fim_requisicao - tempo_inicio_requisicao
-        tempo_formatado = "{0:.3f}".format(calculo_diferenca_tempo)
+class ConsoleLogs:
+    """Middleware ASGI puro de log de acesso.
 
-        ### add X-Process-Time to header
-        resposta.headers["X-Process-Time"] = tempo_formatado
+    Não envolve o corpo da resposta como o BaseHTTPMiddleware: só observa o
+    início da resposta para medir o tempo e acrescentar o X-Process-Time. Os
+    sinks são do configurar_logs; o middleware só registra.
+    """
 
-        cor = self._color_request(resposta.status_code)
+    def __init__(
+        self,
+        app: ASGIApp,
+        formato: str = LOG_FORMATO,
+        amostragem: float = LOG_AMOSTRAGEM,
+        lento_segundos: float = LOG_LENTO_SEGUNDOS,
+    ):
+        self.app = app
+        self.formato = formato
+        self.amostragem = amostragem
+        self.lento_segundos = lento_segundos
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        tempo_inicio_requisicao = time.perf_counter()
+        status_code = 500
+        tempo_resposta = None
 
-        remoto_endereco_cliente = request.headers.get("x-original-forwarded-for", None)  # type: ignore
-        remoto_porta_cliente = request.headers.get("x-forwarded-port", None)  # type: ignore
+        async def enviar(mensagem: Message):
+            nonlocal status_code, tempo_resposta
+            if mensagem["type"] == "http.response.start":
+                status_code = mensagem["status"]
+                tempo_resposta = time.perf_counter() - tempo_inicio_requisicao
+                ### add X-Process-Time to header
+                cabecalhos = MutableHeaders(scope=mensagem)
+                cabecalhos.append("X-Process-Time", "{0:.3f}".format(tempo_resposta))
+            await send(mensagem)
 
-        if all([remoto_endereco_cliente, remoto_porta_cliente]):
-            remoto_endereco_cliente = remoto_endereco_cliente.split(",")[0]  # type: ignore
-            endereco_cliente = f"{remoto_endereco_cliente}:{remoto_porta_cliente}"
-        else:
-            endereco_cliente = f"{request.client.host}:{request.client.port}"  # type: ignore
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            if tempo_resposta is None:
+                tempo_resposta = time.perf_counter() - tempo_inicio_requisicao
+            if self._deve_registrar(status_code, tempo_resposta):
+                self._registrar(scope, status_code, tempo_resposta)
 
-        endereco_cliente = endereco_cliente.ljust(21)
+    def _deve_registrar(self, status_code: int, duracao: float) -> bool:
+        if status_code >= 500 or duracao >= self.lento_segundos:
+            return True
+        return self.amostragem >= 1 or random.random() < self.amostragem
 
+    def _registrar(self, scope: Scope, status_code: int, duracao: float):
+        cabecalhos = {
+            chave.decode("latin-1"): valor.decode("latin-1")
+            for chave, valor in scope.get("headers", [])
+        }
+        endereco_cliente = self._endereco_cliente(scope, cabecalhos)
+
+        if self.formato == "json":
+            registro = {
+                "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+                "client": endereco_cliente,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1") or None,
+                "status": status_code,
+                "duration_ms": round(duracao * 1000, 3),
+                "user_agent": cabecalhos.get("user-agent"),
+            }
+            logger.info(json.dumps(registro, ensure_ascii=False))
+            return
+
+        cor = self._color_request(status_code)
         logger.opt(colors=True).info(
-            f"<blue><bold>Client: {endereco_cliente}</bold></blue> - "
-            f"<{cor}>Status: {resposta.status_code}</{cor}> - "
-            f"<yellow><bold>Time: {tempo_formatado}s</bold></yellow> - "
-            f"<magenta>Method: {request.method.ljust(7)}</magenta> - "
-            f"<cyan><bold>Path: {request.url.path} </bold></cyan>"
+            f"<blue><bold>Client: {endereco_cliente.ljust(21)}</bold></blue> - "
+            f"<{cor}>Status: {status_code}</{cor}> - "
+            f"<yellow><bold>Time: {duracao:.3f}s</bold></yellow> - "
+            f"<magenta>Method: {scope['method'].ljust(7)}</magenta> - "
+            f"<cyan><bold>Path: {scope['path']} </bold></cyan>"
         )
-        return resposta
+
+    def _endereco_cliente(self, scope: Scope, cabecalhos: dict[str, str]) -> str:
+        remoto_endereco_cliente = cabecalhos.get("x-original-forwarded-for")
+        remoto_porta_cliente = cabecalhos.get("x-forwarded-port")
+
+        if remoto_endereco_cliente and remoto_porta_cliente:
+            remoto_endereco_cliente = remoto_endereco_cliente.split(",")[0]
+            return f"{remoto_endereco_cliente}:{remoto_porta_cliente}"
+
+        cliente = scope.get("client")
+        return f"{cliente[0]}:{cliente[1]}" if cliente else "-"
 
     def _color_request(self, status_code: int):
         if status_code < 300:
@@ -0,0 +1,41 @@
+import base64
+import json
+from typing import Optional
+
+
+def codificar_cursor_dados(dados: dict) -> str:
+    """Gera um token opaco a partir das chaves de ordenação do último item."""
+    conteudo = json.dumps(dados, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(conteudo).decode().rstrip("=")
+
+
+def decodificar_cursor_dados(cursor: str) -> dict:
+    """Recupera as chaves guardadas no cursor, lança ValueError se o token for inválido."""
+    try:
+        preenchimento = "=" * (-len(cursor) % 4)
+        dados = json.loads(base64.urlsafe_b64decode(cursor + preenchimento))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Cursor inválido") from e
+
+    if not isinstance(dados, dict):
+        raise ValueError("Cursor inválido")
+
+    return dados
+
+
+def codificar_cursor(ultimo_id: Optional[int]) -> Optional[str]:
+    """Gera o token opaco do cursor a partir do id do último item da página."""
+    if ultimo_id is None:
+        return None
+
+    return codificar_cursor_dados({"id": ultimo_id})
+
+
+def decodificar_cursor(cursor: str) -> int:
+    """Recupera o id guardado no cursor, lança ValueError se o token for inválido."""
+    ultimo_id = decodificar_cursor_dados(cursor).get("id")
+
+    if not isinstance(ultimo_id, int) or isinstance(ultimo_id, bool):
+        raise ValueError("Cursor inválido")
+
+    return ultimo_id
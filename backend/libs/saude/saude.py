@@ -0,0 +1,44 @@
+import os
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import SQLAlchemyError
+
+from libs.database.migracoes import migracoes_pendentes
+from libs.database.sqlalchemy import executar_em_nova_sessao
+
+roteador = APIRouter(prefix="/saude", tags=["Saúde"])
+
+
+@roteador.get("/vivo", include_in_schema=False)
+def vivo():
+    """Liveness: o worker responde. Não consulta o banco, para uma queda do
+    banco não fazer o orquestrador reiniciar todos os processos."""
+    return {"status": "ok", "pid": os.getpid()}
+
+
+@roteador.get("/pronto", include_in_schema=False)
+async def pronto():
+    """Readiness: o banco responde e não há migração pendente."""
+
+    def verificar(db) -> list[str]:
+        return migracoes_pendentes(db.connection())
+
+    try:
+        pendentes = await executar_em_nova_sessao(verificar)
+    except (SQLAlchemyError, OSError) as erro:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "indisponivel", "pid": os.getpid(), "erro": str(erro)},
+        )
+
+    if pendentes:
+        return JSONResponse(
+            status_code=503,
+            content={
+                "status": "indisponivel",
+                "pid": os.getpid(),
+                "migracoes_pendentes": pendentes,
+            },
+        )
+    return {"status": "pronto", "pid": os.getpid()}
@@ -1,7 +1,20 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.responses import RedirectResponse
 from uvicorn import run
-from libs.database.sqlalchemy import criar_tabela, popular_tabela
+from libs.database.sqlalchemy import (
+    encerrar_banco,
+    executar_em_nova_sessao,
+    iniciar_banco,
+)
+from libs.autenticacao.principal import (
+    AUTH_MODO,
+    acompanhar_versoes_tokens,
+    versoes_tokens,
+)
+from libs.autenticacao.senhas import pool_senhas
 from contextos.usuarios import rota_usuario
 from contextos.autenticacao import rota_autenticacao
 from contextos.livros import rota_livro
@@ -9,32 +22,66 @@ from contextos.vendas import rota_vendas
 
 from contextos.carrinho import rota_carrinho
 from fastapi.middleware.cors import CORSMiddleware
-from libs.middleware.logs import ConsoleLogs
-
-criar_tabela()
-popular_tabela()
-print("mackenie é 2")
-
-app = FastAPI(version="0.9", title="API de Livros")
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-    allow_credentials=True,
-)
-app.add_middleware(ConsoleLogs)
+from libs.middleware.logs import ConsoleLogs, configurar_logs, encerrar_logs
+from libs.metricas import metricas
+from libs.saude import saude
+from libs.database.perfil import SQL_PERFIL, PerfilSQL
+
+
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    configurar_logs()
+    # nada de banco no import: tabelas e carga inicial são do libs.database.cli
+    await iniciar_banco()
+    acompanhamento = None
+    if AUTH_MODO == "claims":
+        await executar_em_nova_sessao(versoes_tokens.recarregar)
+        acompanhamento = asyncio.create_task(acompanhar_versoes_tokens())
+    gravacao_metricas = asyncio.create_task(metricas.gravar_metricas_periodicamente())
+
+    yield
+
+    if acompanhamento:
+        acompanhamento.cancel()
+    gravacao_metricas.cancel()
+    # último retrato, com o que o worker atendeu até sair
+    metricas.gravar_retrato()
+    await encerrar_banco()
+    pool_senhas.encerrar()
+    # esvazia e fecha a fila do log (enqueue=True) antes do worker sair
+    encerrar_logs()
+
+
+def criar_app() -> FastAPI:
+    app = FastAPI(version="0.9", title="API de Livros", lifespan=ciclo_de_vida)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+        allow_credentials=True,
+    )
+    app.add_middleware(ConsoleLogs)
+    app.add_middleware(metricas.MetricasHTTP)
+    if SQL_PERFIL:
+        app.add_middleware(PerfilSQL)
+
+    app.include_router(rota_usuario.roteador)
+    app.include_router(rota_autenticacao.roteador)
+    app.include_router(rota_livro.roteador)
+    app.include_router(rota_carrinho.roteador)
+    app.include_router(rota_vendas.roteador)
+    app.include_router(metricas.roteador)
+    app.include_router(saude.roteador)
+
+    @app.get("/")
+    def redirecionar_para_docs():
+        return RedirectResponse("/docs")
 
-app.include_router(rota_usuario.roteador)
-app.include_router(rota_autenticacao.roteador)
-app.include_router(rota_livro.roteador)
-app.include_router(rota_carrinho.roteador)
-app.include_router(rota_vendas.roteador)
+    return app
 
 
-@app.get("/")
-def redirecionar_para_docs():
-    return RedirectResponse("/docs")
+app = criar_app()
 
 
 if __name__ == "__main__":
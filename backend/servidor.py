@@ -0,0 +1,108 @@
+"""Entrada de produção: supervisor do uvicorn com N workers.
+
+    python servidor.py
+
+Cada worker é um processo novo (spawn) que monta a própria app com
+criar_app() e a própria engine no lifespan; nenhuma conexão é herdada do
+pai. Caches (respostas, usuários) também são de cada worker: a defasagem
+entre workers é limitada pelo TTL dos caches. O índice de busca em memória
+não tem TTL, então BUSCA_BACKEND=memoria só sobe com um worker (e não use
+SIGTTIN nesse caso).
+
+Sinais para o processo pai:
+
+    SIGHUP   reinicia os workers um por vez (carrega código novo sem parar)
+    SIGTTIN  um worker a mais
+    SIGTTOU  um worker a menos
+    SIGTERM  para de aceitar conexões, termina as requisições em andamento
+             (até WEB_TIMEOUT_GRACIOSO segundos) e sai
+
+O orquestrador deve usar /saude/vivo como liveness e /saude/pronto como
+readiness.
+
+Métricas: com mais de um worker cada um grava as suas em METRICAS_DIR (um
+diretório temporário, se não for definido) e o /metrics de qualquer worker
+devolve todas juntas; basta coletar o endereço do servidor. O diretório é
+esvaziado a cada subida.
+"""
+
+import os
+import tempfile
+
+import uvicorn
+from loguru import logger
+from sqlalchemy.engine import make_url
+
+from contextos.livros.busca_livro import escolher_backend_busca
+from libs.database.sqlalchemy import DATABASE_URL
+from libs.metricas.registro import DiretorioMetricas
+
+
+def _quantidade_cpus() -> int:
+    # respeita o cpuset do container quando o sistema informa
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORTA = int(os.getenv("WEB_PORTA", "8000"))
+# 0 ou ausente: um worker por CPU disponível
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "0")) or _quantidade_cpus()
+WEB_TIMEOUT_GRACIOSO = int(os.getenv("WEB_TIMEOUT_GRACIOSO", "30"))
+WEB_KEEP_ALIVE = int(os.getenv("WEB_KEEP_ALIVE", "5"))
+# IPs dos proxies confiáveis para X-Forwarded-For/Proto
+WEB_PROXIES_CONFIAVEIS = os.getenv("WEB_PROXIES_CONFIAVEIS", "127.0.0.1")
+
+
+def conferir_busca(workers: int):
+    """Recusa o índice em memória com vários workers.
+
+    Cada worker só indexa o que ele mesmo grava: as buscas divergiriam entre
+    processos sem nunca convergir.
+    """
+    dialeto = make_url(DATABASE_URL).get_backend_name()
+    if workers > 1 and escolher_backend_busca(dialeto) == "memoria":
+        raise SystemExit(
+            "Busca em memória não funciona com vários workers: use WEB_WORKERS=1 "
+            "ou um SQLite com FTS5 (BUSCA_BACKEND=fts5)."
+        )
+
+
+def preparar_metricas(workers: int):
+    """Com vários workers as métricas de cada um vão para um diretório comum."""
+    caminho = os.getenv("METRICAS_DIR")
+    if workers > 1 and not caminho:
+        caminho = tempfile.mkdtemp(prefix="metricas-")
+        # os workers herdam o ambiente do processo pai
+        os.environ["METRICAS_DIR"] = caminho
+    if caminho:
+        # contadores recomeçam do zero a cada subida, como num worker só
+        DiretorioMetricas(caminho).limpar()
+
+
+def main():
+    conferir_busca(WEB_WORKERS)
+    preparar_metricas(WEB_WORKERS)
+    # os workers herdam o número já resolvido (dimensiona o pool do bcrypt)
+    os.environ["WEB_WORKERS"] = str(WEB_WORKERS)
+
+    logger.info(f"Subindo {WEB_WORKERS} workers em {WEB_HOST}:{WEB_PORTA}")
+    uvicorn.run(
+        "main:criar_app",
+        factory=True,
+        host=WEB_HOST,
+        port=WEB_PORTA,
+        workers=WEB_WORKERS,
+        timeout_graceful_shutdown=WEB_TIMEOUT_GRACIOSO,
+        timeout_keep_alive=WEB_KEEP_ALIVE,
+        proxy_headers=True,
+        forwarded_allow_ips=WEB_PROXIES_CONFIAVEIS,
+        # o log de acesso é do middleware ConsoleLogs
+        access_log=False,
+        log_level=os.getenv("WEB_LOG_LEVEL", "info"),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import asyncio
+import os
+from contextlib import contextmanager
+from datetime import date
+from itertools import count
+
+# antes de qualquer import da aplicação: banco em memória, bcrypt barato e
+# sem pool de processos, log só de erros
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ["DB_ASYNC"] = "false"
+os.environ["SENHAS_PROCESSOS"] = "0"
+os.environ["BCRYPT_CUSTO"] = "4"
+os.environ["LOG_AMOSTRAGEM"] = "0"
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from contextos.autenticacao.services_autenticacao import AutenticacaoService
+from contextos.livros.busca_livro import pegar_indice_busca
+from contextos.livros.cache_livro import cache_livros
+from contextos.livros.entidade_livro import Livro
+from contextos.usuarios.entidade_usuario import Usuario
+from contextos.vendas.entidade_vendas import Venda, VendaItem
+from libs.autenticacao.config import cache_tokens, cache_usuarios
+from libs.autenticacao.principal import versoes_tokens
+from libs.autenticacao.senhas import gerar_hash_senha
+from libs.database import sqlalchemy as modulo_banco
+from libs.database.sqlalchemy import (
+    Sessao,
+    criar_tabela,
+    encerrar_banco,
+    pegar_engine,
+)
+
+_sequencia = count(1)
+
+
+@pytest.fixture
+def url_banco() -> str:
+    """Sobrescreva no módulo de teste para usar outro banco (ex.: arquivo)."""
+    return os.environ["DATABASE_URL"]
+
+
+@pytest.fixture
+def banco(request, monkeypatch, url_banco):
+    """Banco em memória novo, com todas as migrações, a cada teste.
+
+    Parametrize indiretamente com o nome do backend de busca para trocá-lo.
+    """
+    monkeypatch.setattr(modulo_banco, "DATABASE_URL", url_banco)
+    monkeypatch.setenv("BUSCA_BACKEND", getattr(request, "param", "auto"))
+    pegar_indice_busca.cache_clear()
+    criar_tabela()
+    yield pegar_engine()
+
+    asyncio.run(encerrar_banco())
+    pegar_indice_busca.cache_clear()
+    for cache in (cache_livros, cache_usuarios, cache_tokens, versoes_tokens):
+        cache.limpar()
+
+
+@pytest.fixture
+def db(banco):
+    with Sessao() as sessao:
+        yield sessao
+
+
+@pytest.fixture
+def cliente(banco):
+    from main import criar_app
+
+    with TestClient(criar_app()) as cliente:
+        yield cliente
+
+
+@pytest.fixture
+def novo_usuario(db):
+    def criar(autor: bool = False, senha: str = "senha-de-teste") -> Usuario:
+        numero = next(_sequencia)
+        usuario = Usuario.criar(
+            nome="Usuario",
+            sobrenome=str(numero),
+            data_nascimento=date(1990, 1, 1),
+            email=f"usuario{numero}@livraria.com",
+            senha=gerar_hash_senha(senha),
+        )
+        usuario.autor = autor
+        db.add(usuario)
+        db.commit()
+        return usuario
+
+    return criar
+
+
+@pytest.fixture
+def novo_livro(db):
+    def criar(autor: Usuario, quantidade: int = 10, preco: float = 10.0, **campos):
+        numero = next(_sequencia)
+        livro = Livro.criar(
+            titulo=campos.pop("titulo", f"Livro {numero}"),
+            usuario_id=autor.id,
+            genero=campos.pop("genero", "Romance"),
+            quantidade=quantidade,
+            preco=preco,
+            descricao=campos.pop("descricao", f"Descricao do livro {numero}"),
+            url_imagem="https://imagens/livro.png",
+        )
+        db.add(livro)
+        db.flush()
+        pegar_indice_busca().indexar(db, livro.id)
+        db.commit()
+        return livro
+
+    return criar
+
+
+@pytest.fixture
+def nova_venda(db):
+    def criar(comprador: Usuario, livros: list[Livro], quantidade: int = 1) -> Venda:
+        venda = Venda.criar(id_usuario_comprador=comprador.id)
+        for livro in livros:
+            venda.adicionar_item(
+                VendaItem.criar(
+                    venda_id=venda.id,
+                    livro_id=livro.id,
+                    quantidade=quantidade,
+                    preco_unitario=livro.preco,
+                )
+            )
+        db.add(venda)
+        db.commit()
+        return venda
+
+    return criar
+
+
+@pytest.fixture
+def autenticar():
+    """Cabeçalho Authorization com um token novo para o usuário."""
+
+    def cabecalhos(usuario: Usuario) -> dict[str, str]:
+        return {"Authorization": f"Bearer {AutenticacaoService.gerar_token(usuario)}"}
+
+    return cabecalhos
+
+
+@pytest.fixture
+def contar_consultas(banco):
+    """Conta os comandos SQL enviados ao banco dentro do bloco with."""
+
+    @contextmanager
+    def contar():
+        comandos: list[str] = []
+
+        def registrar(_conexao, _cursor, comando, *_):
+            comandos.append(comando)
+
+        event.listen(banco, "before_cursor_execute", registrar)
+        try:
+            yield comandos
+        finally:
+            event.remove(banco, "before_cursor_execute", registrar)
+
+    return contar
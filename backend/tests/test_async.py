@@ -0,0 +1,183 @@
+import asyncio
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+from contextos.carrinho.entidade_carrinho import Carrinho
+from contextos.livros.entidade_livro import Livro
+from contextos.vendas.repositorio_vendas import VendaRepositoryAsync
+from contextos.vendas.services_vendas import VendaServiceAsync
+from libs.database import sqlalchemy as modulo_banco
+
+
+@pytest.fixture
+def url_banco(tmp_path):
+    # o driver assíncrono abre as próprias conexões: o banco precisa ser arquivo
+    return f"sqlite:///{tmp_path / 'async.db'}"
+
+
+@pytest.fixture(autouse=True)
+def db_async(monkeypatch):
+    monkeypatch.setattr(modulo_banco, "DB_ASYNC", True)
+
+
+@pytest.fixture
+def sem_threadpool():
+    """Dentro do bloco, qualquer ida ao threadpool derruba a requisição."""
+
+    def recusar(*_args, **_kwargs):
+        raise AssertionError("rota quente passou pelo threadpool")
+
+    @contextmanager
+    def bloquear():
+        with patch("anyio.to_thread.run_sync", recusar):
+            yield
+
+    return bloquear
+
+
+def test_listagem_e_detalhe_sem_threadpool(
+    cliente, novo_usuario, novo_livro, sem_threadpool
+):
+    autor = novo_usuario(autor=True)
+    livros = [novo_livro(autor, titulo=f"Volume {numero}") for numero in range(3)]
+    novo_livro(autor, titulo="Mar Aberto")
+
+    with sem_threadpool():
+        pagina = cliente.get("/livros/", params={"quantidade": 2})
+        proxima = cliente.get(
+            "/livros/",
+            params={"quantidade": 2, "cursor": pagina.json()["proximo_cursor"]},
+        )
+        busca = cliente.get("/livros/", params={"busca": "mar"})
+        detalhe = cliente.get(f"/livros/obter-livros/{livros[1].id}")
+        inexistente = cliente.get("/livros/obter-livros/999")
+
+    assert pagina.status_code == 200
+    assert [livro["id"] for livro in pagina.json()["data"]] == [
+        livros[0].id,
+        livros[1].id,
+    ]
+    assert pagina.json()["total"] == 4
+    assert len(proxima.json()["data"]) == 2
+    assert [livro["titulo"] for livro in busca.json()["data"]] == ["Mar Aberto"]
+    assert detalhe.json()["titulo"] == "Volume 1"
+    assert detalhe.headers["etag"]
+    assert inexistente.status_code == 404
+
+
+def test_carrinho_sem_threadpool(
+    cliente, db, novo_usuario, novo_livro, autenticar, sem_threadpool
+):
+    comprador = novo_usuario()
+    livro = novo_livro(novo_usuario(autor=True), quantidade=5, preco=12.5)
+    cabecalhos = autenticar(comprador)
+
+    def adicionar(livro_id: int, quantidade: int) -> int:
+        return cliente.post(
+            "/carrinho/adicionar",
+            json={"livro_id": livro_id, "quantidade": quantidade},
+            headers=cabecalhos,
+        ).status_code
+
+    with sem_threadpool():
+        assert adicionar(livro.id, 2) == 200
+        assert adicionar(livro.id, 2) == 200
+        assert adicionar(livro.id, 1) == 400
+        assert adicionar(999, 1) == 404
+        carrinho = cliente.get("/carrinho/", headers=cabecalhos).json()
+
+    assert [item["livro"]["id"] for item in carrinho["itens"]] == [livro.id]
+    assert carrinho["itens"][0]["carrinho"]["quantidade"] == 4
+    assert carrinho["total_do_carrinho"] == 50.0
+
+
+def test_compras_sem_threadpool(
+    cliente, db, novo_usuario, novo_livro, autenticar, sem_threadpool
+):
+    comprador = novo_usuario()
+    autor = novo_usuario(autor=True)
+    livro_a = novo_livro(autor, quantidade=5)
+    livro_b = novo_livro(autor, quantidade=2)
+    cabecalhos = autenticar(comprador)
+
+    with sem_threadpool():
+        vazio = cliente.post("/venda/comprar-do-carrinho", headers=cabecalhos)
+        for livro_id, quantidade in ((livro_a.id, 3), (livro_b.id, 1)):
+            cliente.post(
+                "/carrinho/adicionar",
+                json={"livro_id": livro_id, "quantidade": quantidade},
+                headers=cabecalhos,
+            )
+        compra = cliente.post("/venda/comprar-do-carrinho", headers=cabecalhos)
+        direta = cliente.post(f"/venda/venda-direta/{livro_b.id}", headers=cabecalhos)
+        sem_estoque = cliente.post(
+            f"/venda/venda-direta/{livro_b.id}", headers=cabecalhos
+        )
+        livro_inexistente = cliente.post("/venda/venda-direta/999", headers=cabecalhos)
+
+    assert vazio.status_code == 400
+    assert compra.status_code == 200 and compra.json()["id"]
+    assert direta.status_code == 200
+    assert sem_estoque.status_code == 400
+    assert "restam apenas 0 unidades" in sem_estoque.json()["detail"]
+    assert livro_inexistente.status_code == 404
+
+    db.expire_all()
+    assert db.get(Livro, livro_a.id).quantidade == 2
+    assert db.get(Livro, livro_b.id).quantidade == 0
+    assert db.query(Carrinho).filter(Carrinho.usuario_id == comprador.id).count() == 0
+
+
+def test_compra_do_carrinho_aponta_o_item_sem_estoque(
+    cliente, db, novo_usuario, novo_livro, autenticar
+):
+    comprador = novo_usuario()
+    autor = novo_usuario(autor=True)
+    livro_a = novo_livro(autor, quantidade=5)
+    livro_b = novo_livro(autor, quantidade=5, titulo="Pouco Estoque")
+    cabecalhos = autenticar(comprador)
+    for livro in (livro_a, livro_b):
+        cliente.post(
+            "/carrinho/adicionar",
+            json={"livro_id": livro.id, "quantidade": 2},
+            headers=cabecalhos,
+        )
+
+    # outra venda leva o estoque do segundo livro depois de ele entrar no carrinho
+    livro_b.quantidade = 1
+    db.commit()
+
+    resposta = cliente.post("/venda/comprar-do-carrinho", headers=cabecalhos)
+    assert resposta.status_code == 400
+    assert "Pouco Estoque" in resposta.json()["detail"]
+
+    # nada foi baixado e o carrinho continua inteiro
+    db.expire_all()
+    assert db.get(Livro, livro_a.id).quantidade == 5
+    assert db.query(Carrinho).filter(Carrinho.usuario_id == comprador.id).count() == 2
+
+
+def test_vendas_concorrentes_nao_vendem_alem_do_estoque(db, novo_usuario, novo_livro):
+    livro_id = novo_livro(novo_usuario(autor=True), quantidade=5).id
+    compradores = [novo_usuario().id for _ in range(20)]
+
+    async def comprar(comprador_id: int):
+        async with modulo_banco.pegar_fabrica_sessao_async()() as sessao:
+            servico = VendaServiceAsync(VendaRepositoryAsync(sessao))
+            try:
+                return await servico.finalizar_venda_direta(livro_id, comprador_id)
+            except HTTPException as erro:
+                return erro.status_code
+
+    async def comprar_todos():
+        return await asyncio.gather(*(comprar(id) for id in compradores))
+
+    resultados = asyncio.run(comprar_todos())
+
+    assert len([venda for venda in resultados if venda != 400]) == 5
+    assert resultados.count(400) == 15
+    db.expire_all()
+    assert db.get(Livro, livro_id).quantidade == 0
@@ -0,0 +1,212 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from contextos.usuarios.entidade_usuario import Usuario
+from libs.autenticacao import config
+from libs.autenticacao.config import (
+    cache_usuarios,
+    criar_token_de_acesso_a_rotas_protegidas,
+)
+from libs.autenticacao.principal import UsuarioAutenticado, versoes_tokens
+
+
+def _carrinho(cliente, cabecalhos):
+    return cliente.get("/carrinho/", headers=cabecalhos)
+
+
+def test_cache_guarda_usuario_imutavel_sem_senha(cliente, novo_usuario, autenticar):
+    usuario = novo_usuario()
+    assert _carrinho(cliente, autenticar(usuario)).status_code == 200
+
+    em_cache = cache_usuarios.pegar(("id", usuario.id))
+    assert isinstance(em_cache, UsuarioAutenticado)
+    assert not hasattr(em_cache, "senha")
+
+
+def test_desativar_no_banco_invalida_o_cache(cliente, db, novo_usuario, autenticar):
+    usuario = novo_usuario()
+    cabecalhos = autenticar(usuario)
+    assert _carrinho(cliente, cabecalhos).status_code == 200
+
+    usuario.ativo = False
+    db.commit()
+    assert cache_usuarios.pegar(("id", usuario.id)) is None
+    assert _carrinho(cliente, cabecalhos).status_code == 403
+
+
+def test_update_em_massa_invalida_o_cache(cliente, db, novo_usuario, autenticar):
+    usuario = novo_usuario()
+    cabecalhos = autenticar(usuario)
+    assert _carrinho(cliente, cabecalhos).status_code == 200
+
+    db.execute(update(Usuario).where(Usuario.id == usuario.id).values(deletado=True))
+    db.commit()
+    assert _carrinho(cliente, cabecalhos).status_code == 403
+
+
+def test_login_que_refaz_o_hash_nao_esvazia_o_cache(
+    cliente, db, novo_usuario, autenticar
+):
+    outro = novo_usuario()
+    assert _carrinho(cliente, autenticar(outro)).status_code == 200
+
+    # senha de antes do bcrypt: o login troca pelo hash
+    usuario = novo_usuario()
+    usuario.senha = "senha-em-texto-puro"
+    db.commit()
+    resposta = cliente.post(
+        "/autenticacao/login",
+        json={"email": usuario.email, "senha": "senha-em-texto-puro"},
+    )
+    assert resposta.status_code == 200
+
+    db.refresh(usuario)
+    assert usuario.senha.startswith("$2")
+    assert cache_usuarios.pegar(("id", outro.id)) is not None
+
+
+def test_rollback_mantem_o_cache(cliente, db, novo_usuario, autenticar):
+    usuario = novo_usuario()
+    assert _carrinho(cliente, autenticar(usuario)).status_code == 200
+
+    usuario.ativo = False
+    db.flush()
+    db.rollback()
+    assert cache_usuarios.pegar(("id", usuario.id)) is not None
+
+
+def test_ativar_autor_vale_na_proxima_requisicao(cliente, novo_usuario, autenticar):
+    usuario = novo_usuario()
+    cabecalhos = autenticar(usuario)
+    livro = {
+        "titulo": "Primeiro",
+        "genero": "Conto",
+        "quantidade": 1,
+        "preco": 5.0,
+        "descricao": "Contos",
+        "url_imagem": "https://imagens/livro.png",
+    }
+    resposta = cliente.post("/livros/cadastrar", json=livro, headers=cabecalhos)
+    assert resposta.status_code == 403
+
+    resposta = cliente.post(f"/usuarios/ativar/autor/{usuario.id}", headers=cabecalhos)
+    assert resposta.status_code == 200
+    resposta = cliente.post("/livros/cadastrar", json=livro, headers=cabecalhos)
+    assert resposta.status_code == 200
+
+
+@pytest.fixture(params=["banco", "claims"])
+def modo_auth(request, monkeypatch):
+    monkeypatch.setattr(config, "AUTH_MODO", request.param)
+    return request.param
+
+
+def _login(cliente, usuario, senha: str = "senha-de-teste"):
+    return cliente.post(
+        "/autenticacao/login", json={"email": usuario.email, "senha": senha}
+    )
+
+
+def _bearer(resposta) -> dict[str, str]:
+    return {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+
+
+def test_logout_revoga_os_tokens(modo_auth, cliente, novo_usuario):
+    usuario = novo_usuario()
+    cabecalhos = _bearer(_login(cliente, usuario))
+    assert _carrinho(cliente, cabecalhos).status_code == 200
+
+    assert cliente.post("/autenticacao/logout", headers=cabecalhos).status_code == 204
+    resposta = _carrinho(cliente, cabecalhos)
+    assert resposta.status_code == 401
+    assert resposta.headers["WWW-Authenticate"] == "Bearer"
+
+    assert _carrinho(cliente, _bearer(_login(cliente, usuario))).status_code == 200
+
+
+def test_desativar_revoga_e_bloqueia_novos_logins(modo_auth, cliente, novo_usuario):
+    usuario = novo_usuario()
+    cabecalhos = _bearer(_login(cliente, usuario))
+
+    assert cliente.post("/usuarios/desativar", headers=cabecalhos).status_code == 204
+    assert _carrinho(cliente, cabecalhos).status_code == 401
+    assert _carrinho(cliente, _bearer(_login(cliente, usuario))).status_code == 403
+
+
+def test_trocar_senha_revoga_e_devolve_token_novo(modo_auth, cliente, novo_usuario):
+    usuario = novo_usuario()
+    cabecalhos = _bearer(_login(cliente, usuario))
+
+    errada = {"senha_atual": "outra-senha", "nova_senha": "senha-nova-123"}
+    assert (
+        cliente.put("/usuarios/senha", json=errada, headers=cabecalhos).status_code
+        == 400
+    )
+
+    certa = {"senha_atual": "senha-de-teste", "nova_senha": "senha-nova-123"}
+    resposta = cliente.put("/usuarios/senha", json=certa, headers=cabecalhos)
+    assert resposta.status_code == 200
+    assert _carrinho(cliente, cabecalhos).status_code == 401
+    assert _carrinho(cliente, _bearer(resposta)).status_code == 200
+
+    assert _login(cliente, usuario).status_code == 400
+    assert _login(cliente, usuario, "senha-nova-123").status_code == 200
+
+
+def test_token_sem_versao_vale_como_a_primeira(modo_auth, cliente, novo_usuario):
+    usuario = novo_usuario()
+    antigo = criar_token_de_acesso_a_rotas_protegidas(
+        {"sub": usuario.email, "id": usuario.id}
+    )
+    cabecalhos = {"Authorization": f"Bearer {antigo}"}
+    assert _carrinho(cliente, cabecalhos).status_code == 200
+
+    cliente.post("/autenticacao/logout", headers=cabecalhos)
+    assert _carrinho(cliente, cabecalhos).status_code == 401
+
+
+def test_modo_claims_nao_consulta_usuarios(
+    monkeypatch, cliente, novo_usuario, autenticar, contar_consultas
+):
+    monkeypatch.setattr(config, "AUTH_MODO", "claims")
+    cabecalhos = autenticar(novo_usuario())
+
+    with contar_consultas() as comandos:
+        assert _carrinho(cliente, cabecalhos).status_code == 200
+    assert not any("FROM usuarios" in comando for comando in comandos)
+
+
+def test_revogacao_de_outro_worker_chega_na_releitura(
+    monkeypatch, cliente, db, novo_usuario, autenticar
+):
+    monkeypatch.setattr(config, "AUTH_MODO", "claims")
+    usuario = novo_usuario()
+    cabecalhos = autenticar(usuario)
+
+    # outro worker revoga: este só fica sabendo quando reler as versões
+    usuario.renovar_versao_token()
+    db.commit()
+    assert _carrinho(cliente, cabecalhos).status_code == 200
+
+    versoes_tokens.recarregar(db)
+    assert _carrinho(cliente, cabecalhos).status_code == 401
+
+
+def test_versoes_guardam_so_revogacoes_recentes(db, novo_usuario):
+    recente, antiga = novo_usuario(), novo_usuario()
+    for usuario in (recente, antiga):
+        usuario.renovar_versao_token()
+    db.commit()
+    # renovada antes da validade de um token: nenhum token revogado ainda vale
+    antiga.token_renovado_em = datetime.utcnow() - timedelta(
+        minutes=config.ACCESS_TOKEN_EXPIRE_MINUTES + 1
+    )
+    db.commit()
+
+    versoes_tokens.registrar(antiga.id, 2, antiga.token_renovado_em)
+    versoes_tokens.recarregar(db)
+    assert versoes_tokens.atual(recente.id) == 2
+    assert versoes_tokens.atual(antiga.id) == 1
+    assert len(versoes_tokens) == 1
@@ -0,0 +1,118 @@
+import pytest
+from sqlalchemy import select
+
+import servidor
+from contextos.livros.busca_livro import pegar_indice_busca
+from contextos.livros.entidade_livro import Livro
+from contextos.livros.repositorio_livro import LivroRepository
+
+backends_busca = pytest.mark.parametrize("banco", ["fts5", "memoria"], indirect=True)
+
+
+def _livro(titulo: str) -> dict:
+    return {
+        "titulo": titulo,
+        "genero": "Fantasia",
+        "quantidade": 3,
+        "preco": 20.0,
+        "descricao": "Uma aventura",
+        "url_imagem": "https://imagens/livro.png",
+    }
+
+
+def _buscar(cliente, busca: str, **params) -> dict:
+    resposta = cliente.get("/livros/", params={"busca": busca, **params})
+    assert resposta.status_code == 200
+    return resposta.json()
+
+
+@backends_busca
+def test_indice_acompanha_cadastro_edicao_e_exclusao(
+    banco, cliente, novo_usuario, autenticar
+):
+    autor = novo_usuario(autor=True)
+    cabecalhos = autenticar(autor)
+
+    resposta = cliente.post(
+        "/livros/cadastrar", json=_livro("Dragões de Éter"), headers=cabecalhos
+    )
+    livro_id = resposta.json()["id"]
+    # prefixo, sem acento e pelo nome do autor
+    assert [livro["id"] for livro in _buscar(cliente, "drag eter")["data"]] == [
+        livro_id
+    ]
+    assert _buscar(cliente, f"usuario {autor.sobrenome}")["total"] == 1
+
+    cliente.put(
+        f"/livros/editar/{livro_id}", json=_livro("Cidade de Vidro"), headers=cabecalhos
+    )
+    assert _buscar(cliente, "dragoes")["total"] == 0
+    assert _buscar(cliente, "vidro")["total"] == 1
+
+    cliente.delete(f"/livros/{livro_id}", headers=cabecalhos)
+    assert _buscar(cliente, "vidro")["total"] == 0
+
+
+@backends_busca
+def test_busca_sem_limite_de_resultados(banco, cliente, db, novo_usuario):
+    autor = novo_usuario(autor=True)
+    LivroRepository(db).cadastrar_livros_em_lote(
+        [
+            {**_livro(f"Coletanea {numero}"), "usuario_id": autor.id}
+            for numero in range(1105)
+        ]
+    )
+
+    pagina = _buscar(cliente, "coletanea", quantidade=100, pagina=12)
+    assert pagina["total"] == 1105
+    assert pagina["total_paginas"] == 12
+    assert len(pagina["data"]) == 5
+
+    lotes = LivroRepository(db).iterar_livros_ativos_com_autor_opcional(
+        "coletanea", tamanho_lote=500
+    )
+    assert sum(len(lote) for lote in lotes) == 1105
+
+
+@backends_busca
+def test_busca_filtrada_por_autor(banco, db, novo_usuario, novo_livro):
+    autor = novo_usuario(autor=True)
+    outro_autor = novo_usuario(autor=True)
+    meu = novo_livro(autor, titulo="Mar Aberto")
+    novo_livro(outro_autor, titulo="Mar Fechado")
+
+    livros, total, _, tem_proxima = LivroRepository(
+        db
+    ).buscar_paginada_de_livros_ativos_com_autor_opcional(1, 10, "mar", autor.id)
+    assert [livro.id for livro in livros] == [meu.id]
+    assert total == 1
+    assert not tem_proxima
+
+
+@backends_busca
+def test_filtrar_restringe_e_ordena_pela_relevancia(
+    banco, db, novo_usuario, novo_livro
+):
+    autor = novo_usuario(autor=True)
+    na_descricao = novo_livro(autor, titulo="Ilhas", descricao="O mar de perto")
+    no_titulo = novo_livro(autor, titulo="Mar Aberto")
+    novo_livro(autor, titulo="Serra")
+    indice = pegar_indice_busca()
+
+    consulta = indice.filtrar(select(Livro), "mar")
+    assert [livro.id for livro in db.scalars(consulta)] == [
+        no_titulo.id,
+        na_descricao.id,
+    ]
+    assert db.scalars(indice.filtrar(select(Livro), "deserto")).all() == []
+    assert len(db.scalars(indice.filtrar(select(Livro), "")).all()) == 3
+
+
+def test_servidor_recusa_busca_em_memoria_com_varios_workers(monkeypatch):
+    monkeypatch.setenv("BUSCA_BACKEND", "memoria")
+    servidor.conferir_busca(1)
+    with pytest.raises(SystemExit):
+        servidor.conferir_busca(4)
+
+    monkeypatch.setenv("BUSCA_BACKEND", "fts5")
+    servidor.conferir_busca(4)
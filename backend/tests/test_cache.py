@@ -0,0 +1,78 @@
+import pytest
+
+from contextos.livros.cache_livro import cache_livros
+from contextos.livros.modelos_livro import RetornoImportacaoLivros
+from libs.cache.respostas import (
+    BackendCacheCompartilhado,
+    BackendCacheLocal,
+    CacheRespostas,
+    Validadores,
+)
+
+
+def _cache(backend, tamanho_maximo_contadores: int = 3) -> CacheRespostas:
+    return CacheRespostas(
+        backend(
+            tamanho_maximo=100,
+            ttl_segundos=60,
+            tamanho_maximo_contadores=tamanho_maximo_contadores,
+        )
+    )
+
+
+def _resposta(importados: int) -> RetornoImportacaoLivros:
+    return RetornoImportacaoLivros(importados=importados, com_erro=0, erros=[])
+
+
+@pytest.mark.parametrize("backend", [BackendCacheLocal, BackendCacheCompartilhado])
+def test_contadores_sao_limitados(backend):
+    cache = _cache(backend)
+    for livro_id in range(50):
+        cache.invalidar_livros(livro_id)
+    assert cache.estatisticas()["contadores"] == 3
+
+
+@pytest.mark.parametrize("backend", [BackendCacheLocal, BackendCacheCompartilhado])
+def test_contador_descartado_nao_ressuscita_resposta_antiga(backend):
+    cache = _cache(backend)
+    validadores = Validadores(etag='"1"')
+
+    cache.guardar(cache.chave_livro("obter", 1), _resposta(1), validadores)
+    cache.invalidar_livros(1)
+    # descarta o contador do livro 1 escrevendo em outros livros
+    for livro_id in range(2, 10):
+        cache.invalidar_livros(livro_id)
+
+    assert cache.pegar(cache.chave_livro("obter", 1)) is None
+
+    # sem escrita nova, o que foi guardado depois continua valendo
+    chave = cache.chave_livro("obter", 1)
+    cache.guardar(chave, _resposta(2), validadores)
+    assert cache.pegar(cache.chave_livro("obter", 1)) is not None
+
+
+def test_limpar_nao_reaproveita_versoes():
+    cache = _cache(BackendCacheLocal)
+    cache.invalidar_livros(1)
+    chave_antiga = cache.chave_livro("obter", 1)
+    cache.limpar()
+    cache.guardar(chave_antiga, _resposta(1))
+    assert cache.pegar(cache.chave_livro("obter", 1)) is None
+
+
+def test_cadastro_nao_cria_contador_por_livro(cliente, novo_usuario, autenticar):
+    cabecalhos = autenticar(novo_usuario(autor=True))
+    corpo = "titulo,genero,quantidade,preco,descricao,url_imagem\n" + "".join(
+        f"Livro {numero},Conto,1,1,Texto,https://img/{numero}.png\n"
+        for numero in range(20)
+    )
+    catalogo = cache_livros.chave_catalogo("listar")
+
+    resposta = cliente.post(
+        "/livros/importar",
+        content=corpo.encode(),
+        headers={**cabecalhos, "Content-Type": "text/csv"},
+    )
+    assert resposta.json()["importados"] == 20
+    assert cache_livros.estatisticas()["contadores"] == 1
+    assert cache_livros.chave_catalogo("listar") != catalogo
@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+from contextos.carrinho.entidade_carrinho import Carrinho
+from contextos.carrinho.repositorio_carrinho import CarrinhoRepository
+from libs.database.sqlalchemy import Sessao
+
+
+@pytest.fixture
+def url_banco(tmp_path):
+    # em arquivo: cada thread do teste de concorrência tem a própria conexão
+    return f"sqlite:///{tmp_path / 'carrinho.db'}"
+
+
+def _quantidades(db, usuario_id: int) -> list[int]:
+    db.expire_all()
+    linhas = db.query(Carrinho).filter(Carrinho.usuario_id == usuario_id)
+    return [linha.quantidade for linha in linhas]
+
+
+def test_somar_no_mesmo_item_ate_o_limite_do_estoque(db, novo_usuario, novo_livro):
+    comprador = novo_usuario()
+    livro = novo_livro(novo_usuario(autor=True), quantidade=5)
+    repositorio = CarrinhoRepository(db)
+
+    primeiro = repositorio.adicionar_ou_somar_item(comprador.id, livro.id, 2)
+    segundo = repositorio.adicionar_ou_somar_item(comprador.id, livro.id, 2)
+    assert primeiro is not None
+    assert segundo == primeiro
+    assert _quantidades(db, comprador.id) == [4]
+
+    # 4 + 1 chegaria ao estoque: o carrinho precisa ficar abaixo dele
+    assert repositorio.adicionar_ou_somar_item(comprador.id, livro.id, 1) is None
+    assert _quantidades(db, comprador.id) == [4]
+
+
+def test_primeira_insercao_tambem_respeita_o_estoque(db, novo_usuario, novo_livro):
+    comprador = novo_usuario()
+    livro = novo_livro(novo_usuario(autor=True), quantidade=3)
+    repositorio = CarrinhoRepository(db)
+
+    assert repositorio.adicionar_ou_somar_item(comprador.id, livro.id, 3) is None
+    assert repositorio.adicionar_ou_somar_item(comprador.id, 999, 1) is None
+    assert _quantidades(db, comprador.id) == []
+
+
+def test_rota_explica_por_que_o_item_nao_entrou(
+    cliente, novo_usuario, novo_livro, autenticar
+):
+    comprador = novo_usuario()
+    livro = novo_livro(novo_usuario(autor=True), quantidade=2)
+    cabecalhos = autenticar(comprador)
+
+    def adicionar(livro_id: int, quantidade: int):
+        return cliente.post(
+            "/carrinho/adicionar",
+            json={"livro_id": livro_id, "quantidade": quantidade},
+            headers=cabecalhos,
+        ).status_code
+
+    assert adicionar(livro.id, 1) == 200
+    assert adicionar(livro.id, 1) == 400
+    assert adicionar(999, 1) == 404
+
+
+def test_adicoes_concorrentes_nao_passam_do_estoque(banco, novo_usuario, novo_livro):
+    # ids lidos antes: a sessão do fixture não pode ser usada pelas threads
+    comprador_id = novo_usuario().id
+    livro_id = novo_livro(novo_usuario(autor=True), quantidade=10).id
+    aceitos = []
+    largada = threading.Barrier(20)
+
+    def adicionar():
+        with Sessao() as sessao:
+            largada.wait()
+            if CarrinhoRepository(sessao).adicionar_ou_somar_item(
+                comprador_id, livro_id, 1
+            ):
+                aceitos.append(1)
+
+    threads = [threading.Thread(target=adicionar) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(aceitos) == 9
+    with Sessao() as sessao:
+        assert _quantidades(sessao, comprador_id) == [9]
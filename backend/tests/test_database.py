@@ -0,0 +1,58 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from libs.database.concorrencia import repetir_em_conflito
+from libs.database.sqlalchemy import Sessao, executar_na_sessao
+
+
+def test_executar_na_sessao_roda_fora_do_event_loop(banco):
+    async def rodar():
+        with Sessao() as db:
+            thread_do_servico = await executar_na_sessao(
+                db, lambda _: threading.get_ident()
+            )
+        return threading.get_ident(), thread_do_servico
+
+    thread_do_loop, thread_do_servico = asyncio.run(rodar())
+    assert thread_do_servico != thread_do_loop
+
+
+def test_repetir_em_conflito_nao_roda_no_event_loop(db):
+    async def rodar():
+        repetir_em_conflito(db, lambda: None)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(rodar())
+
+
+def _erro(classe, mensagem: str):
+    return classe("UPDATE livros ...", {}, sqlite3.OperationalError(mensagem))
+
+
+def test_repetir_em_conflito_repete_banco_travado(db):
+    tentativas = []
+
+    def transacao():
+        tentativas.append(1)
+        if len(tentativas) < 3:
+            raise _erro(OperationalError, "database is locked")
+        return "ok"
+
+    assert repetir_em_conflito(db, transacao, espera_segundos=0) == "ok"
+    assert len(tentativas) == 3
+
+
+def test_repetir_em_conflito_nao_repete_outros_erros(db):
+    tentativas = []
+
+    def transacao():
+        tentativas.append(1)
+        raise _erro(IntegrityError, "UNIQUE constraint failed")
+
+    with pytest.raises(IntegrityError):
+        repetir_em_conflito(db, transacao, espera_segundos=0)
+    assert len(tentativas) == 1
@@ -0,0 +1,137 @@
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from contextos.carrinho.repositorio_carrinho import CarrinhoRepository
+from contextos.livros.entidade_livro import Livro
+from contextos.vendas.repositorio_vendas import VendaRepository
+from contextos.vendas.services_vendas import VendaService
+from libs.database.sqlalchemy import Sessao
+
+
+@pytest.fixture
+def url_banco(tmp_path):
+    # em arquivo: cada thread do teste de concorrência tem a própria conexão
+    return f"sqlite:///{tmp_path / 'estoque.db'}"
+
+
+def _estoque(db, livro_id: int) -> int:
+    db.expire_all()
+    return db.get(Livro, livro_id).quantidade
+
+
+def test_reserva_e_tudo_ou_nada(db, novo_usuario, novo_livro):
+    autor = novo_usuario(autor=True)
+    com_estoque = novo_livro(autor, quantidade=5).id
+    quase_sem = novo_livro(autor, quantidade=1).id
+    repositorio = VendaRepository(db)
+
+    assert not repositorio.reservar_estoque({com_estoque: 2, quase_sem: 2})
+    db.rollback()
+    assert _estoque(db, com_estoque) == 5
+    assert _estoque(db, quase_sem) == 1
+
+    # pode zerar o estoque, não passar dele
+    assert repositorio.reservar_estoque({com_estoque: 2, quase_sem: 1})
+    db.commit()
+    assert _estoque(db, com_estoque) == 3
+    assert _estoque(db, quase_sem) == 0
+
+
+def test_venda_direta_recusa_sem_estoque(
+    cliente, db, novo_usuario, novo_livro, autenticar
+):
+    livro_id = novo_livro(novo_usuario(autor=True), quantidade=1).id
+    cabecalhos = autenticar(novo_usuario())
+
+    assert (
+        cliente.post(f"/venda/venda-direta/{livro_id}", headers=cabecalhos).status_code
+        == 200
+    )
+    resposta = cliente.post(f"/venda/venda-direta/{livro_id}", headers=cabecalhos)
+    assert resposta.status_code == 400
+    assert "restam apenas 0" in resposta.json()["detail"]
+    assert _estoque(db, livro_id) == 0
+
+
+def test_carrinho_nao_compra_se_o_estoque_acabou_depois(
+    cliente, db, novo_usuario, novo_livro, autenticar
+):
+    autor = novo_usuario(autor=True)
+    livro_a = novo_livro(autor, quantidade=5, titulo="Livro A").id
+    livro_b = novo_livro(autor, quantidade=3, titulo="Livro B").id
+    comprador = novo_usuario()
+    carrinho = CarrinhoRepository(db)
+    carrinho.adicionar_ou_somar_item(comprador.id, livro_a, 2)
+    carrinho.adicionar_ou_somar_item(comprador.id, livro_b, 2)
+
+    # outra compra leva o livro B entre o carrinho e a finalização
+    assert VendaRepository(db).reservar_estoque({livro_b: 2})
+    db.commit()
+
+    resposta = cliente.post("/venda/comprar-do-carrinho", headers=autenticar(comprador))
+    assert resposta.status_code == 400
+    assert "Livro B" in resposta.json()["detail"]
+    assert _estoque(db, livro_a) == 5
+    assert _estoque(db, livro_b) == 1
+    assert len(carrinho.buscar_carrinho_agrupado_do_usuario(comprador.id)) == 2
+
+
+def test_compra_tira_do_carrinho_so_o_que_foi_comprado(
+    cliente, db, novo_usuario, novo_livro, autenticar
+):
+    autor = novo_usuario(autor=True)
+    livro_a, livro_b, livro_c = (novo_livro(autor).id for _ in range(3))
+    comprador = novo_usuario()
+    carrinho = CarrinhoRepository(db)
+    carrinho.adicionar_ou_somar_item(comprador.id, livro_a, 2)
+    carrinho.adicionar_ou_somar_item(comprador.id, livro_b, 1)
+
+    # a compra leu A=2 e B=1; outra requisição somou 1 em A e pôs C
+    carrinho.adicionar_ou_somar_item(comprador.id, livro_a, 1)
+    carrinho.adicionar_ou_somar_item(comprador.id, livro_c, 1)
+    VendaRepository(db).tirar_do_carrinho(comprador.id, {livro_a: 2, livro_b: 1})
+    db.commit()
+
+    restantes = {
+        livro.id: quantidade
+        for livro, quantidade, _ in carrinho.buscar_carrinho_agrupado_do_usuario(
+            comprador.id
+        )
+    }
+    assert restantes == {livro_a: 1, livro_c: 1}
+
+    resposta = cliente.post("/venda/comprar-do-carrinho", headers=autenticar(comprador))
+    assert resposta.status_code == 200
+    assert carrinho.buscar_carrinho_agrupado_do_usuario(comprador.id) == []
+
+
+def test_vendas_concorrentes_nao_vendem_alem_do_estoque(
+    banco, novo_usuario, novo_livro
+):
+    # ids lidos antes: a sessão do fixture não pode ser usada pelas threads
+    livro_id = novo_livro(novo_usuario(autor=True), quantidade=5).id
+    compradores = [novo_usuario().id for _ in range(20)]
+    vendidos, recusados = [], []
+    largada = threading.Barrier(len(compradores))
+
+    def comprar(comprador_id: int):
+        with Sessao() as sessao:
+            servico = VendaService(VendaRepository(sessao))
+            largada.wait()
+            try:
+                vendidos.append(servico.finalizar_venda_direta(livro_id, comprador_id))
+            except HTTPException as erro:
+                recusados.append(erro.status_code)
+
+    threads = [threading.Thread(target=comprar, args=(id,)) for id in compradores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(vendidos) == 5
+    assert recusados == [400] * 15
+    with Sessao() as sessao:
+        assert _estoque(sessao, livro_id) == 0
@@ -0,0 +1,93 @@
+import asyncio
+
+from contextos.livros.importacao_livro import iterar_registros_csv
+
+CABECALHO = "titulo,genero,quantidade,preco,descricao,url_imagem\n"
+
+
+def _importar(cliente, cabecalhos, corpo: str | bytes, content_type: str, **params):
+    return cliente.post(
+        "/livros/importar",
+        content=corpo.encode() if isinstance(corpo, str) else corpo,
+        headers={**cabecalhos, "Content-Type": content_type},
+        params=params,
+    )
+
+
+def _erros(resposta) -> dict[int, list[str]]:
+    return {erro["linha"]: erro["erros"] for erro in resposta.json()["erros"]}
+
+
+def test_csv_importa_validos_e_relata_linhas_com_erro(
+    cliente, novo_usuario, autenticar
+):
+    cabecalhos = autenticar(novo_usuario(autor=True))
+    corpo = (
+        "\ufeff"
+        + CABECALHO
+        + "Primeiro,Conto,3,10.5,Curto,https://img/1.png\n"
+        + '"Segundo, o livro",Conto,2,5,"Duas\nlinhas",https://img/2.png\n'
+        + "\n"
+        + "Faltando,Conto,1\n"
+        + "Quantidade errada,Conto,muitos,5,Texto,https://img/3.png\n"
+        + "Terceiro,Conto,1,1,Fim,https://img/4.png"
+    )
+
+    resposta = _importar(
+        cliente, cabecalhos, corpo, "text/csv; charset=utf-8", tamanho_lote=2
+    )
+    assert resposta.status_code == 200
+    assert resposta.json()["importados"] == 3
+    assert resposta.json()["com_erro"] == 2
+    erros = _erros(resposta)
+    assert erros[6] == ["Esperava 6 colunas, encontrou 3."]
+    assert erros[7][0].startswith("quantidade:")
+
+    busca = cliente.get("/livros/", params={"busca": "segundo livro"}).json()
+    assert busca["data"][0]["descricao"] == "Duas\nlinhas"
+
+
+def test_ndjson_relata_json_invalido_e_campos_faltando(
+    cliente, novo_usuario, autenticar
+):
+    cabecalhos = autenticar(novo_usuario(autor=True))
+    valido = (
+        '{"titulo": "Um", "genero": "Poesia", "quantidade": 1, "preco": 2,'
+        ' "descricao": "Versos", "url_imagem": "https://img/1.png"}'
+    )
+    corpo = "\n".join([valido, "{nao e json", "[1, 2]", '{"titulo": "Sem o resto"}'])
+
+    resposta = _importar(cliente, cabecalhos, corpo, "application/x-ndjson")
+    assert resposta.status_code == 200
+    assert resposta.json()["importados"] == 1
+    erros = _erros(resposta)
+    assert erros[2][0].startswith("JSON inválido")
+    assert erros[3] == ["Cada linha deve ser um objeto JSON."]
+    assert any(erro.startswith("genero:") for erro in erros[4])
+
+
+def test_importacao_recusa_formato_codificacao_e_quem_nao_e_autor(
+    cliente, novo_usuario, autenticar
+):
+    cabecalhos = autenticar(novo_usuario(autor=True))
+    assert _importar(cliente, cabecalhos, "{}", "application/json").status_code == 415
+
+    latin1 = (CABECALHO + "Ação,Conto,1,1,Texto,https://img/1.png\n").encode("latin-1")
+    resposta = _importar(cliente, cabecalhos, latin1, "text/csv")
+    assert resposta.status_code == 400
+
+    leitor = autenticar(novo_usuario())
+    assert _importar(cliente, leitor, CABECALHO, "text/csv").status_code == 403
+
+
+def test_csv_lido_em_pedacos_e_aspas_sem_fechar():
+    conteudo = (CABECALHO + 'Ação,Conto,1,1,"Sem fechar\n').encode()
+
+    async def byte_a_byte():
+        for posicao in range(len(conteudo)):
+            yield conteudo[posicao : posicao + 1]
+
+    async def ler():
+        return [registro async for registro in iterar_registros_csv(byte_a_byte())]
+
+    assert asyncio.run(ler()) == [(2, None, "Campo entre aspas não foi fechado.")]
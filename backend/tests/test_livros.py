@@ -0,0 +1,115 @@
+from libs.paginacao.cursor import codificar_cursor_dados
+
+
+def _ids(resposta) -> list[int]:
+    return [livro["id"] for livro in resposta.json()["data"]]
+
+
+def test_paginacao_por_cursor_percorre_o_catalogo_sem_contar(
+    cliente, novo_usuario, novo_livro, contar_consultas
+):
+    autor = novo_usuario(autor=True)
+    livros = [novo_livro(autor) for _ in range(7)]
+
+    primeira = cliente.get("/livros/", params={"quantidade": 3})
+    assert primeira.status_code == 200
+    assert primeira.json()["total"] == 7
+    assert primeira.json()["total_paginas"] == 3
+
+    vistos = _ids(primeira)
+    cursor = primeira.json()["proximo_cursor"]
+    while cursor:
+        with contar_consultas() as comandos:
+            resposta = cliente.get(
+                "/livros/", params={"quantidade": 3, "cursor": cursor}
+            )
+        assert resposta.status_code == 200
+        assert resposta.json()["total"] is None
+        assert resposta.json()["pagina"] is None
+        assert not any("count(" in comando.lower() for comando in comandos)
+        vistos += _ids(resposta)
+        cursor = resposta.json()["proximo_cursor"]
+
+    assert vistos == [livro.id for livro in livros]
+
+
+def test_cursor_com_total_explicito(cliente, novo_usuario, novo_livro):
+    autor = novo_usuario(autor=True)
+    for _ in range(4):
+        novo_livro(autor)
+
+    cursor = cliente.get("/livros/", params={"quantidade": 2}).json()["proximo_cursor"]
+    resposta = cliente.get(
+        "/livros/", params={"quantidade": 2, "cursor": cursor, "com_total": True}
+    )
+    assert resposta.json()["total"] == 4
+
+    resposta = cliente.get("/livros/", params={"quantidade": 2, "com_total": False})
+    assert resposta.json()["total"] is None
+    assert resposta.json()["proximo_cursor"]
+
+
+def test_cursor_invalido_responde_400(cliente):
+    for cursor in ("lixo", codificar_cursor_dados({"id": "1"})):
+        resposta = cliente.get("/livros/", params={"cursor": cursor})
+        assert resposta.status_code == 400
+
+    resposta = cliente.get(
+        "/livros/",
+        params={"cursor": codificar_cursor_dados({"id": 1}), "busca": "livro"},
+    )
+    assert resposta.status_code == 400
+
+
+def test_listagem_responde_304_pelo_etag(cliente, novo_usuario, novo_livro, autenticar):
+    autor = novo_usuario(autor=True)
+    livros = [novo_livro(autor) for _ in range(3)]
+    cabecalhos = autenticar(autor)
+
+    primeira = cliente.get("/livros/")
+    etag = primeira.headers["ETag"]
+    assert "Last-Modified" not in primeira.headers
+    assert primeira.headers["X-Cache"] == "MISS"
+    assert cliente.get("/livros/").headers["X-Cache"] == "HIT"
+
+    resposta = cliente.get("/livros/", headers={"If-None-Match": f"W/{etag}"})
+    assert resposta.status_code == 304
+    assert resposta.headers["ETag"] == etag
+
+    # excluir um livro não muda a data de nenhum dos que ficaram na página
+    cliente.delete(f"/livros/{livros[1].id}", headers=cabecalhos)
+    resposta = cliente.get(
+        "/livros/",
+        headers={
+            "If-None-Match": etag,
+            "If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT",
+        },
+    )
+    assert resposta.status_code == 200
+    assert _ids(resposta) == [livros[0].id, livros[2].id]
+
+    # If-Modified-Since sozinho não vale para listagens
+    resposta = cliente.get(
+        "/livros/", headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}
+    )
+    assert resposta.status_code == 200
+
+
+def test_livro_responde_304_e_muda_com_a_venda(
+    cliente, novo_usuario, novo_livro, autenticar
+):
+    livro = novo_livro(novo_usuario(autor=True))
+    url = f"/livros/obter-livros/{livro.id}"
+
+    primeira = cliente.get(url)
+    etag, modificado = primeira.headers["ETag"], primeira.headers["Last-Modified"]
+    assert cliente.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert (
+        cliente.get(url, headers={"If-Modified-Since": modificado}).status_code == 304
+    )
+
+    cliente.post(f"/venda/venda-direta/{livro.id}", headers=autenticar(novo_usuario()))
+    resposta = cliente.get(url, headers={"If-None-Match": etag})
+    assert resposta.status_code == 200
+    assert resposta.json()["quantidade"] == 9
+    assert resposta.headers["ETag"] != etag
@@ -0,0 +1,23 @@
+from fastapi.testclient import TestClient
+from loguru import logger
+
+from libs.middleware import logs
+
+
+def test_criar_apps_nao_remove_os_sinks_dos_outros(banco):
+    from main import criar_app
+
+    mensagens: list[str] = []
+    sink = logger.add(mensagens.append, format="{message}")
+    try:
+        for _ in range(2):
+            with TestClient(criar_app()) as cliente:
+                assert cliente.get("/saude/vivo").status_code == 200
+                assert logs._sink_logs is not None
+            logger.info("depois do lifespan")
+    finally:
+        logger.remove(sink)
+
+    assert mensagens.count("depois do lifespan\n") == 2
+    # o encerramento tira só o sink do configurar_logs
+    assert logs._sink_logs is None
@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+
+import servidor
+from libs.metricas.registro import (
+    Contador,
+    DiretorioMetricas,
+    Histograma,
+    Medidor,
+    RegistroMetricas,
+)
+
+
+def _registro(requisicoes: int, em_andamento: int) -> RegistroMetricas:
+    # as mesmas métricas de cada worker, com os valores de um deles
+    registro = RegistroMetricas()
+    registro.registrar(Contador("req_total", "Requisições.", ("rota",))).incrementar(
+        requisicoes, rota="/livros/"
+    )
+    duracao = registro.registrar(Histograma("duracao", "Duração.", limites=(1,)))
+    for _ in range(requisicoes):
+        duracao.observar(0.5)
+    registro.registrar(Medidor("em_andamento", "Em andamento.")).definir(em_andamento)
+    return registro
+
+
+def _pid_encerrado() -> int:
+    processo = subprocess.Popen([sys.executable, "-c", ""])
+    processo.wait()
+    return processo.pid
+
+
+def test_coleta_junta_os_workers(tmp_path):
+    diretorio = DiretorioMetricas(str(tmp_path))
+    encerrado = _pid_encerrado()
+    diretorio.gravar(_registro(requisicoes=2, em_andamento=1))
+    diretorio.gravar(_registro(requisicoes=3, em_andamento=4), pid=encerrado)
+
+    linhas = diretorio.exportar(_registro(0, 0)).splitlines()
+
+    # contadores e histogramas somam todos, inclusive o worker que saiu
+    assert 'req_total{rota="/livros/"} 5' in linhas
+    assert 'duracao_bucket{le="1.0"} 5' in linhas
+    assert "duracao_count 5" in linhas
+    # gauges: uma série por worker vivo
+    assert f'em_andamento{{pid="{os.getpid()}"}} 1' in linhas
+    assert not any(f'pid="{encerrado}"' in linha for linha in linhas)
+
+
+def test_metrics_com_diretorio_devolve_todos_os_workers(monkeypatch, tmp_path, cliente):
+    monkeypatch.setenv("METRICAS_DIR", str(tmp_path))
+    DiretorioMetricas(str(tmp_path)).gravar(
+        _registro(requisicoes=7, em_andamento=0), pid=_pid_encerrado()
+    )
+
+    resposta = cliente.get("/metrics")
+    assert resposta.status_code == 200
+    assert f'pid="{os.getpid()}"' in resposta.text
+    assert (tmp_path / f"{os.getpid()}.json").exists()
+
+
+def test_servidor_prepara_o_diretorio_com_varios_workers(monkeypatch, tmp_path):
+    monkeypatch.delenv("METRICAS_DIR", raising=False)
+    servidor.preparar_metricas(1)
+    assert "METRICAS_DIR" not in os.environ
+
+    servidor.preparar_metricas(4)
+    assert os.path.isdir(os.environ["METRICAS_DIR"])
+
+    # retratos da subida anterior não entram na soma
+    (tmp_path / "123.json").write_text("{}")
+    monkeypatch.setenv("METRICAS_DIR", str(tmp_path))
+    servidor.preparar_metricas(4)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,55 @@
+from sqlalchemy import create_engine, event, text
+
+from libs.database import migracoes
+
+
+def _migracao(id: str) -> migracoes.Migracao:
+    return next(migracao for migracao in migracoes.MIGRACOES if migracao.id == id)
+
+
+def test_versao_dos_livros_preenche_em_lotes(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'antigo.db'}")
+    with engine.begin() as conexao:
+        conexao.execute(text("CREATE TABLE livros (id INTEGER PRIMARY KEY)"))
+        conexao.execute(
+            text("INSERT INTO livros (id) VALUES (:id)"),
+            [{"id": id} for id in (*range(1, 21), 35, 36)],
+        )
+
+    transacoes = []
+    event.listen(engine, "commit", lambda _conexao: transacoes.append(1))
+    monkeypatch.setattr(migracoes, "MIGRACOES_LOTE", 10)
+    _migracao("0004_versao_dos_livros").aplicar(engine)
+
+    with engine.connect() as conexao:
+        sem_data = conexao.execute(
+            text("SELECT COUNT(*) FROM livros WHERE atualizado_em IS NULL")
+        ).scalar()
+        versoes = set(conexao.execute(text("SELECT versao FROM livros")).scalars())
+    assert sem_data == 0
+    assert versoes == {1}
+    # ALTER TABLE e uma transação por faixa de 10 ids (1-10 ... 31-40)
+    assert len(transacoes) == 1 + 4
+    engine.dispose()
+
+
+def test_preencher_em_lotes_continua_de_onde_parou(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'parcial.db'}")
+    with engine.begin() as conexao:
+        conexao.execute(text("CREATE TABLE itens (id INTEGER PRIMARY KEY, valor INT)"))
+        conexao.execute(
+            text("INSERT INTO itens (id, valor) VALUES (:id, :valor)"),
+            [{"id": id, "valor": 1 if id <= 5 else None} for id in range(1, 13)],
+        )
+
+    alteradas = migracoes.preencher_em_lotes(
+        engine, "itens", "valor = 1", "valor IS NULL", tamanho_lote=4
+    )
+    assert alteradas == 7
+    assert (
+        migracoes.preencher_em_lotes(
+            engine, "itens", "valor = 1", "valor IS NULL", tamanho_lote=4
+        )
+        == 0
+    )
+    engine.dispose()
@@ -0,0 +1,42 @@
+import base64
+
+import pytest
+
+from libs.paginacao.cursor import (
+    codificar_cursor,
+    codificar_cursor_dados,
+    decodificar_cursor,
+    decodificar_cursor_dados,
+)
+
+
+def test_cursor_ida_e_volta():
+    assert decodificar_cursor(codificar_cursor(42)) == 42
+    assert codificar_cursor(None) is None
+
+    dados = {"data": "2024-01-01T10:00:00", "id": "abc"}
+    assert decodificar_cursor_dados(codificar_cursor_dados(dados)) == dados
+
+
+def test_cursor_e_opaco_e_sem_preenchimento():
+    cursor = codificar_cursor(123456)
+    assert "=" not in cursor
+    assert "123456" not in cursor
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "",
+        "nao-e-base64!",
+        base64.urlsafe_b64encode(b"nao e json").decode(),
+        base64.urlsafe_b64encode(b"[1, 2]").decode(),
+        codificar_cursor_dados({"outro": 1}),
+        codificar_cursor_dados({"id": "10"}),
+        codificar_cursor_dados({"id": True}),
+        codificar_cursor_dados({"id": 1.5}),
+    ],
+)
+def test_cursor_invalido(cursor):
+    with pytest.raises(ValueError):
+        decodificar_cursor(cursor)
@@ -0,0 +1,124 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+from jose import jwt
+
+from benchmarks.autenticacao import executar
+from libs.autenticacao.tokens import (
+    DecodificadorHMAC,
+    DecodificadorJose,
+    TokenInvalido,
+    VerificadorTokens,
+)
+from libs.cache.lru import CacheTTL
+
+CHAVE = "chave-de-teste"
+AGORA = int(time.time())
+
+
+def _b64(dados: bytes) -> str:
+    return base64.urlsafe_b64encode(dados).rstrip(b"=").decode()
+
+
+def _assinado(claims: dict, chave: str = CHAVE, algoritmo: str = "HS256") -> str:
+    return jwt.encode(claims, chave, algorithm=algoritmo)
+
+
+def _cru(cabecalho: dict, claims_json: bytes) -> str:
+    """Token assinado corretamente com cabeçalho e payload arbitrários."""
+    inicio = f"{_b64(json.dumps(cabecalho).encode())}.{_b64(claims_json)}"
+    assinatura = hmac.new(CHAVE.encode(), inicio.encode(), hashlib.sha256).digest()
+    return f"{inicio}.{_b64(assinatura)}"
+
+
+def _trocar_payload(token: str, claims: dict) -> str:
+    cabecalho, _, assinatura = token.split(".")
+    return f"{cabecalho}.{_b64(json.dumps(claims).encode())}.{assinatura}"
+
+
+VALIDO = {"sub": "leitor@livraria.com", "id": 7, "exp": AGORA + 600, "iat": AGORA}
+
+TOKENS = {
+    "valido": _assinado(VALIDO),
+    "sem_exp": _assinado({"sub": "leitor@livraria.com"}),
+    "expirado": _assinado({**VALIDO, "exp": AGORA - 10}),
+    "nbf_futuro": _assinado({**VALIDO, "nbf": AGORA + 600}),
+    "chave_errada": _assinado(VALIDO, chave="outra-chave"),
+    "outro_algoritmo": _assinado(VALIDO, algoritmo="HS512"),
+    "alg_none": _cru({"alg": "none", "typ": "JWT"}, json.dumps(VALIDO).encode()),
+    "payload_adulterado": _trocar_payload(_assinado(VALIDO), {**VALIDO, "id": 1}),
+    "com_aud": _assinado({**VALIDO, "aud": "outra-api"}),
+    "sub_numerico": _assinado({**VALIDO, "sub": 123}),
+    "jti_numerico": _assinado({**VALIDO, "jti": 123}),
+    "exp_texto": _assinado({**VALIDO, "exp": "amanha"}),
+    "iat_texto": _assinado({**VALIDO, "iat": "ontem"}),
+    "payload_lista": _cru({"alg": "HS256", "typ": "JWT"}, b"[1, 2]"),
+    "payload_nao_json": _cru({"alg": "HS256", "typ": "JWT"}, b"nao e json"),
+    "duas_partes": "abc.def",
+    "quatro_partes": "a.b.c.d",
+    "base64_invalido": "@@@.###.$$$",
+    "vazio": "",
+}
+
+
+def _resultado(decodificador, token: str):
+    try:
+        return decodificador.decodificar(token)
+    except TokenInvalido:
+        return "invalido"
+
+
+@pytest.mark.parametrize("caso", TOKENS)
+def test_hmac_decide_igual_ao_jose(caso):
+    token = TOKENS[caso]
+    pelo_jose = _resultado(DecodificadorJose(CHAVE, "HS256"), token)
+    pelo_hmac = _resultado(DecodificadorHMAC(CHAVE, "HS256"), token)
+    assert pelo_hmac == pelo_jose
+
+
+def test_so_os_tokens_bons_passam():
+    decodificador = DecodificadorHMAC(CHAVE, "HS256")
+    aceitos = {
+        caso
+        for caso, token in TOKENS.items()
+        if _resultado(decodificador, token) != "invalido"
+    }
+    assert aceitos == {"valido", "sem_exp"}
+
+
+def test_hmac_recusa_algoritmo_nao_suportado():
+    with pytest.raises(ValueError):
+        DecodificadorHMAC(CHAVE, "RS256")
+
+
+class _CacheEspiao(CacheTTL):
+    def __init__(self):
+        super().__init__(tamanho_maximo=10, ttl_segundos=3600)
+        self.ttls: list[float] = []
+
+    def guardar(self, chave, valor, ttl_segundos=None):
+        self.ttls.append(ttl_segundos)
+        super().guardar(chave, valor, ttl_segundos)
+
+
+def test_verificador_guarda_so_tokens_validos_ate_o_exp():
+    cache = _CacheEspiao()
+    verificador = VerificadorTokens(DecodificadorHMAC(CHAVE, "HS256"), cache)
+
+    assert verificador.verificar(TOKENS["valido"]) == VALIDO
+    assert verificador.verificar(TOKENS["valido"]) == VALIDO
+    assert verificador.verificar(TOKENS["chave_errada"]) is None
+    assert len(cache) == 1
+    assert cache.acertos == 1
+    # nunca depois do exp do token, mesmo com o TTL do cache maior
+    assert cache.ttls == [pytest.approx(VALIDO["exp"] - time.time(), abs=2)]
+
+
+def test_benchmark_de_autenticacao_roda():
+    resultados = executar(repeticoes=1)
+    assert resultados["jwtbearer_banco_jose_sem_cache"] > 0
+    assert resultados["jwtbearer_claims_hmac_com_cache"] > 0
@@ -0,0 +1,46 @@
+import os
+
+from libs.autenticacao import senhas
+
+
+def _cadastro(email: str) -> dict:
+    return {
+        "nome": "Nova",
+        "sobrenome": "Leitora",
+        "data_nascimento": "1995-05-05",
+        "email": email,
+        "senha": "uma-senha-longa",
+    }
+
+
+def test_cadastro_nao_devolve_a_senha(cliente, novo_usuario, autenticar):
+    cabecalhos = autenticar(novo_usuario())
+
+    resposta = cliente.post(
+        "/usuarios/cadastrar", json=_cadastro("nova@livraria.com"), headers=cabecalhos
+    )
+    assert resposta.status_code == 200
+    assert "senha" not in resposta.json()
+    assert "versao_token" not in resposta.json()
+    assert resposta.json()["email"] == "nova@livraria.com"
+    assert resposta.json()["autor"] is False
+
+    resposta = cliente.post(
+        "/usuarios/cadastrar", json=_cadastro("nova@livraria.com"), headers=cabecalhos
+    )
+    assert resposta.status_code == 400
+
+
+def test_pool_de_senhas_divide_as_cpus_entre_os_workers(monkeypatch):
+    monkeypatch.setattr(os, "sched_getaffinity", lambda _: set(range(8)), raising=False)
+
+    monkeypatch.delenv("WEB_WORKERS", raising=False)
+    assert senhas._processos_senhas_padrao() == 8
+
+    monkeypatch.setenv("WEB_WORKERS", "4")
+    assert senhas._processos_senhas_padrao() == 2
+
+    # um worker por CPU (WEB_WORKERS=0) ou mais workers que CPUs: um processo
+    for workers in ("0", "16"):
+        monkeypatch.setenv("WEB_WORKERS", workers)
+        assert senhas._processos_senhas_padrao() == 1
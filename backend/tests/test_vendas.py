@@ -0,0 +1,62 @@
+def _listar(cliente, cabecalhos, contar_consultas):
+    with contar_consultas() as comandos:
+        resposta = cliente.get("/venda/listar", headers=cabecalhos)
+    assert resposta.status_code == 200
+    return resposta.json(), len(comandos)
+
+
+def test_listar_vendas_nao_cresce_com_o_numero_de_vendas(
+    cliente, novo_usuario, novo_livro, nova_venda, autenticar, contar_consultas
+):
+    autor = novo_usuario(autor=True)
+    outro_autor = novo_usuario(autor=True)
+    comprador = novo_usuario()
+    livros = [novo_livro(autor, preco=10.0) for _ in range(3)]
+    livro_de_outro_autor = novo_livro(outro_autor, preco=7.0)
+    cabecalhos = autenticar(autor)
+
+    nova_venda(comprador, livros[:1])
+    # a primeira chamada carrega o usuário no cache do JWTBearer
+    cliente.get("/venda/listar", headers=cabecalhos)
+    retorno, consultas_uma_venda = _listar(cliente, cabecalhos, contar_consultas)
+    assert len(retorno["vendas"]) == 1
+
+    for _ in range(5):
+        nova_venda(novo_usuario(), [*livros, livro_de_outro_autor], quantidade=2)
+    retorno, consultas_varias_vendas = _listar(cliente, cabecalhos, contar_consultas)
+
+    assert len(retorno["vendas"]) == 6
+    assert consultas_varias_vendas == consultas_uma_venda
+    # o total é da venda inteira, inclusive o item do outro autor
+    totais = sorted(
+        item["valor_total_da_venda"]
+        for venda in retorno["vendas"]
+        for item in venda["venda"]
+    )
+    assert totais == [10.0] + [74.0] * 15
+
+
+def test_listar_compras_nao_cresce_com_o_numero_de_compras(
+    cliente, novo_usuario, novo_livro, nova_venda, autenticar, contar_consultas
+):
+    autor = novo_usuario(autor=True)
+    comprador = novo_usuario()
+    livros = [novo_livro(autor, preco=5.0) for _ in range(4)]
+    cabecalhos = autenticar(comprador)
+
+    nova_venda(comprador, livros[:1])
+    cliente.get("/venda/listar", headers=cabecalhos)
+    retorno, consultas_uma_compra = _listar(cliente, cabecalhos, contar_consultas)
+    assert len(retorno["compras"]) == 1
+
+    for _ in range(5):
+        nova_venda(comprador, livros, quantidade=3)
+    retorno, consultas_varias_compras = _listar(cliente, cabecalhos, contar_consultas)
+
+    assert len(retorno["compras"]) == 6
+    assert consultas_varias_compras == consultas_uma_compra
+    compras = [compra["compra"] for compra in retorno["compras"]]
+    assert sorted(len(compra["nome_do_livro"]) for compra in compras) == [1] + [4] * 5
+    assert sorted(compra["valor_total_da_venda"] for compra in compras) == (
+        [5.0] + [60.0] * 5
+    )